@@ -5,10 +5,15 @@ This file contains additional API endpoints to complete the functionality
 
 from flask import jsonify, request, session
 from datetime import datetime, timedelta
-import csv
-import io
 from sqlalchemy import func, and_, or_
 
+from student_balances import StudentBalanceQuery
+from student_search import match_students
+from time_buckets import bucket_totals
+
+# Longest window the financial overview chart accepts (about ten years)
+MAX_OVERVIEW_DAYS = 3660
+
 # These functions should be added to your main app.py file
 
 def add_enhanced_api_endpoints(app, db, Student, Income, Expenditure, login_required, get_school_filtered_query, get_current_school_id):
@@ -80,6 +85,8 @@ def add_enhanced_api_endpoints(app, db, Student, Income, Expenditure, login_requ
     @login_required
     def api_search_students():
         """Advanced student search API"""
+        from app import decrypt_student_data
+        
         try:
             # Get search parameters
             query = request.args.get('q', '').strip()
@@ -88,49 +95,41 @@ def add_enhanced_api_endpoints(app, db, Student, Income, Expenditure, login_requ
             sex = request.args.get('sex', '').strip()
             limit = int(request.args.get('limit', 50))
             
-            # Start with school-filtered query
-            student_query = get_school_filtered_query(Student)
-            
-            # Apply filters
-            if query:
-                # Search in name and student_id (you may need to adjust based on encryption)
-                student_query = student_query.filter(
-                    or_(
-                        Student.name.contains(query),
-                        Student.student_id.contains(query)
-                    )
-                )
+            # Ranked, school-filtered matches from the student search index
+            student_query = match_students(get_school_filtered_query(Student), query, ranked=True)
             
             if form_class:
-                student_query = student_query.filter(Student.form_class.contains(form_class))
+                student_query = match_students(student_query, form_class, columns=('form_class',))
             
             if sex:
                 student_query = student_query.filter(Student.sex == sex)
             
-            students = student_query.limit(limit).all()
+            # Filter by payment status in SQL so the limit applies to matching students
+            balances = StudentBalanceQuery(student_query)
+            if payment_status == 'paid':
+                balances.where_status('paid')
+            elif payment_status == 'outstanding':
+                balances.where_not_paid()
+            elif payment_status == 'partial':
+                balances.where_status('outstanding')
             
-            # Filter by payment status if specified
-            if payment_status:
-                if payment_status == 'paid':
-                    students = [s for s in students if s.is_paid_in_full()]
-                elif payment_status == 'outstanding':
-                    students = [s for s in students if not s.is_paid_in_full()]
-                elif payment_status == 'partial':
-                    students = [s for s in students if not s.is_paid_in_full() and (s.pta_amount_paid > 0 or s.sdf_amount_paid > 0 or s.boarding_amount_paid > 0)]
+            rows = balances.rows().limit(limit).all()
             
             # Format results
             results = []
-            for student in students:
+            for row in rows:
+                student = row.Student
+                decrypted_data = decrypt_student_data(student)
                 results.append({
                     'id': student.id,
-                    'student_id': student.decrypted_student_id,
-                    'name': student.decrypted_name,
-                    'sex': student.decrypted_sex,
-                    'form_class': student.decrypted_form_class,
-                    'total_paid': float((student.pta_amount_paid or 0) + (student.sdf_amount_paid or 0) + (student.boarding_amount_paid or 0)),
-                    'total_balance': float(student.get_pta_balance() + student.get_sdf_balance() + student.get_boarding_balance()),
-                    'is_paid_in_full': student.is_paid_in_full(),
-                    'parent_phone': student.decrypted_parent_phone
+                    'student_id': decrypted_data['student_id'],
+                    'name': decrypted_data['name'],
+                    'sex': decrypted_data['sex'],
+                    'form_class': decrypted_data['form_class'],
+                    'total_paid': float(row.total_paid),
+                    'total_balance': float(row.total_balance),
+                    'is_paid_in_full': row.payment_status == 'paid',
+                    'parent_phone': decrypted_data['parent_phone']
                 })
             
             return jsonify({
@@ -145,82 +144,39 @@ def add_enhanced_api_endpoints(app, db, Student, Income, Expenditure, login_requ
     @app.route('/api/analytics/financial-overview')
     @login_required
     def api_financial_overview():
-        """Get financial analytics data for charts"""
+        """Get financial analytics data for charts (?days=, ?bucket=day|week|month|term)"""
         try:
-            current_school_id = get_current_school_id()
-            
             # Get date range (default to last 30 days)
-            days = int(request.args.get('days', 30))
+            days = max(0, min(int(request.args.get('days', 30)), MAX_OVERVIEW_DAYS))
+            bucket = request.args.get('bucket', 'day')
             end_date = datetime.now().date()
             start_date = end_date - timedelta(days=days)
             
-            # Daily income and expenditure
-            daily_data = []
-            current_date = start_date
+            # One grouped query per table, whatever the window length
+            income = bucket_totals(get_school_filtered_query(Income), Income.payment_date,
+                                   {'amount': Income.amount_paid}, start_date, end_date, bucket)
+            expenditure = bucket_totals(get_school_filtered_query(Expenditure), Expenditure.date,
+                                        {'amount': Expenditure.amount_paid}, start_date, end_date, bucket)
             
-            while current_date <= end_date:
-                if current_school_id:
-                    daily_income = db.session.query(func.sum(Income.amount_paid)).filter(
-                        Income.school_id == current_school_id,
-                        Income.payment_date == current_date
-                    ).scalar() or 0
-                    
-                    daily_expenditure = db.session.query(func.sum(Expenditure.amount_paid)).filter(
-                        Expenditure.school_id == current_school_id,
-                        Expenditure.date == current_date
-                    ).scalar() or 0
-                else:
-                    daily_income = db.session.query(func.sum(Income.amount_paid)).filter(
-                        Income.payment_date == current_date
-                    ).scalar() or 0
-                    
-                    daily_expenditure = db.session.query(func.sum(Expenditure.amount_paid)).filter(
-                        Expenditure.date == current_date
-                    ).scalar() or 0
-                
+            daily_data = []
+            for bucket_date, values in income.items():
+                spent = expenditure[bucket_date]['amount']
                 daily_data.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'income': float(daily_income),
-                    'expenditure': float(daily_expenditure),
-                    'net': float(daily_income - daily_expenditure)
+                    'date': bucket_date.strftime('%Y-%m-%d'),
+                    'income': values['amount'],
+                    'expenditure': spent,
+                    'net': values['amount'] - spent
                 })
-                
-                current_date += timedelta(days=1)
             
             # Fund type breakdown
-            if current_school_id:
-                pta_total = db.session.query(func.sum(Income.amount_paid)).filter(
-                    Income.school_id == current_school_id,
-                    Income.fund_type == 'PTA'
-                ).scalar() or 0
-                
-                sdf_total = db.session.query(func.sum(Income.amount_paid)).filter(
-                    Income.school_id == current_school_id,
-                    Income.fund_type == 'SDF'
-                ).scalar() or 0
-                
-                boarding_total = db.session.query(func.sum(Income.amount_paid)).filter(
-                    Income.school_id == current_school_id,
-                    Income.fund_type == 'Boarding'
-                ).scalar() or 0
-            else:
-                pta_total = db.session.query(func.sum(Income.amount_paid)).filter(
-                    Income.fund_type == 'PTA'
-                ).scalar() or 0
-                
-                sdf_total = db.session.query(func.sum(Income.amount_paid)).filter(
-                    Income.fund_type == 'SDF'
-                ).scalar() or 0
-                
-                boarding_total = db.session.query(func.sum(Income.amount_paid)).filter(
-                    Income.fund_type == 'Boarding'
-                ).scalar() or 0
-            
-            fund_breakdown = {
-                'PTA': float(pta_total),
-                'SDF': float(sdf_total),
-                'Boarding': float(boarding_total)
-            }
+            fund_breakdown = {'PTA': 0.0, 'SDF': 0.0, 'Boarding': 0.0}
+            for fee_type, amount in (
+                get_school_filtered_query(Income)
+                .with_entities(Income.fee_type, func.sum(Income.amount_paid))
+                .filter(Income.fee_type.in_(list(fund_breakdown)))
+                .group_by(Income.fee_type)
+            ):
+                fund_breakdown[fee_type] = float(amount or 0)
             
             return jsonify({
                 'daily_data': daily_data,
@@ -228,65 +184,8 @@ def add_enhanced_api_endpoints(app, db, Student, Income, Expenditure, login_requ
                 'period': f'{start_date} to {end_date}'
             })
             
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
-    
-    @app.route('/api/export/students')
-    @login_required
-    def api_export_students():
-        """Export students data as CSV"""
-        try:
-            format_type = request.args.get('format', 'csv').lower()
-            
-            # Get school-filtered students
-            students = get_school_filtered_query(Student).all()
-            
-            if format_type == 'csv':
-                output = io.StringIO()
-                writer = csv.writer(output)
-                
-                # Write header
-                writer.writerow([
-                    'Student ID', 'Name', 'Sex', 'Form/Class', 'Parent Phone',
-                    'PTA Required', 'PTA Paid', 'PTA Balance',
-                    'SDF Required', 'SDF Paid', 'SDF Balance',
-                    'Boarding Required', 'Boarding Paid', 'Boarding Balance',
-                    'Total Required', 'Total Paid', 'Total Balance',
-                    'Payment Status'
-                ])
-                
-                # Write data
-                for student in students:
-                    writer.writerow([
-                        student.decrypted_student_id,
-                        student.decrypted_name,
-                        student.decrypted_sex,
-                        student.decrypted_form_class,
-                        student.decrypted_parent_phone or '',
-                        student.pta_amount_required or 0,
-                        student.pta_amount_paid or 0,
-                        student.get_pta_balance(),
-                        student.sdf_amount_required or 0,
-                        student.sdf_amount_paid or 0,
-                        student.get_sdf_balance(),
-                        student.boarding_amount_required or 0,
-                        student.boarding_amount_paid or 0,
-                        student.get_boarding_balance(),
-                        (student.pta_amount_required or 0) + (student.sdf_amount_required or 0) + (student.boarding_amount_required or 0),
-                        (student.pta_amount_paid or 0) + (student.sdf_amount_paid or 0) + (student.boarding_amount_paid or 0),
-                        student.get_pta_balance() + student.get_sdf_balance() + student.get_boarding_balance(),
-                        'Paid in Full' if student.is_paid_in_full() else 'Outstanding'
-                    ])
-                
-                return jsonify({
-                    'data': output.getvalue(),
-                    'filename': f'students_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-                    'content_type': 'text/csv'
-                })
-            
-            else:
-                return jsonify({'error': 'Unsupported format'}), 400
-                
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
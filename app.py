@@ -3,7 +3,7 @@ import sys
 from datetime import datetime as dt, datetime, timedelta
 from functools import wraps
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
@@ -38,6 +38,28 @@ except ImportError:
     def get_school_filtered_query(model): return model.query
     def decrypt_student_data(student): return {'student_id': student.student_id, 'name': student.name, 'sex': student.sex, 'form_class': student.form_class, 'parent_phone': student.parent_phone}
 
+from student_balances import StudentBalanceQuery
+from financial_totals import get_financial_totals
+from summary_cache import get_school_summary
+from student_search import match_students
+from student_autocomplete import get_student_index, get_limit_arg
+from student_import import import_students
+from bulk_payments import post_payments, read_payment_rows, canonical_row
+from sms_outbox import wake_sms_sender
+from deposit_reconciliation import reconcile_statement
+from daily_fund_summary import get_fund_totals, record_ledger_rows, OTHER_INCOME_FUND
+from collection_stats import collection_breakdown
+from tenant_context import get_tenant_context, invalidate_tenant_status
+from tenant_schemas import TENANT_SCHEMA, DEFAULT_SCHEMA_MAP, tenant_schema_map, tenant_tables
+from sqlite_tuning import pragmas_from_env, configure_sqlite, foreign_key_problems
+from db_backups import (backup_settings, get_backup_status, run_backup_in_background, start_backup_scheduler,
+                        RUNNING_STATES as BACKUP_RUNNING_STATES)
+from csv_exports import (STUDENT_HEADER, INCOME_HEADER, EXPENDITURE_HEADER, OTHER_INCOME_HEADER, csv_response,
+                         get_export_filters, student_rows, income_rows, expenditure_rows, other_income_rows)
+from pagination import get_page_args, paginate, student_number
+from school_sequences import (RECEIPT, PROFESSIONAL_RECEIPT, STUDENT_ID, next_sequence_value,
+                              peek_sequence_value, advance_sequence)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -267,13 +289,13 @@ if database_url:
     
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     
-    # Connection pool settings for production
+    # Connection pool settings for production (one pool per gunicorn worker, sized by gunicorn.conf.py)
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'pool_timeout': 20,
-        'pool_size': 5,
-        'max_overflow': 10
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10))
     }
     
     # Enable statement-based query caching
@@ -284,9 +306,25 @@ else:
     # Use SQLite for local development, placing the DB in the 'instance' folder
     db_path = os.path.join(instance_path, 'smartfee.db')
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    # Pooled connections are shared between threads; a writer waits up to the busy timeout for another
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'check_same_thread': False, 'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))},
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    }
+    # Pragmas applied to every connection (see sqlite_tuning.py); SQLITE_PRAGMAS overrides single entries
+    app.config['SQLITE_PRAGMAS'] = pragmas_from_env()
     print(f"Using SQLite database at: {db_path}")
 # Disable SQLAlchemy event system to save resources
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Online backups (see db_backups.py)
+app.config.update(backup_settings(os.environ, instance_path))
+
+# Tenant tables resolve through the search path unless a request routes them to its school's schema
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})['execution_options'] = {
+    'schema_translate_map': DEFAULT_SCHEMA_MAP
+}
+app.config['TENANT_SCHEMAS'] = app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql://')
 
 # Enable SQL query logging in development
 if os.environ.get('FLASK_ENV') != 'production':
@@ -298,6 +336,13 @@ if os.environ.get('FLASK_ENV') != 'production':
 db = SQLAlchemy()
 db.init_app(app)
 
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    configure_sqlite(app, db)
+
+# Under gunicorn the scheduler starts in each worker (post_fork in gunicorn.conf.py), not in the master
+if app.config['BACKUP_INTERVAL_HOURS'] > 0 and 'gunicorn' not in sys.modules:
+    start_backup_scheduler(app)
+
 # Configure WhiteNoise for static files
 if not app.debug:
     from whitenoise import WhiteNoise
@@ -440,6 +485,11 @@ class User(db.Model):
     school = db.relationship('SchoolConfiguration', backref='users')
 
 class Student(db.Model):
+    __table_args__ = (
+        # Student numbers are unique within a school; also serves every lookup by number
+        db.Index('ix_student_school_student_id', 'school_id', 'student_id', unique=True),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     student_id = db.Column(db.String(50), nullable=False)
@@ -459,44 +509,24 @@ class Student(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     school = db.relationship('SchoolConfiguration', backref='students')
     
-    def get_pta_balance(self):
-        try:
-            from data_isolation_helpers import get_school_filtered_query
-            fund_config_query = get_school_filtered_query(FundConfiguration)
-            active_config = fund_config_query.filter_by(is_active=True).first()
-            required = self.pta_required if self.pta_required > 0 else (active_config.pta_amount if active_config else 45000)
-        except ImportError:
-            # Fallback if import fails
-            active_config = FundConfiguration.query.filter_by(school_id=self.school_id, is_active=True).first()
-            required = self.pta_required if self.pta_required > 0 else (active_config.pta_amount if active_config else 45000)
+    def get_pta_balance(self, fee_context=None):
+        fee_context = fee_context or get_fee_context(self.school_id)
+        required = self.pta_required if self.pta_required > 0 else fee_context.pta_amount
         return max(0, required - self.pta_amount_paid)
     
-    def get_sdf_balance(self):
-        try:
-            from data_isolation_helpers import get_school_filtered_query
-            fund_config_query = get_school_filtered_query(FundConfiguration)
-            active_config = fund_config_query.filter_by(is_active=True).first()
-            required = self.sdf_required if self.sdf_required > 0 else (active_config.sdf_amount if active_config else 5000)
-        except ImportError:
-            # Fallback if import fails
-            active_config = FundConfiguration.query.filter_by(school_id=self.school_id, is_active=True).first()
-            required = self.sdf_required if self.sdf_required > 0 else (active_config.sdf_amount if active_config else 5000)
+    def get_sdf_balance(self, fee_context=None):
+        fee_context = fee_context or get_fee_context(self.school_id)
+        required = self.sdf_required if self.sdf_required > 0 else fee_context.sdf_amount
         return max(0, required - self.sdf_amount_paid)
     
-    def get_boarding_balance(self):
-        try:
-            from data_isolation_helpers import get_school_filtered_query
-            fund_config_query = get_school_filtered_query(FundConfiguration)
-            active_config = fund_config_query.filter_by(is_active=True).first()
-            required = self.boarding_required if self.boarding_required > 0 else (active_config.boarding_amount if active_config else 0)
-        except ImportError:
-            # Fallback if import fails
-            active_config = FundConfiguration.query.filter_by(school_id=self.school_id, is_active=True).first()
-            required = self.boarding_required if self.boarding_required > 0 else (active_config.boarding_amount if active_config else 0)
+    def get_boarding_balance(self, fee_context=None):
+        fee_context = fee_context or get_fee_context(self.school_id)
+        required = self.boarding_required if self.boarding_required > 0 else fee_context.boarding_amount
         return max(0, required - self.boarding_amount_paid)
     
-    def is_paid_in_full(self):
-        return (self.get_pta_balance() + self.get_sdf_balance() + self.get_boarding_balance()) == 0
+    def is_paid_in_full(self, fee_context=None):
+        fee_context = fee_context or get_fee_context(self.school_id)
+        return (self.get_pta_balance(fee_context) + self.get_sdf_balance(fee_context) + self.get_boarding_balance(fee_context)) == 0
     
     def can_pay_installment(self, fee_type):
         if fee_type == 'PTA':
@@ -508,6 +538,12 @@ class Student(db.Model):
         return False
 
 class Income(db.Model):
+    __table_args__ = (
+        db.Index('ix_income_school_student_date', 'school_id', 'student_id', 'payment_date'),
+        db.Index('ix_income_school_date', 'school_id', 'payment_date'),
+        db.Index('ix_income_school_fee_type_date', 'school_id', 'fee_type', 'payment_date'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     payment_date = db.Column(db.Date, nullable=False)
@@ -522,6 +558,12 @@ class Income(db.Model):
     school = db.relationship('SchoolConfiguration', backref='incomes')
 
 class Expenditure(db.Model):
+    __table_args__ = (
+        db.Index('ix_expenditure_school_date', 'school_id', 'date'),
+        db.Index('ix_expenditure_school_fund_type', 'school_id', 'fund_type', 'date'),
+        db.Index('ix_expenditure_school_activity', 'school_id', 'activity_service'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -534,6 +576,10 @@ class Expenditure(db.Model):
     school = db.relationship('SchoolConfiguration', backref='expenditures')
 
 class FundConfiguration(db.Model):
+    __table_args__ = (
+        db.Index('ix_fund_configuration_school_active', 'school_id', 'is_active'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     term_name = db.Column(db.String(100), nullable=False)
@@ -545,6 +591,11 @@ class FundConfiguration(db.Model):
     school = db.relationship('SchoolConfiguration', backref='fund_configurations')
 
 class Receipt(db.Model):
+    __table_args__ = (
+        db.Index('ix_receipt_school_student', 'school_id', 'student_id'),
+        db.Index('ix_receipt_school_date', 'school_id', 'payment_date'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     receipt_no = db.Column(db.String(20), nullable=False)
@@ -563,10 +614,11 @@ class Receipt(db.Model):
     @staticmethod
     def generate_receipt_number(school_id=None):
         if school_id:
-            last_receipt = Receipt.query.filter_by(school_id=school_id).order_by(Receipt.id.desc()).first()
-        else:
-            last_receipt = Receipt.query.order_by(Receipt.id.desc()).first()
-        
+            # Atomic per-school sequence, safe with several workers posting at once
+            return f"{next_sequence_value(school_id, RECEIPT):04d}"
+
+        last_receipt = Receipt.query.order_by(Receipt.id.desc()).first()
+
         if last_receipt and last_receipt.receipt_no.isdigit():
             next_number = int(last_receipt.receipt_no) + 1
         else:
@@ -574,6 +626,10 @@ class Receipt(db.Model):
         return f"{next_number:04d}"
 
 class OtherIncome(db.Model):
+    __table_args__ = (
+        db.Index('ix_other_income_school_date', 'school_id', 'date'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -586,6 +642,10 @@ class OtherIncome(db.Model):
     school = db.relationship('SchoolConfiguration', backref='other_incomes')
 
 class Budget(db.Model):
+    __table_args__ = (
+        db.Index('ix_budget_school_activity', 'school_id', 'activity_service'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     activity_service = db.Column(db.String(400), nullable=False)
@@ -596,6 +656,10 @@ class Budget(db.Model):
     school = db.relationship('SchoolConfiguration', backref='budgets')
 
 class ProfessionalReceipt(db.Model):
+    __table_args__ = (
+        db.Index('ix_professional_receipt_school_student', 'school_id', 'student_id'),
+        {'schema': TENANT_SCHEMA},
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     receipt_no = db.Column(db.String(10), nullable=False)
@@ -622,6 +686,9 @@ class Subscription(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class NotificationLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_log_school_sent', 'school_id', 'sent_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
     notification_type = db.Column(db.String(50), nullable=False)
@@ -630,6 +697,157 @@ class NotificationLog(db.Model):
     days_remaining = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class SmsOutbox(db.Model):
+    """Parent SMS waiting to be sent, written in the same transaction as the payment (see sms_outbox.py)."""
+    __table_args__ = (
+        db.Index('ix_sms_outbox_status', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
+    student_db_id = db.Column(db.Integer, nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    message_type = db.Column(db.String(30), nullable=False, default='payment_confirmation')
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+class BankStatementLine(db.Model):
+    """Credit line of an imported bank statement and its reconciliation status (see deposit_reconciliation.py)."""
+    __table_args__ = (
+        db.Index('ix_bank_statement_line_school_hash', 'school_id', 'line_hash', unique=True),
+        db.Index('ix_bank_statement_line_school_status', 'school_id', 'status', 'transaction_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), nullable=False)
+    line_hash = db.Column(db.String(40), nullable=False)
+    transaction_date = db.Column(db.Date, nullable=False)
+    reference = db.Column(db.String(100))
+    normalised_reference = db.Column(db.String(100))
+    description = db.Column(db.String(400))
+    amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='unmatched')
+    ledger_key = db.Column(db.String(120))
+    note = db.Column(db.String(200))
+    matched_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyFundSummary(db.Model):
+    """Per-school, per-day, per-fund ledger totals kept in step with every write (see daily_fund_summary.py)."""
+    school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    fund = db.Column(db.String(20), primary_key=True)
+    income = db.Column(db.Float, nullable=False, default=0.0)
+    expenditure = db.Column(db.Float, nullable=False, default=0.0)
+    other_income = db.Column(db.Float, nullable=False, default=0.0)
+    tx_count = db.Column(db.Integer, nullable=False, default=0)
+
+class SchoolDataVersion(db.Model):
+    """Per-school counter bumped by every write route; in-process caches compare against it."""
+    school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchoolSequence(db.Model):
+    """Last number handed out per school for receipts, professional receipts and student IDs."""
+    school_id = db.Column(db.Integer, db.ForeignKey('school_configuration.id'), primary_key=True)
+    name = db.Column(db.String(30), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+# Fee context: the active fund configuration of a school, resolved once per request
+DEFAULT_PTA_AMOUNT = 45000
+DEFAULT_SDF_AMOUNT = 5000
+DEFAULT_BOARDING_AMOUNT = 0
+
+class FeeContext:
+    """Snapshot of a school's active fee amounts used by the balance methods."""
+
+    def __init__(self, school_id, active_config):
+        self.school_id = school_id
+        self.active_config = active_config
+        # Copy the amounts so later commits (which expire ORM objects) never trigger a reload
+        self.pta_amount = active_config.pta_amount if active_config else DEFAULT_PTA_AMOUNT
+        self.sdf_amount = active_config.sdf_amount if active_config else DEFAULT_SDF_AMOUNT
+        self.boarding_amount = active_config.boarding_amount if active_config else DEFAULT_BOARDING_AMOUNT
+        self.term_name = active_config.term_name if active_config else 'Current Term'
+
+def _load_fee_context(school_id):
+    if school_id is not None:
+        active_config = FundConfiguration.query.filter_by(school_id=school_id, is_active=True).first()
+    else:
+        # Developer view without a school: keep the old school-filtered lookup
+        active_config = get_school_filtered_query(FundConfiguration).filter_by(is_active=True).first()
+    return FeeContext(school_id, active_config)
+
+def get_fee_context(school_id=None):
+    """Return the FeeContext for a school (default: the current school).
+    Contexts are cached on flask.g, so each school costs one query per request.
+    """
+    if school_id is None:
+        school_id = get_current_school_id()
+    if not has_app_context():
+        return _load_fee_context(school_id)
+
+    fee_contexts = g.setdefault('fee_contexts', {})
+    if school_id not in fee_contexts:
+        fee_contexts[school_id] = _load_fee_context(school_id)
+    return fee_contexts[school_id]
+
+def invalidate_fee_context(school_id=None):
+    """Drop cached fee contexts after a fund configuration change.
+    With no school_id every cached school is dropped.
+    """
+    if not has_app_context():
+        return
+    fee_contexts = g.get('fee_contexts')
+    if not fee_contexts:
+        return
+    if school_id is None:
+        fee_contexts.clear()
+    else:
+        fee_contexts.pop(school_id, None)
+
+# School data versions: shared across workers through the database
+def mark_school_data_changed(school_id):
+    """Bump the school's data version inside the current transaction.
+    Call before committing any write to the school's students, ledger or fund configuration.
+    """
+    if not school_id:
+        return
+    now = datetime.utcnow()
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(SchoolDataVersion).values(school_id=school_id, version=1, updated_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[SchoolDataVersion.school_id],
+            set_={'version': SchoolDataVersion.version + 1, 'updated_at': now}
+        )
+        db.session.execute(statement)
+    else:
+        updated = db.session.query(SchoolDataVersion).filter_by(school_id=school_id).update(
+            {'version': SchoolDataVersion.version + 1, 'updated_at': now}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(SchoolDataVersion(school_id=school_id, version=1, updated_at=now))
+
+def get_school_data_version(school_id):
+    """Token that changes whenever the school's data changes, from one indexed lookup.
+    The school's creation time is part of the token so a reused school id never
+    matches entries cached for a deleted school.
+    """
+    row = db.session.query(SchoolConfiguration.created_at, SchoolDataVersion.version).outerjoin(
+        SchoolDataVersion, SchoolDataVersion.school_id == SchoolConfiguration.id
+    ).filter(SchoolConfiguration.id == school_id).first()
+    if row is None:
+        return None
+    return (row.created_at, row.version or 0)
+
 # Tenant schema helpers (PostgreSQL only)
 from sqlalchemy import text
 
@@ -641,80 +859,72 @@ def get_tenant_schema_name(school_id: int) -> str:
     return f"school_{school_id}"
 
 def create_tenant_schema_and_tables(school_id: int):
-    """Create per-tenant schema and tenant tables if using PostgreSQL.
+    """Create per-tenant schema and tenant tables when tenant schemas are enabled.
     Keeps global tables (SchoolConfiguration, User, Subscription, NotificationLog) in public.
     """
-    if not is_postgres():
+    if not app.config.get('TENANT_SCHEMAS'):
         return
     schema = get_tenant_schema_name(school_id)
     # Create schema and tables within that schema using a dedicated connection
     with db.engine.connect() as conn:
         conn.execution_options(isolation_level="AUTOCOMMIT")
-        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
-        # Switch search_path to tenant schema for table creation
-        conn.execute(text(f"SET search_path TO {schema}"))
-        # Create tenant tables only, checkfirst avoids overwriting
+        if is_postgres():
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+        # Route the tenant tables to the new schema; checkfirst avoids overwriting
+        conn.execution_options(schema_translate_map=tenant_schema_map(schema))
         try:
-            Student.__table__.create(bind=conn, checkfirst=True)
-            Income.__table__.create(bind=conn, checkfirst=True)
-            Expenditure.__table__.create(bind=conn, checkfirst=True)
-            FundConfiguration.__table__.create(bind=conn, checkfirst=True)
-            Receipt.__table__.create(bind=conn, checkfirst=True)
-            OtherIncome.__table__.create(bind=conn, checkfirst=True)
-            Budget.__table__.create(bind=conn, checkfirst=True)
-            ProfessionalReceipt.__table__.create(bind=conn, checkfirst=True)
+            db.metadata.create_all(bind=conn, tables=tenant_tables(), checkfirst=True)
         except Exception as e:
             # Log and continue; tables may already exist
             print(f"Tenant table creation warning for {schema}: {e}")
 
 @app.before_request
-def apply_tenant_search_path():
-    """Set search_path per request and validate tenant access."""
+def reset_tenant_context():
+    """Start every request with a fresh tenant context, even when an app context is reused."""
+    g.pop('tenant_context', None)
+
+@app.before_request
+def validate_tenant_request():
+    """Validate tenant access per request; sessions route tenant tables to the school's schema themselves."""
     # Skip validation for login/logout routes
     if request.endpoint in ['login', 'logout', 'static', 'health_check', 'test_route']:
         return
     
     try:
-        if is_postgres():
+        if app.config.get('TENANT_SCHEMAS'):
             role = session.get('user_role')
             school_id = session.get('school_id')
             
             if role != 'developer' and school_id:
-                # Enhanced tenant validation
-                school = SchoolConfiguration.query.get(school_id)
-                if not school or not school.is_active or school.is_blocked:
+                # Enhanced tenant validation (cached school status)
+                school = get_tenant_context().status
+                if not school or not school.is_open:
                     if 'logged_in' in session:
                         session.clear()
                         flash('School access revoked. Please contact support.', 'error')
                     return redirect(url_for('login'))
                 
                 # Check subscription status and auto-lock expired schools
-                if school.subscription_status != 'absolute' and school.days_remaining() <= 0:
+                if school.is_expired:
                     # Auto-lock expired schools
-                    if not school.is_blocked:
-                        school.is_blocked = True
-                        school.subscription_status = 'expired'
-                        try:
-                            db.session.commit()
-                        except Exception as commit_error:
-                            db.session.rollback()
-                            print(f"Error updating school status: {commit_error}")
+                    try:
+                        SchoolConfiguration.query.filter_by(id=school_id).update(
+                            {'is_blocked': True, 'subscription_status': 'expired'}
+                        )
+                        db.session.commit()
+                        invalidate_tenant_status(school_id)
+                    except Exception as commit_error:
+                        db.session.rollback()
+                        print(f"Error updating school status: {commit_error}")
                     
                     if 'logged_in' in session:
                         session.clear()
                         flash('Subscription expired. Your school has been locked. Please contact support to renew.', 'error')
                     return redirect(url_for('login'))
                 
-                # Set tenant schema
-                schema = get_tenant_schema_name(school_id)
-                db.session.execute(text(f"SET search_path TO {schema}, public"))
-            else:
-                # Default to public for developer
-                db.session.execute(text("SET search_path TO public"))
-                
     except Exception as e:
-        # Do not break request if search_path fails
-        print(f"apply_tenant_search_path warning: {e}")
+        # Do not break request if validation fails
+        print(f"validate_tenant_request warning: {e}")
         try:
             db.session.rollback()
         except:
@@ -731,19 +941,8 @@ def validate_tenant_access():
         if session.get('user_role') == 'developer':
             return True
         
-        school_id = session.get('school_id')
-        if not school_id:
-            return False
-        
-        school = SchoolConfiguration.query.get(school_id)
-        if not school or not school.is_active or school.is_blocked:
-            return False
-        
-        # Check subscription status
-        if school.subscription_status == 'expired' and school.days_remaining() <= 0:
-            return False
-        
-        return True
+        # School status comes from the request's tenant context (cached across requests)
+        return get_tenant_context().has_access()
     except Exception as e:
         print(f"Tenant validation error: {e}")
         return False
@@ -773,14 +972,8 @@ def print_professional_receipt(student_id):
         flash('No school access configured. Please contact administrator.', 'error')
         return redirect(url_for('index'))
 
-    # Get school-filtered students and find by student_id
-    student_query = get_school_filtered_query(Student)
-    students = student_query.all()
-    student = None
-    for s in students:
-        if s.student_id == student_id:
-            student = s
-            break
+    # Get school-filtered student by student_id
+    student = get_student_by_student_id(student_id)
     
     if not student:
         flash('Student not found!', 'error')
@@ -803,8 +996,7 @@ def print_professional_receipt(student_id):
         deposit_ref = existing_receipt.reference_number
     else:
         # Generate new receipt number
-        existing_receipts = ProfessionalReceipt.query.filter_by(school_id=current_school_id).count()
-        receipt_no = f"{existing_receipts + 1:03d}"
+        receipt_no = f"{next_sequence_value(current_school_id, PROFESSIONAL_RECEIPT):03d}"
         
         # Get reference number from latest income record
         income_query = get_school_filtered_query(Income)
@@ -835,9 +1027,7 @@ def print_professional_receipt(student_id):
     school_address = school_config.school_address if school_config and school_config.school_address else None
     
     # Get active fund configuration
-    fund_config_query = get_school_filtered_query(FundConfiguration)
-    active_config = fund_config_query.filter_by(is_active=True).first()
-    term_name = active_config.term_name if active_config else 'Current Term'
+    term_name = get_fee_context(current_school_id).term_name
     
     # Decrypt student data for display
     decrypted_data = decrypt_student_data(student)
@@ -861,39 +1051,137 @@ def print_professional_receipt(student_id):
 
 # Helper functions
 def generate_student_id():
-    """Generate the next sequential student ID"""
+    """Suggest the next sequential student ID (the number is only taken when the student is saved)"""
     current_school_id = get_current_school_id()
     if not current_school_id:
         return "0001"  # Fallback for developer mode
     
-    # Get school-filtered students
-    student_query = get_school_filtered_query(Student)
-    students = student_query.all()
-    
-    if not students:
-        return "0001"
-    
-    # Get all existing student ID numbers for this school
-    existing_numbers = set()
-    for student in students:
-        try:
-            # Since we're not using encryption, just use the student_id directly
-            student_id = student.student_id
-            
-            # Try to extract number from student ID
-            if student_id and student_id.isdigit():
-                existing_numbers.add(int(student_id))
-        except (ValueError, Exception):
-            # If ID is not numeric, continue
-            continue
-    
-    # Find the next sequential number
-    if not existing_numbers:
-        return "0001"
-    
-    next_number = max(existing_numbers) + 1
+    next_number = peek_sequence_value(current_school_id, STUDENT_ID)
     return f"{next_number:04d}"  # Format as 4-digit number (0001, 0002, etc.)
 
+def get_student_by_student_id(student_id, school_id=None):
+    """Look up one student by student number through the (school_id, student_id) index.
+    Without school_id the current school filter applies.
+    """
+    if school_id is not None:
+        query = Student.query.filter_by(school_id=school_id)
+    else:
+        query = get_school_filtered_query(Student)
+    return query.filter(Student.student_id == student_id).order_by(Student.id).first()
+
+def get_students_by_student_ids(student_ids, school_id=None, chunk_size=500):
+    """Batch variant of get_student_by_student_id: {student_id: Student} from IN queries.
+    Large lists are split into chunks to stay below the database parameter limit.
+    """
+    if school_id is not None:
+        query = Student.query.filter_by(school_id=school_id)
+    else:
+        query = get_school_filtered_query(Student)
+
+    wanted = list(dict.fromkeys(sid for sid in student_ids if sid))
+    students = {}
+    for start in range(0, len(wanted), chunk_size):
+        chunk = wanted[start:start + chunk_size]
+        for student in query.filter(Student.student_id.in_(chunk)).order_by(Student.id):
+            # First match wins, as in the developer view across schools
+            students.setdefault(student.student_id, student)
+    return students
+
+def filter_students(query, name=None, form_class=None, student_id=None):
+    """Case-insensitive substring filters applied in the database.
+    The search boxes use the student search index instead (see student_search.py).
+    """
+    for column, value in ((Student.name, name), (Student.form_class, form_class), (Student.student_id, student_id)):
+        if value:
+            query = query.filter(db.func.lower(column).contains(value.lower(), autoescape=True))
+    return query
+
+def student_sort_keys():
+    """Stable keyset order for student lists: ID number, then ID text, then primary key."""
+    return (student_number(Student.student_id), Student.student_id, Student.id)
+
+def get_enrollment_stats(student_query):
+    """Per-class girls/boys counts of every student in student_query, from one GROUP BY.
+    Returns (stats, total_girls, total_boys) with stats = {form_class: {'girls', 'boys', 'total'}}.
+    """
+    return collection_breakdown(student_query).enrollment()
+
+def get_budget_spending(budget_query, *order_by):
+    """(Budget, spent) pairs: each budget line with the school's total expenditure on its activity.
+    Spending comes from one GROUP BY activity_service joined to the budget lines.
+    """
+    spending = get_school_filtered_query(Expenditure).with_entities(
+        Expenditure.school_id, Expenditure.activity_service,
+        db.func.sum(Expenditure.amount_paid).label('spent')
+    ).group_by(Expenditure.school_id, Expenditure.activity_service).subquery('activity_spending')
+    return budget_query.outerjoin(spending, db.and_(
+        spending.c.school_id == Budget.school_id, spending.c.activity_service == Budget.activity_service
+    )).add_columns(db.func.coalesce(spending.c.spent, 0)).order_by(*order_by).all()
+
+def supports_window_functions():
+    """PostgreSQL always has window functions; SQLite only from 3.25."""
+    if db.engine.dialect.name != 'sqlite':
+        return True
+    return (db.engine.dialect.server_version_info or (0,)) >= (3, 25)
+
+def get_latest_payments(income_query=None, student_ids=None):
+    """Latest payment date and deposit reference for every student, in one query.
+    Returns {(school_id, student_id): {'payment_date': ..., 'payment_reference': ...}}.
+    Ties on the payment date go to the most recently recorded income row.
+    Pass student_ids to limit the lookup to one page of students.
+    """
+    if income_query is None:
+        income_query = get_school_filtered_query(Income)
+    if student_ids is not None:
+        if not student_ids:
+            return {}
+        income_query = income_query.filter(Income.student_id.in_(list(student_ids)))
+
+    if supports_window_functions():
+        ranked = income_query.with_entities(
+            Income.school_id, Income.student_id, Income.payment_date, Income.payment_reference,
+            db.func.row_number().over(
+                partition_by=(Income.school_id, Income.student_id),
+                order_by=(Income.payment_date.desc(), Income.id.desc())
+            ).label('position')
+        ).subquery()
+        rows = db.session.query(
+            ranked.c.school_id, ranked.c.student_id, ranked.c.payment_date, ranked.c.payment_reference
+        ).filter(ranked.c.position == 1).all()
+    else:
+        # Fallback: newest row among those on each student's latest payment date
+        latest_dates = income_query.with_entities(
+            Income.school_id, Income.student_id, db.func.max(Income.payment_date).label('payment_date')
+        ).group_by(Income.school_id, Income.student_id).subquery()
+        latest_ids = db.session.query(db.func.max(Income.id).label('id')).join(
+            latest_dates,
+            db.and_(Income.school_id == latest_dates.c.school_id,
+                    Income.student_id == latest_dates.c.student_id,
+                    Income.payment_date == latest_dates.c.payment_date)
+        ).group_by(Income.school_id, Income.student_id).subquery()
+        rows = db.session.query(
+            Income.school_id, Income.student_id, Income.payment_date, Income.payment_reference
+        ).join(latest_ids, Income.id == latest_ids.c.id).all()
+
+    # Encryption keys for every school involved, loaded once
+    school_ids = {row.school_id for row in rows}
+    encryption_keys = dict(
+        db.session.query(SchoolConfiguration.id, SchoolConfiguration.encryption_key)
+        .filter(SchoolConfiguration.id.in_(school_ids)).all()
+    ) if school_ids else {}
+
+    latest_payments = {}
+    for row in rows:
+        payment_reference = row.payment_reference
+        encryption_key = encryption_keys.get(row.school_id)
+        if payment_reference and encryption_key:
+            payment_reference = decrypt_sensitive_field(payment_reference, row.school_id, encryption_key)
+        latest_payments[(row.school_id, row.student_id)] = {
+            'payment_date': row.payment_date,
+            'payment_reference': payment_reference
+        }
+    return latest_payments
+
 # Custom Jinja2 filter for number formatting with commas
 @app.template_filter('comma')
 def comma_filter(value):
@@ -914,21 +1202,17 @@ def comma_int_filter(value):
 # Make datetime and school name available in templates
 @app.context_processor
 def inject_globals():
-    # Get school config for current user's school
-    current_school_id = get_current_school_id()
-    if current_school_id:
-        school_config = SchoolConfiguration.query.filter_by(
-            id=current_school_id, is_active=True
-        ).first()
-    else:
-        school_config = None
+    # School name and address from the request's tenant context (cached school status)
+    tenant = get_tenant_context()
+    school_status = tenant.status if tenant.status and tenant.status.is_active else None
     
-    school_name = school_config.school_name if school_config else 'SmartFee Revenue Collection System'
-    school_address = school_config.school_address if school_config and school_config.school_address else None
+    school_name = school_status.school_name if school_status else 'SmartFee Revenue Collection System'
+    school_address = school_status.school_address if school_status and school_status.school_address else None
     software_name = 'SmartFee Revenue Collection System'
     
     def get_school_config():
-        return school_config
+        # Full configuration only loaded for templates that ask for it
+        return tenant.school_config()
     
     # CSRF token function - disabled for production
     def csrf_token():
@@ -1236,6 +1520,7 @@ def block_school(school_id):
     school.is_blocked = True
     school.subscription_status = 'blocked'
     db.session.commit()
+    invalidate_tenant_status(school_id)
     flash(f'School "{school.school_name}" has been blocked!', 'success')
     return redirect(url_for('manage_schools'))
 
@@ -1250,6 +1535,7 @@ def unblock_school(school_id):
     school.is_blocked = False
     school.subscription_status = 'active'
     db.session.commit()
+    invalidate_tenant_status(school_id)
     flash(f'School "{school.school_name}" has been unblocked!', 'success')
     return redirect(url_for('manage_schools'))
 
@@ -1270,6 +1556,7 @@ def delete_school(school_id):
         # Delete in correct order to handle foreign key constraints
         db.session.execute(text("DELETE FROM income WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM receipt WHERE school_id = :school_id"), {'school_id': school_id})
+        db.session.execute(text("DELETE FROM professional_receipt WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM expenditure WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM other_income WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM budget WHERE school_id = :school_id"), {'school_id': school_id})
@@ -1278,9 +1565,15 @@ def delete_school(school_id):
         db.session.execute(text("DELETE FROM user WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM subscription WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM notification_log WHERE school_id = :school_id"), {'school_id': school_id})
+        db.session.execute(text("DELETE FROM school_data_version WHERE school_id = :school_id"), {'school_id': school_id})
+        db.session.execute(text("DELETE FROM school_sequence WHERE school_id = :school_id"), {'school_id': school_id})
+        db.session.execute(text("DELETE FROM daily_fund_summary WHERE school_id = :school_id"), {'school_id': school_id})
+        db.session.execute(text("DELETE FROM sms_outbox WHERE school_id = :school_id"), {'school_id': school_id})
+        db.session.execute(text("DELETE FROM bank_statement_line WHERE school_id = :school_id"), {'school_id': school_id})
         db.session.execute(text("DELETE FROM school_configuration WHERE id = :school_id"), {'school_id': school_id})
         
         db.session.commit()
+        invalidate_tenant_status(school_id)
         flash(f'School "{school_name}" and all associated data deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1339,6 +1632,7 @@ def update_subscription(school_id):
         school.updated_at = datetime.utcnow()
         
         db.session.commit()
+        invalidate_tenant_status(school_id)
         flash(f'Subscription updated successfully for {school.school_name}!', 'success')
         
     except Exception as e:
@@ -1506,6 +1800,7 @@ def edit_other_income(income_id):
             other_income.amount_paid = float(request.form['amount_paid'])
             other_income.balance = other_income.total_charge - other_income.amount_paid
             
+            mark_school_data_changed(other_income.school_id)
             db.session.commit()
             flash('Other income record updated successfully!', 'success')
             return redirect(url_for('income'))
@@ -1524,6 +1819,7 @@ def delete_other_income(income_id):
         other_income = other_income_query.filter_by(id=income_id).first_or_404()
         customer_name = other_income.customer_name
         db.session.delete(other_income)
+        mark_school_data_changed(other_income.school_id)
         db.session.commit()
         flash(f'Other income record for "{customer_name}" deleted successfully!', 'success')
     except Exception as e:
@@ -1563,6 +1859,31 @@ def ensure_database_schema():
                         if "duplicate column" not in str(e).lower():
                             print(f"Warning adding column {column_name}: {e}")
                         db.session.rollback()
+            
+            # Indexes declared on the models for databases created before they existed
+            from migrate_indexes import create_indexes
+            for schema, index_name, error in create_indexes():
+                if error and index_name == 'ix_student_school_student_id':
+                    # Existing duplicate student IDs stop the unique student index from being built
+                    print(f"Warning creating index {index_name} (duplicate student IDs? run check_duplicates.py): {error}")
+                elif error:
+                    print(f"Warning creating index {index_name}: {error}")
+            
+            # Full-text index behind the student search boxes
+            from student_search import install_student_search
+            for schema, name, error in install_student_search():
+                if error:
+                    print(f"Warning creating student search index (searches fall back to LIKE): {error}")
+            
+            # Daily fund rollup for ledgers written before it existed
+            from daily_fund_summary import backfill_daily_summary
+            rows = backfill_daily_summary()
+            if rows:
+                print(f"Built daily fund summary: {rows} rows")
+            
+            # Rows left behind by deletes made before foreign keys were enforced
+            for table_name, count in foreign_key_problems(db.engine).items():
+                print(f"Warning: {count} {table_name} rows reference missing parent rows (PRAGMA foreign_key_check)")
         else:
             print("PostgreSQL detected - schema managed by migrations")
         
@@ -1659,41 +1980,27 @@ def index():
         flash('No school access configured. Please contact administrator.', 'error')
         return redirect(url_for('logout'))
     
-    # Get school-filtered queries
-    student_query = get_school_filtered_query(Student)
-    expenditure_query = get_school_filtered_query(Expenditure)
-    fund_config_query = get_school_filtered_query(FundConfiguration)
-    
-    total_students = student_query.count()
+    fee_context = get_fee_context()
     
-    # Count students who are paid in full based on fund configuration
-    all_students = student_query.all()
-    paid_in_full = sum(1 for student in all_students if student.is_paid_in_full())
-    outstanding_count = total_students - paid_in_full
+    # Student counts and fund totals, cached per school until its data changes
+    summary = get_school_summary()
+    total_students = summary.total_students
+    paid_in_full = summary.paid_in_full
+    outstanding_count = summary.outstanding_count
     
-    today = datetime.now().date()
+    # Calculate total income from all student payments and other income (school-specific)
+    totals = summary.totals
+    total_pta_income = totals.pta_collected
+    total_sdf_income = totals.sdf_collected
+    total_boarding_income = totals.boarding_collected
+    # Include all other income (not just today's) to balance to 110,000
+    total_other_income = totals.other_income_collected
+    today_expenditure = totals.spent_on_day
     
-    # Calculate total income from all student payments (school-specific)
-    if current_school_id:
-        total_pta_income = db.session.query(db.func.sum(Student.pta_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        total_sdf_income = db.session.query(db.func.sum(Student.sdf_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        total_boarding_income = db.session.query(db.func.sum(Student.boarding_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        # Include all other income (not just today's) to balance to 110,000
-        total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        today_expenditure = expenditure_query.filter_by(date=today).with_entities(db.func.sum(Expenditure.amount_paid)).scalar() or 0
-    else:
-        # Developer view - all schools
-        total_pta_income = db.session.query(db.func.sum(Student.pta_amount_paid)).scalar() or 0
-        total_sdf_income = db.session.query(db.func.sum(Student.sdf_amount_paid)).scalar() or 0
-        total_boarding_income = db.session.query(db.func.sum(Student.boarding_amount_paid)).scalar() or 0
-        # Include all other income (not just today's) to balance to 110,000
-        total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-        today_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(date=today).scalar() or 0
-    
-    today_income = total_pta_income + total_sdf_income + total_boarding_income + total_other_income
+    today_income = totals.total_collected
     
     # Get active fund configuration for current school
-    active_config = fund_config_query.filter_by(is_active=True).first()
+    active_config = fee_context.active_config
     
     # Get recent payments and expenditures for dashboard
     try:
@@ -1776,6 +2083,7 @@ def other_income():
                 balance=balance
             )
             db.session.add(other_income)
+            mark_school_data_changed(current_school_id)
             db.session.commit()
             flash('Other income recorded successfully!', 'success')
             return redirect(url_for('other_income'))
@@ -1783,20 +2091,26 @@ def other_income():
             db.session.rollback()
             flash(f'Error recording other income: {str(e)}', 'error')
     
-    # Get other income records for display
-    other_income_query = get_school_filtered_query(OtherIncome)
-    other_incomes = other_income_query.order_by(OtherIncome.date.desc()).all()
+    # One page of other income records for display, newest first
+    page = get_other_income_page(*get_page_args(request.args))
+    
+    return render_template('other_income.html', income_types=income_types, other_incomes=page.items,
+                           next_cursor=page.next_cursor, page_size=page.page_size)
+
+def get_other_income_page(cursor, page_size):
+    """One keyset page of school-filtered other income records (newest first), decrypted for display."""
+    page = paginate(get_school_filtered_query(OtherIncome), (OtherIncome.date, OtherIncome.id),
+                    cursor, page_size, descending=True)
     
     # Decrypt other income data for display
-    for other_income in other_incomes:
+    for other_income in page.items:
         if other_income.school and other_income.school.encryption_key:
             other_income.decrypted_customer_name = decrypt_sensitive_field(other_income.customer_name, other_income.school_id, other_income.school.encryption_key)
             other_income.decrypted_income_type = decrypt_sensitive_field(other_income.income_type, other_income.school_id, other_income.school.encryption_key)
         else:
             other_income.decrypted_customer_name = other_income.customer_name
             other_income.decrypted_income_type = other_income.income_type
-    
-    return render_template('other_income.html', income_types=income_types, other_incomes=other_incomes)
+    return page
 
 @app.route('/add_other_income', methods=['GET', 'POST'])
 @login_required
@@ -1827,6 +2141,7 @@ def add_other_income():
                 balance=balance
             )
             db.session.add(other_income)
+            mark_school_data_changed(current_school_id)
             db.session.commit()
             flash('Other income recorded successfully!', 'success')
             return redirect(url_for('income'))
@@ -1882,17 +2197,11 @@ def professional_receipts():
         # Developer view - all schools
         receipts = ProfessionalReceipt.query.order_by(ProfessionalReceipt.created_at.desc()).all()
     
-    # Get student information for each receipt
+    # Get student information for all receipts in one query
+    students_by_id = get_students_by_student_ids([receipt.student_id for receipt in receipts])
     receipt_data = []
     for receipt in receipts:
-        # Find student by student_id
-        student_query = get_school_filtered_query(Student)
-        students = student_query.all()
-        student = None
-        for s in students:
-            if s.student_id == receipt.student_id:
-                student = s
-                break
+        student = students_by_id.get(receipt.student_id)
         
         if student:
             decrypted_data = decrypt_student_data(student)
@@ -1915,25 +2224,24 @@ def students():
     try:
         search_query = request.args.get('search', '').strip()
         
-        # Get school-filtered base query
-        query = get_school_filtered_query(Student)
+        # School-filtered students matching the search box (name, student ID or class)
+        query = match_students(get_school_filtered_query(Student), search_query)
         
-        # Apply search filter if provided (search on encrypted data won't work well)
-        # For now, we'll get all students and filter in Python after decryption
-        students = query.all()
+        # One page of students, sorted by student ID number (0001, 0002, 0003, etc.)
+        cursor, page_size = get_page_args(request.args)
+        page = paginate(query, student_sort_keys(), cursor, page_size)
         
-        # Decrypt student data for display and apply search filter
+        # Decrypt student data for display
         decrypted_students = []
-        for student in students:
+        for student in page.items:
             try:
                 decrypted_data = decrypt_student_data(student)
-                if not search_query or search_query.lower() in decrypted_data['name'].lower():
-                    student.decrypted_student_id = decrypted_data['student_id']
-                    student.decrypted_name = decrypted_data['name']
-                    student.decrypted_sex = decrypted_data['sex']
-                    student.decrypted_form_class = decrypted_data['form_class']
-                    student.decrypted_parent_phone = decrypted_data['parent_phone']
-                    decrypted_students.append(student)
+                student.decrypted_student_id = decrypted_data['student_id']
+                student.decrypted_name = decrypted_data['name']
+                student.decrypted_sex = decrypted_data['sex']
+                student.decrypted_form_class = decrypted_data['form_class']
+                student.decrypted_parent_phone = decrypted_data['parent_phone']
+                decrypted_students.append(student)
             except Exception as e:
                 print(f"Error decrypting student data: {e}")
                 # Use raw data as fallback
@@ -1946,28 +2254,9 @@ def students():
         
         students = decrypted_students
         
-        # Sort students by student ID number (0001, 0002, 0003, etc.)
-        students.sort(key=lambda x: int(x.decrypted_student_id) if x.decrypted_student_id.isdigit() else 9999)
-        
-        # Calculate statistics
-        stats = {}
-        total_girls = 0
-        total_boys = 0
-        
-        for student in students:
-            form_class = student.decrypted_form_class
-            if form_class not in stats:
-                stats[form_class] = {'girls': 0, 'boys': 0, 'total': 0}
-            
-            if student.decrypted_sex == 'Female':
-                stats[form_class]['girls'] += 1
-                total_girls += 1
-            else:
-                stats[form_class]['boys'] += 1
-                total_boys += 1
-            
-            stats[form_class]['total'] += 1
-        
+        # Enrollment and fee collection of every matching student from one grouped query
+        breakdown = collection_breakdown(query)
+        stats, total_girls, total_boys = breakdown.enrollment()
         total_enrollment = total_girls + total_boys
         
         return render_template('students.html', 
@@ -1976,7 +2265,10 @@ def students():
                              stats=stats,
                              total_girls=total_girls,
                              total_boys=total_boys,
-                             total_enrollment=total_enrollment)
+                             total_enrollment=total_enrollment,
+                             class_collection=breakdown.by_class(),
+                             next_cursor=page.next_cursor,
+                             page_size=page.page_size)
     except Exception as e:
         print(f"Error in students route: {e}")
         flash('Error loading students page. Please try again.', 'error')
@@ -2011,6 +2303,7 @@ def edit_student(student_id):
             
 
             
+            mark_school_data_changed(student.school_id)
             db.session.commit()
             flash('Student details updated successfully!', 'success')
             return redirect(url_for('students'))
@@ -2036,12 +2329,16 @@ def add_student():
     
     if request.method == 'POST':
         try:
-            student_id_input = request.form['student_id']
+            student_id_input = request.form['student_id'].strip()
             name = request.form['name']
             sex = request.form['sex']
             form_class = request.form['form_class']
             parent_phone = request.form.get('parent_phone', '').strip() or None
             
+            # Take the next number atomically when no ID was entered
+            if not student_id_input:
+                student_id_input = f"{next_sequence_value(current_school_id, STUDENT_ID):04d}"
+            
             # Check if this ID already exists
             existing_student = Student.query.filter_by(school_id=current_school_id, student_id=student_id_input).first()
             if existing_student:
@@ -2059,6 +2356,10 @@ def add_student():
             )
             
             db.session.add(student)
+            if student_id_input.isdigit():
+                # Keep the sequence ahead of manually entered IDs
+                advance_sequence(current_school_id, STUDENT_ID, int(student_id_input))
+            mark_school_data_changed(current_school_id)
             db.session.commit()
             
             flash(f'Student added successfully with ID: {student_id_input}!', 'success')
@@ -2071,6 +2372,37 @@ def add_student():
     
     return render_template('add_student.html', generated_id=generate_student_id())
 
+@app.route('/import_students', methods=['GET', 'POST'])
+@login_required
+def import_students_upload():
+    """Bulk enrolment from an uploaded CSV file (see student_import.py for the columns)"""
+    current_school_id = get_current_school_id()
+    if not current_school_id:
+        flash('No school access configured. Please contact administrator.', 'error')
+        return redirect(url_for('index'))
+    
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV file to import.', 'error')
+            return render_template('import_students.html', result=None)
+        try:
+            import io
+            stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            result = import_students(current_school_id, stream, dry_run=bool(request.form.get('dry_run')))
+            if result.errors:
+                flash(f'Imported {result.imported} students; {result.failed} rows were skipped (see the report below).', 'warning')
+            else:
+                flash(f'Imported {result.imported} students successfully!', 'success')
+        except UnicodeDecodeError:
+            flash('The file is not a UTF-8 CSV file. Please save it as "CSV UTF-8" and try again.', 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error importing students: {str(e)}', 'error')
+    
+    return render_template('import_students.html', result=result)
+
 @app.route('/income')
 @login_required
 def income():
@@ -2086,105 +2418,81 @@ def income():
         'student_id': request.args.get('student_id', '')
     }
     
-    # Get active config for current school
-    fund_config_query = get_school_filtered_query(FundConfiguration)
-    active_config = fund_config_query.filter_by(is_active=True).first()
-    PTA_EXPECTED = active_config.pta_amount if active_config else 45000
-    SDF_EXPECTED = active_config.sdf_amount if active_config else 5000
-    BOARDING_EXPECTED = active_config.boarding_amount if active_config else 0
+    # One page of school-filtered students matching the search, sorted by name
+    page = get_income_page(search_query)
     
-    # Get school-filtered students (search on encrypted data won't work, so we'll filter after decryption)
-    student_query = get_school_filtered_query(Student)
-    all_students = student_query.all()
+    # Calculate totals from actual student payments and other income (school-filtered)
+    totals = get_financial_totals()
+    pta_total = totals.pta_collected
+    sdf_total = totals.sdf_collected
+    boarding_total = totals.boarding_collected
     
-    # Filter students after decryption
-    students = []
-    for student in all_students:
-        decrypted_data = decrypt_student_data(student)
-        
-        # Apply search filters
-        if search_query['student_name'] and search_query['student_name'].lower() not in decrypted_data['name'].lower():
-            continue
-        if search_query['form_class'] and search_query['form_class'].lower() not in decrypted_data['form_class'].lower():
-            continue
-        if search_query['student_id'] and search_query['student_id'].lower() not in decrypted_data['student_id'].lower():
-            continue
-        
-        # Add decrypted data to student object for template use
-        student.decrypted_data = decrypted_data
-        student.decrypted_student_id = decrypted_data['student_id']
-        student.decrypted_name = decrypted_data['name']
-        student.decrypted_sex = decrypted_data['sex']
-        student.decrypted_form_class = decrypted_data['form_class']
-        students.append(student)
-    
-    # Sort by decrypted name
-    students.sort(key=lambda x: x.decrypted_data['name'])
-    
-    # Calculate totals from actual student payments (school-filtered)
-    if current_school_id:
-        pta_total = db.session.query(db.func.sum(Student.pta_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        sdf_total = db.session.query(db.func.sum(Student.sdf_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        boarding_total = db.session.query(db.func.sum(Student.boarding_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-    else:
-        # Developer view - all schools
-        pta_total = db.session.query(db.func.sum(Student.pta_amount_paid)).scalar() or 0
-        sdf_total = db.session.query(db.func.sum(Student.sdf_amount_paid)).scalar() or 0
-        boarding_total = db.session.query(db.func.sum(Student.boarding_amount_paid)).scalar() or 0
-    
-    # Get other income total (school-filtered)
-    try:
-        other_income_query = get_school_filtered_query(OtherIncome)
-        other_income_total = other_income_query.with_entities(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-        other_incomes = other_income_query.order_by(OtherIncome.date.desc()).all()
-        
-        # Decrypt other income data for display
-        for other_income in other_incomes:
-            if other_income.school and other_income.school.encryption_key:
-                other_income.decrypted_customer_name = decrypt_sensitive_field(other_income.customer_name, other_income.school_id, other_income.school.encryption_key)
-                other_income.decrypted_income_type = decrypt_sensitive_field(other_income.income_type, other_income.school_id, other_income.school.encryption_key)
-            else:
-                other_income.decrypted_customer_name = other_income.customer_name
-                other_income.decrypted_income_type = other_income.income_type
-    except Exception as e:
-        print(f"Error fetching other income: {e}")
-        other_income_total = 0
-        other_incomes = []
+    # Newest page of other income (school-filtered); the rest is paged on /other_income
+    other_income_total = totals.other_income_collected
+    other_income_page = get_other_income_page(None, page.page_size)
+    other_income_more_url = (url_for('other_income', cursor=other_income_page.next_cursor,
+                                     page_size=other_income_page.page_size)
+                             if other_income_page.has_more else None)
     
     # Calculate grand total
     grand_total = pta_total + sdf_total + boarding_total + other_income_total
     
+    return render_template(
+        'income.html',
+        pta_total=pta_total,
+        sdf_total=sdf_total,
+        boarding_total=boarding_total,
+        other_income_total=other_income_total,
+        grand_total=grand_total,
+        other_incomes=other_income_page.items,
+        other_income_more_url=other_income_more_url,
+        search_query=search_query,
+        recorded_payments=build_income_records(page.items),
+        next_cursor=page.next_cursor,
+        page_size=page.page_size
+    )
+
+def get_income_page(search_query):
+    """One keyset page of students for the income views, filtered by the search and sorted by name."""
+    student_query = filter_students(
+        get_school_filtered_query(Student),
+        name=search_query.get('student_name'),
+        form_class=search_query.get('form_class'),
+        student_id=search_query.get('student_id')
+    )
+    cursor, page_size = get_page_args(request.args)
+    return paginate(student_query, (Student.name, Student.id), cursor, page_size)
+
+def build_income_records(students):
+    """Payment rows of the income page for the given students (one page)."""
+    fee_context = get_fee_context()
+    
+    # Latest payment of the page's students from a single query
+    latest_payments = get_latest_payments(student_ids=[student.student_id for student in students])
+    
     # Create unique student records for display (no duplicates)
     student_records = []
     for student in students:
-        # Use per-student required if set, else use config
-        pta_expected = student.pta_required if student.pta_required else PTA_EXPECTED
-        sdf_expected = student.sdf_required if student.sdf_required else SDF_EXPECTED
-        boarding_expected = student.boarding_required if student.boarding_required else BOARDING_EXPECTED
+        decrypted_data = decrypt_student_data(student)
         
-        # Get latest payment date for this student
-        income_query = get_school_filtered_query(Income)
-        student_incomes = [inc for inc in income_query.all() if inc.student_id == student.student_id]
-        latest_payment_date = max([inc.payment_date for inc in student_incomes]) if student_incomes else None
+        # Use per-student required if set, else use config
+        pta_expected = student.pta_required if student.pta_required else fee_context.pta_amount
+        sdf_expected = student.sdf_required if student.sdf_required else fee_context.sdf_amount
+        boarding_expected = student.boarding_required if student.boarding_required else fee_context.boarding_amount
         
-        # Get latest deposit reference
-        latest_deposit_ref = None
-        if student_incomes:
-            latest_income = max(student_incomes, key=lambda x: x.payment_date)
-            if latest_income.payment_reference:
-                if latest_income.school and latest_income.school.encryption_key:
-                    latest_deposit_ref = decrypt_sensitive_field(latest_income.payment_reference, latest_income.school_id, latest_income.school.encryption_key)
-                else:
-                    latest_deposit_ref = latest_income.payment_reference
+        # Get latest payment date and deposit reference for this student
+        latest_payment = latest_payments.get((student.school_id, student.student_id), {})
+        latest_payment_date = latest_payment.get('payment_date')
+        latest_deposit_ref = latest_payment.get('payment_reference')
         
         total_balance = (pta_expected + sdf_expected + boarding_expected) - (student.pta_amount_paid + student.sdf_amount_paid + student.boarding_amount_paid)
         
         student_records.append({
             'date': latest_payment_date,
-            'student_id': student.decrypted_student_id,
-            'student_name': student.decrypted_name,
-            'sex': student.decrypted_sex,
-            'form_class': student.decrypted_form_class,
+            'student_id': decrypted_data['student_id'],
+            'student_name': decrypted_data['name'],
+            'sex': decrypted_data['sex'],
+            'form_class': decrypted_data['form_class'],
             'deposit_ref_no': latest_deposit_ref or 'N/A',
             'pta_paid': student.pta_amount_paid,
             'sdf_paid': student.sdf_amount_paid,
@@ -2193,18 +2501,7 @@ def income():
             'can_download_receipt': student.is_paid_in_full(),
             'student_db_id': student.id
         })
-    
-    return render_template(
-        'income.html',
-        pta_total=pta_total,
-        sdf_total=sdf_total,
-        boarding_total=boarding_total,
-        other_income_total=other_income_total,
-        grand_total=grand_total,
-        other_incomes=other_incomes,
-        search_query=search_query,
-        recorded_payments=student_records
-    )
+    return student_records
 
 
 # New route: Grouped income by student (PTA and SDF side by side)
@@ -2217,16 +2514,15 @@ def income_grouped():
         return redirect(url_for('logout'))
     
     # Get active fund configuration for current school
-    fund_config_query = get_school_filtered_query(FundConfiguration)
-    active_config = fund_config_query.filter_by(is_active=True).first()
-    PTA_EXPECTED = active_config.pta_amount if active_config else 45000
-    SDF_EXPECTED = active_config.sdf_amount if active_config else 5000
-    BOARDING_EXPECTED = active_config.boarding_amount if active_config else 0
-    # Get school-filtered students
-    student_query = get_school_filtered_query(Student)
-    students = student_query.all()
-    
-    # Decrypt and sort students
+    fee_context = get_fee_context()
+    PTA_EXPECTED = fee_context.pta_amount
+    SDF_EXPECTED = fee_context.sdf_amount
+    BOARDING_EXPECTED = fee_context.boarding_amount
+    # One page of school-filtered students, sorted by name
+    page = get_income_page({})
+    students = page.items
+    
+    # Decrypt students
     for student in students:
         decrypted_data = decrypt_student_data(student)
         student.decrypted_data = decrypted_data
@@ -2236,7 +2532,7 @@ def income_grouped():
         student.decrypted_form_class = decrypted_data['form_class']
         student.decrypted_parent_phone = decrypted_data['parent_phone']
     
-    students.sort(key=lambda x: x.decrypted_data['name'])
+    latest_payments = get_latest_payments(student_ids=[student.student_id for student in students])
     for student in students:
         # Use per-student required if set, else use config
         student.pta_expected = student.pta_required if student.pta_required else PTA_EXPECTED
@@ -2248,19 +2544,11 @@ def income_grouped():
         student.total_paid = student.pta_amount_paid + student.sdf_amount_paid + student.boarding_amount_paid
         student.total_balance = (student.pta_expected + student.sdf_expected + student.boarding_expected) - student.total_paid
         # Get last payment date and last deposit slip ref (school-filtered)
-        income_query = get_school_filtered_query(Income)
-        student_incomes = [inc for inc in income_query.all() if inc.student_id == student.student_id]
-        last_income = max(student_incomes, key=lambda x: x.payment_date) if student_incomes else None
-        
-        student.last_payment_date = last_income.payment_date if last_income else None
-        if last_income and last_income.payment_reference:
-            if last_income.school and last_income.school.encryption_key:
-                student.last_deposit_slip = decrypt_sensitive_field(last_income.payment_reference, last_income.school_id, last_income.school.encryption_key)
-            else:
-                student.last_deposit_slip = last_income.payment_reference
-        else:
-            student.last_deposit_slip = None
-    return render_template('income_grouped.html', students=students)
+        last_payment = latest_payments.get((student.school_id, student.student_id), {})
+        student.last_payment_date = last_payment.get('payment_date')
+        student.last_deposit_slip = last_payment.get('payment_reference') or None
+    return render_template('income_grouped.html', students=students,
+                           next_cursor=page.next_cursor, page_size=page.page_size)
 
 @app.route('/edit_income/<int:student_id>', methods=['GET', 'POST'])
 @login_required
@@ -2298,6 +2586,7 @@ def edit_income(student_id):
                 else:
                     latest_income.payment_reference = default_ref
             
+            mark_school_data_changed(current_school_id)
             db.session.commit()
             flash('Student payment information updated successfully!', 'success')
             return redirect(url_for('income'))
@@ -2326,45 +2615,19 @@ def add_income():
         flash('No school access configured. Please contact administrator.', 'error')
         return redirect(url_for('index'))
     
-    # Get school-filtered students and active config
-    student_query = get_school_filtered_query(Student)
-    students = student_query.all()
-    
-    # Set decrypted fields for template use
-    for student in students:
-        decrypted_data = decrypt_student_data(student)
-        student.decrypted_student_id = decrypted_data['student_id']
-        student.decrypted_name = decrypted_data['name']
-        student.decrypted_sex = decrypted_data['sex']
-        student.decrypted_form_class = decrypted_data['form_class']
-    
     fund_config_query = get_school_filtered_query(FundConfiguration)
     active_config = fund_config_query.filter_by(is_active=True).first()
     
-    # Convert students to JSON for JavaScript (with decrypted data)
-    import json
-    students_json = []
-    for student in students:
-        decrypted_data = decrypt_student_data(student)
-        students_json.append({
-            'student_id': decrypted_data['student_id'],
-            'name': decrypted_data['name'],
-            'pta_required': float(student.pta_required),
-            'sdf_required': float(student.sdf_required),
-            'boarding_required': float(student.boarding_required),
-            'pta_amount_paid': float(student.pta_amount_paid),
-            'sdf_amount_paid': float(student.sdf_amount_paid),
-            'boarding_amount_paid': float(student.boarding_amount_paid),
-            'pta_balance': float(student.get_pta_balance()),
-            'sdf_balance': float(student.get_sdf_balance()),
-            'boarding_balance': float(student.get_boarding_balance())
-        })
-    students_json = json.dumps(students_json)
+    # Students are looked up as the user types (/api/students/autocomplete)
+    # instead of being preloaded; the form posts the chosen student's primary key
+    students = []
+    students_json = '[]'
     
     if request.method == 'POST':
         try:
-            student_name = request.form['student_name_search']
-            student_id = request.form['student_id']
+            student_name = request.form.get('student_name_search', '')
+            student_id = request.form.get('student_id', '')
+            student_db_id = request.form.get('student_db_id', type=int)
             payment_date = request.form['payment_date']
             deposit_ref_no = request.form['deposit_ref_no']
             
@@ -2378,12 +2641,14 @@ def add_income():
                 flash('Please enter at least one payment amount!', 'error')
                 return render_template('add_income.html', students=students, active_config=active_config, students_json=students_json)
             
-            # Get student (find by decrypted name)
-            student = None
-            for s in students:
-                if decrypt_student_data(s)['name'] == student_name:
-                    student = s
-                    break
+            # Get student by primary key; older forms send the student number or name
+            student_query = get_school_filtered_query(Student)
+            if student_db_id:
+                student = student_query.filter_by(id=student_db_id).first()
+            elif student_id:
+                student = get_student_by_student_id(student_id, current_school_id)
+            else:
+                student = student_query.filter_by(name=student_name).order_by(Student.id).first()
             
             if not student:
                 flash('Student not found!', 'error')
@@ -2478,6 +2743,7 @@ def add_income():
                 
                 db.session.add(income_record)
                 db.session.add(receipt)
+            mark_school_data_changed(current_school_id)
             db.session.commit()
             
             # Send SMS confirmation to parent if phone number exists (but don't let SMS errors affect the payment)
@@ -2509,6 +2775,125 @@ def add_income():
     
     return render_template('add_income.html', students=students, active_config=active_config, students_json=students_json)
 
+@app.route('/bulk_payments', methods=['GET', 'POST'])
+@login_required
+def bulk_payments():
+    """Post a whole deposit-slip file of payments at once (see bulk_payments.py for the columns)"""
+    current_school_id = get_current_school_id()
+    if not current_school_id:
+        flash('No school access configured. Please contact administrator.', 'error')
+        return redirect(url_for('index'))
+    
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV file of payments.', 'error')
+            return render_template('bulk_payments.html', result=None)
+        try:
+            import io
+            stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            dry_run = bool(request.form.get('dry_run'))
+            result = post_payments(current_school_id, read_payment_rows(stream), dry_run=dry_run)
+            if result.sms_queued:
+                wake_sms_sender(app)
+            posted = 'Checked' if dry_run else 'Posted'
+            if result.errors:
+                flash(f'{posted} {result.posted} payments; {result.failed} rows were rejected (see the report below).', 'warning')
+            else:
+                flash(f'{posted} {result.posted} payments (MK {result.total_amount:,.2f}) successfully!', 'success')
+        except UnicodeDecodeError:
+            flash('The file is not a UTF-8 CSV file. Please save it as "CSV UTF-8" and try again.', 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error posting payments: {str(e)}', 'error')
+    
+    return render_template('bulk_payments.html', result=result)
+
+@app.route('/api/payments/batch', methods=['POST'])
+@login_required
+def api_post_payments():
+    """Post a JSON batch of payments: {"payments": [{student_id, date, deposit_ref, pta, sdf, boarding}], "dry_run": false}"""
+    current_school_id = get_current_school_id()
+    if not current_school_id:
+        return jsonify({'error': 'No school access configured'}), 403
+    
+    data = request.get_json(silent=True)
+    payments = data.get('payments') if isinstance(data, dict) else data
+    if not isinstance(payments, list) or not all(isinstance(payment, dict) for payment in payments):
+        return jsonify({'error': 'Expected a list of payments'}), 400
+    
+    try:
+        rows = ((number, canonical_row(payment)) for number, payment in enumerate(payments, start=1))
+        result = post_payments(current_school_id, rows,
+                               dry_run=bool(isinstance(data, dict) and data.get('dry_run')))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    if result.sms_queued:
+        wake_sms_sender(app)
+    return jsonify(result.to_dict())
+
+@app.route('/reconciliation', methods=['GET', 'POST'])
+@login_required
+def reconciliation():
+    """Upload a bank statement export and match its credit lines to the posted deposit slips"""
+    current_school_id = get_current_school_id()
+    if not current_school_id:
+        flash('No school access configured. Please contact administrator.', 'error')
+        return redirect(url_for('index'))
+    
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV bank statement.', 'error')
+            return redirect(url_for('reconciliation'))
+        try:
+            import io
+            stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            result = reconcile_statement(current_school_id, stream)
+            flash(f'{result.new_lines} new statement lines: {result.exact} exact and {result.fuzzy} fuzzy matches, '
+                  f'{result.unmatched} unmatched.', 'warning' if result.unmatched or result.errors else 'success')
+        except UnicodeDecodeError:
+            flash('The file is not a UTF-8 CSV file. Please save it as "CSV UTF-8" and try again.', 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error reconciling statement: {str(e)}', 'error')
+    
+    counts = dict(db.session.query(BankStatementLine.status, db.func.count(BankStatementLine.id))
+                  .filter(BankStatementLine.school_id == current_school_id)
+                  .group_by(BankStatementLine.status).all())
+    return render_template('reconciliation.html', result=result, counts=counts)
+
+@app.route('/api/reconciliation')
+@login_required
+def api_reconciliation():
+    """One page of statement lines as JSON (newest first), optionally ?status=exact|fuzzy|unmatched"""
+    query = get_school_filtered_query(BankStatementLine)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(BankStatementLine.status == status)
+    cursor, page_size = get_page_args(request.args)
+    page = paginate(query, (BankStatementLine.transaction_date, BankStatementLine.id), cursor, page_size,
+                    descending=True)
+    lines = [{
+        'id': line.id,
+        'transaction_date': line.transaction_date.isoformat(),
+        'reference': line.reference,
+        'description': line.description,
+        'amount': line.amount,
+        'status': line.status,
+        'ledger_key': line.ledger_key,
+        'note': line.note
+    } for line in page.items]
+    
+    return jsonify({
+        'items': lines,
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size
+    })
+
 @app.route('/expenditure')
 @login_required
 def expenditure():
@@ -2518,39 +2903,30 @@ def expenditure():
             flash('No school access configured. Please contact administrator.', 'error')
             return redirect(url_for('index'))
         
-        # Get school-filtered expenditures
-        expenditure_query = get_school_filtered_query(Expenditure)
-        expenditures = expenditure_query.order_by(Expenditure.date.desc()).all()
+        # One page of school-filtered expenditures, newest first
+        page = get_expenditure_page()
         
-        # Calculate total collections from students (school-filtered)
-        if current_school_id:
-            pta_collected = db.session.query(db.func.sum(Student.pta_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            sdf_collected = db.session.query(db.func.sum(Student.sdf_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            boarding_collected = db.session.query(db.func.sum(Student.boarding_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            other_income_collected = db.session.query(db.func.sum(OtherIncome.amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='PTA').scalar() or 0
-            sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='SDF').scalar() or 0
-            boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='Boarding').scalar() or 0
-            other_income_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='Other Income').scalar() or 0
-        else:
-            # Developer view - all schools
-            pta_collected = db.session.query(db.func.sum(Student.pta_amount_paid)).scalar() or 0
-            sdf_collected = db.session.query(db.func.sum(Student.sdf_amount_paid)).scalar() or 0
-            boarding_collected = db.session.query(db.func.sum(Student.boarding_amount_paid)).scalar() or 0
-            other_income_collected = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-            pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='PTA').scalar() or 0
-            sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='SDF').scalar() or 0
-            boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='Boarding').scalar() or 0
-            other_income_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='Other Income').scalar() or 0
+        # Calculate collections and spending per fund (school-filtered)
+        totals = get_financial_totals()
+        pta_collected = totals.pta_collected
+        sdf_collected = totals.sdf_collected
+        boarding_collected = totals.boarding_collected
+        other_income_collected = totals.other_income_collected
+        pta_expenditure = totals.pta_spent
+        sdf_expenditure = totals.sdf_spent
+        boarding_expenditure = totals.boarding_spent
+        other_income_expenditure = totals.other_income_spent
         
         # Calculate remaining balances
-        pta_balance = pta_collected - pta_expenditure
-        sdf_balance = sdf_collected - sdf_expenditure
-        boarding_balance = boarding_collected - boarding_expenditure
-        other_income_balance = other_income_collected - other_income_expenditure
+        pta_balance = totals.pta_balance
+        sdf_balance = totals.sdf_balance
+        boarding_balance = totals.boarding_balance
+        other_income_balance = totals.other_income_balance
         
         return render_template('expenditure.html', 
-                             expenditures=expenditures, 
+                             expenditures=page.items, 
+                             next_cursor=page.next_cursor,
+                             page_size=page.page_size,
                              pta_collected=pta_collected,
                              sdf_collected=sdf_collected,
                              boarding_collected=boarding_collected,
@@ -2568,6 +2944,12 @@ def expenditure():
         flash('Error loading expenditure page. Please try again.', 'error')
         return redirect(url_for('simple_dashboard'))
 
+def get_expenditure_page():
+    """One keyset page of school-filtered expenditures, newest first."""
+    cursor, page_size = get_page_args(request.args)
+    return paginate(get_school_filtered_query(Expenditure), (Expenditure.date, Expenditure.id),
+                    cursor, page_size, descending=True)
+
 @app.route('/add_expenditure', methods=['GET', 'POST'])
 @login_required
 def add_expenditure():
@@ -2588,6 +2970,7 @@ def add_expenditure():
                 fund_type=request.form['fund_type']
             )
             db.session.add(expenditure)
+            mark_school_data_changed(current_school_id)
             db.session.commit()
             flash('Expenditure recorded successfully!', 'success')
             return redirect(url_for('expenditure'))
@@ -2600,50 +2983,45 @@ def add_expenditure():
 def reports():
     return render_template('reports.html')
 
+def get_report_fund_totals(start_date, end_date):
+    """Template values shared by the daily and weekly reports, read from the daily fund rollup.
+    Collected and balance figures are all-time; *_expenditure and period_other_income cover the period.
+    """
+    period = get_fund_totals(start_date, end_date)
+    overall = get_fund_totals()
+    values = {
+        'total_other_income': overall[OTHER_INCOME_FUND]['other_income'],
+        'period_other_income': period[OTHER_INCOME_FUND]['other_income'],
+    }
+    for fund, key in (('PTA', 'pta'), ('SDF', 'sdf'), ('Boarding', 'boarding')):
+        collected = overall[fund]['income']
+        spent = overall[fund]['expenditure']
+        values[f'{key}_collected'] = collected
+        values[f'{key}_income'] = collected
+        values[f'{key}_expenditure'] = period[fund]['expenditure']
+        values[f'total_{key}_expenditure'] = spent
+        values[f'{key}_balance'] = collected - spent
+    return values
+
 @app.route('/daily_report')
 @login_required
 def daily_report():
+    current_school_id = get_current_school_id()
+    if not current_school_id and session.get('user_role') != 'developer':
+        flash('No school access configured. Please contact administrator.', 'error')
+        return redirect(url_for('index'))
+    
     date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
     report_date = datetime.strptime(date, '%Y-%m-%d').date()
     
-    # Get income records for the specific date
-    daily_income = Income.query.filter_by(payment_date=report_date).all()
-    daily_expenditure = Expenditure.query.filter_by(date=report_date).all()
+    # The day's school-filtered records for the listing
+    daily_income = get_school_filtered_query(Income).filter(Income.payment_date == report_date).all()
+    daily_expenditure = get_school_filtered_query(Expenditure).filter(Expenditure.date == report_date).all()
+    daily_other_income = get_school_filtered_query(OtherIncome).filter(OtherIncome.date == report_date).all()
     
-    # Get other income for the specific date
-    try:
-        daily_other_income = OtherIncome.query.filter_by(date=report_date).all()
-        daily_other_income_total = sum(oi.amount_paid for oi in daily_other_income)
-        total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-    except:
-        daily_other_income = []
-        daily_other_income_total = 0
-        total_other_income = 0
-    
-    # Calculate totals from Income table (cumulative totals)
-    pta_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='PTA').scalar() or 0
-    sdf_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='SDF').scalar() or 0
-    boarding_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='Boarding').scalar() or 0
-    
-    # Calculate income collected for the specific date
-    pta_income = sum(i.amount_paid for i in daily_income if i.fee_type == 'PTA')
-    sdf_income = sum(i.amount_paid for i in daily_income if i.fee_type == 'SDF')
-    boarding_income = sum(i.amount_paid for i in daily_income if i.fee_type == 'Boarding')
-    
-    # Calculate total expenditure by fund type
-    total_pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='PTA').scalar() or 0
-    total_sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='SDF').scalar() or 0
-    total_boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='Boarding').scalar() or 0
-    
-    # Calculate expenditure for the specific date
-    daily_pta_expenditure = sum(e.amount_paid for e in daily_expenditure if e.fund_type == 'PTA')
-    daily_sdf_expenditure = sum(e.amount_paid for e in daily_expenditure if e.fund_type == 'SDF')
-    daily_boarding_expenditure = sum(e.amount_paid for e in daily_expenditure if e.fund_type == 'Boarding')
-    
-    # Calculate remaining balances
-    pta_balance = pta_collected - total_pta_expenditure
-    sdf_balance = sdf_collected - total_sdf_expenditure
-    boarding_balance = boarding_collected - total_boarding_expenditure
+    # Day and all-time totals per fund from the rollup
+    totals = get_report_fund_totals(report_date, report_date)
+    daily_other_income_total = totals.pop('period_other_income')
     
     return render_template('daily_report.html', 
                          date=report_date,
@@ -2651,22 +3029,7 @@ def daily_report():
                          daily_expenditure=daily_expenditure,
                          daily_other_income=daily_other_income,
                          daily_other_income_total=daily_other_income_total,
-                         total_other_income=total_other_income,
-                         pta_collected=pta_collected,
-                         sdf_collected=sdf_collected,
-                         boarding_collected=boarding_collected,
-                         pta_income=pta_collected,
-                         sdf_income=sdf_collected,
-                         boarding_income=boarding_collected,
-                         pta_expenditure=daily_pta_expenditure,
-                         sdf_expenditure=daily_sdf_expenditure,
-                         boarding_expenditure=daily_boarding_expenditure,
-                         total_pta_expenditure=total_pta_expenditure,
-                         total_sdf_expenditure=total_sdf_expenditure,
-                         total_boarding_expenditure=total_boarding_expenditure,
-                         pta_balance=pta_balance,
-                         sdf_balance=sdf_balance,
-                         boarding_balance=boarding_balance)
+                         **totals)
 
 @app.route('/weekly_report')
 @login_required
@@ -2679,67 +3042,23 @@ def weekly_report():
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=6)
     
-    # Get school-filtered income and expenditure records for the week
-    income_query = get_school_filtered_query(Income)
-    expenditure_query = get_school_filtered_query(Expenditure)
-    weekly_income = income_query.filter(
+    # The week's school-filtered records for the listing
+    weekly_income = get_school_filtered_query(Income).filter(
         Income.payment_date >= start_date,
         Income.payment_date <= end_date
     ).all()
-    
-    weekly_expenditure = expenditure_query.filter(
+    weekly_expenditure = get_school_filtered_query(Expenditure).filter(
         Expenditure.date >= start_date,
         Expenditure.date <= end_date
     ).all()
+    weekly_other_income = get_school_filtered_query(OtherIncome).filter(
+        OtherIncome.date >= start_date,
+        OtherIncome.date <= end_date
+    ).all()
     
-    # Get school-filtered other income for the week
-    try:
-        other_income_query = get_school_filtered_query(OtherIncome)
-        weekly_other_income = other_income_query.filter(
-            OtherIncome.date >= start_date,
-            OtherIncome.date <= end_date
-        ).all()
-        weekly_other_income_total = sum(oi.amount_paid for oi in weekly_other_income)
-        if current_school_id:
-            total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        else:
-            total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-    except:
-        weekly_other_income = []
-        weekly_other_income_total = 0
-        total_other_income = 0
-    
-    # Calculate totals from Income table (cumulative totals)
-    pta_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='PTA').scalar() or 0
-    sdf_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='SDF').scalar() or 0
-    boarding_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='Boarding').scalar() or 0
-    
-    # Calculate total expenditures (cumulative) - school-filtered
-    if current_school_id:
-        pta_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(school_id=current_school_id, fee_type='PTA').scalar() or 0
-        sdf_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(school_id=current_school_id, fee_type='SDF').scalar() or 0
-        boarding_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(school_id=current_school_id, fee_type='Boarding').scalar() or 0
-        total_pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='PTA').scalar() or 0
-        total_sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='SDF').scalar() or 0
-        total_boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='Boarding').scalar() or 0
-    else:
-        # Developer view - all schools
-        pta_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='PTA').scalar() or 0
-        sdf_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='SDF').scalar() or 0
-        boarding_collected = db.session.query(db.func.sum(Income.amount_paid)).filter_by(fee_type='Boarding').scalar() or 0
-        total_pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='PTA').scalar() or 0
-        total_sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='SDF').scalar() or 0
-        total_boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='Boarding').scalar() or 0
-    
-    # Calculate expenditure for the week
-    weekly_pta_expenditure = sum(e.amount_paid for e in weekly_expenditure if e.fund_type == 'PTA')
-    weekly_sdf_expenditure = sum(e.amount_paid for e in weekly_expenditure if e.fund_type == 'SDF')
-    weekly_boarding_expenditure = sum(e.amount_paid for e in weekly_expenditure if e.fund_type == 'Boarding')
-    
-    # Calculate remaining balances
-    pta_balance = pta_collected - total_pta_expenditure
-    sdf_balance = sdf_collected - total_sdf_expenditure
-    boarding_balance = boarding_collected - total_boarding_expenditure
+    # Week and all-time totals per fund from the rollup
+    totals = get_report_fund_totals(start_date, end_date)
+    weekly_other_income_total = totals.pop('period_other_income')
     
     return render_template('weekly_report.html',
                          start_date=start_date,
@@ -2748,22 +3067,25 @@ def weekly_report():
                          weekly_expenditure=weekly_expenditure,
                          weekly_other_income=weekly_other_income,
                          weekly_other_income_total=weekly_other_income_total,
-                         total_other_income=total_other_income,
-                         pta_collected=pta_collected,
-                         sdf_collected=sdf_collected,
-                         boarding_collected=boarding_collected,
-                         pta_income=pta_collected,
-                         sdf_income=sdf_collected,
-                         boarding_income=boarding_collected,
-                         pta_expenditure=weekly_pta_expenditure,
-                         sdf_expenditure=weekly_sdf_expenditure,
-                         boarding_expenditure=weekly_boarding_expenditure,
-                         total_pta_expenditure=total_pta_expenditure,
-                         total_sdf_expenditure=total_sdf_expenditure,
-                         total_boarding_expenditure=total_boarding_expenditure,
-                         pta_balance=pta_balance,
-                         sdf_balance=sdf_balance,
-                         boarding_balance=boarding_balance)
+                         **totals)
+
+@app.route('/api/reports/fund_summary')
+@login_required
+def api_fund_summary():
+    """Per-fund totals for any period, e.g. a month or a term (?start_date=, ?end_date=, YYYY-MM-DD)"""
+    try:
+        filters = get_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    funds = get_fund_totals(filters.get('start_date'), filters.get('end_date'))
+    return jsonify({
+        'start_date': filters['start_date'].isoformat() if filters.get('start_date') else None,
+        'end_date': filters['end_date'].isoformat() if filters.get('end_date') else None,
+        'funds': {fund: dict(values) for fund, values in sorted(funds.items())},
+        'total_income': sum(values['income'] + values['other_income'] for values in funds.values()),
+        'total_expenditure': sum(values['expenditure'] for values in funds.values())
+    })
 
 @app.route('/payment_status')
 @login_required
@@ -2773,15 +3095,15 @@ def payment_status():
         flash('No school access configured. Please contact administrator.', 'error')
         return redirect(url_for('index'))
     
-    # Get school-filtered students
-    student_query = get_school_filtered_query(Student)
-    all_students = student_query.all()
+    # Get school-filtered students with their payment status computed in SQL
+    student_rows = StudentBalanceQuery().rows().all()
     
     # Decrypt student data and categorize
     paid_in_full = []
     outstanding = []
     
-    for student in all_students:
+    for row in student_rows:
+        student = row.Student
         decrypted_data = decrypt_student_data(student)
         student.decrypted_student_id = decrypted_data['student_id']
         student.decrypted_name = decrypted_data['name']
@@ -2789,7 +3111,7 @@ def payment_status():
         student.decrypted_form_class = decrypted_data['form_class']
         student.decrypted_parent_phone = decrypted_data['parent_phone']
         
-        if student.is_paid_in_full():
+        if row.payment_status == 'paid':
             paid_in_full.append(student)
         else:
             outstanding.append(student)
@@ -2823,16 +3145,10 @@ def print_multiple_receipts():
     student_ids = student_ids[:2]
     
     receipts_data = []
+    students_by_id = get_students_by_student_ids(student_ids)
     
     for student_id in student_ids:
-        # Get school-filtered students and find by student_id
-        student_query = get_school_filtered_query(Student)
-        students = student_query.all()
-        student = None
-        for s in students:
-            if s.student_id == student_id:
-                student = s
-                break
+        student = students_by_id.get(student_id)
         
         if not student or not student.is_paid_in_full():
             continue
@@ -2848,8 +3164,7 @@ def print_multiple_receipts():
             deposit_ref = existing_receipt.reference_number
         else:
             # Generate new receipt number
-            existing_receipts = ProfessionalReceipt.query.filter_by(school_id=current_school_id).count()
-            receipt_no = f"{existing_receipts + 1:03d}"
+            receipt_no = f"{next_sequence_value(current_school_id, PROFESSIONAL_RECEIPT):03d}"
             
             # Get reference number from latest income record
             income_query = get_school_filtered_query(Income)
@@ -2898,9 +3213,7 @@ def print_multiple_receipts():
     school_address = school_config.school_address if school_config and school_config.school_address else None
     
     # Get active fund configuration
-    fund_config_query = get_school_filtered_query(FundConfiguration)
-    active_config = fund_config_query.filter_by(is_active=True).first()
-    term_name = active_config.term_name if active_config else 'Current Term'
+    term_name = get_fee_context(current_school_id).term_name
     
     return render_template(
         'multiple_receipts.html',
@@ -2967,7 +3280,9 @@ def add_fund_config():
             config.term_name = term_name
             
             db.session.add(config)
+            mark_school_data_changed(current_school_id)
             db.session.commit()
+            invalidate_fee_context(current_school_id)
             flash('Fund configuration updated successfully!', 'success')
             return redirect(url_for('fund_config'))
         except Exception as e:
@@ -3007,7 +3322,9 @@ def edit_fund_config(config_id):
             term_name = request.form['term_name']
             config.term_name = term_name
             
+            mark_school_data_changed(current_school_id)
             db.session.commit()
+            invalidate_fee_context(current_school_id)
             flash('Fund configuration updated successfully!', 'success')
             return redirect(url_for('fund_config'))
         except Exception as e:
@@ -3049,6 +3366,7 @@ def delete_fund_config(config_id):
             return redirect(url_for('fund_config'))
         
         db.session.delete(config)
+        mark_school_data_changed(current_school_id)
         db.session.commit()
         flash(f'Fund configuration "{term_name}" deleted successfully!', 'success')
         
@@ -3088,7 +3406,9 @@ def activate_fund_config(config_id):
         # Activate this configuration
         config.is_active = True
         
+        mark_school_data_changed(current_school_id)
         db.session.commit()
+        invalidate_fee_context(current_school_id)
         flash(f'Fund configuration "{term_name}" activated successfully!', 'success')
         
     except Exception as e:
@@ -3110,34 +3430,25 @@ def api_generate_student_id():
 @app.route('/api/send_sms_reminders', methods=['POST'])
 @login_required
 def send_sms_reminders():
-    # Get school-filtered students
-    student_query = get_school_filtered_query(Student)
-    all_students = student_query.all()
-    outstanding = [student for student in all_students if not student.is_paid_in_full()]
+    # Outstanding students with a parent phone, filtered in the database
+    outstanding = StudentBalanceQuery().where_not_paid().where_has_phone().columns(Student.name, Student.parent_phone).all()
     
     reminders = []
     for student in outstanding:
-        if student.parent_phone:
-            pta_balance = student.get_pta_balance()
-            sdf_balance = student.get_sdf_balance()
-            boarding_balance = student.get_boarding_balance()
-            fee_details = []
-            if pta_balance > 0:
-                fee_details.append(f"PTA: MK{pta_balance:.2f}")
-            if sdf_balance > 0:
-                fee_details.append(f"SDF: MK{sdf_balance:.2f}")
-            if boarding_balance > 0:
-                fee_details.append(f"Boarding: MK{boarding_balance:.2f}")
-            
-            if fee_details:
-                message = f"Dear Parent, {student.name} has outstanding fees. {', '.join(fee_details)}. Please pay to avoid inconvenience."
-            else:
-                continue  # Skip if no outstanding fees
-            reminders.append({
-                'student': student.name,
-                'phone': student.parent_phone,
-                'message': message
-            })
+        fee_details = []
+        if student.pta_balance > 0:
+            fee_details.append(f"PTA: MK{student.pta_balance:.2f}")
+        if student.sdf_balance > 0:
+            fee_details.append(f"SDF: MK{student.sdf_balance:.2f}")
+        if student.boarding_balance > 0:
+            fee_details.append(f"Boarding: MK{student.boarding_balance:.2f}")
+        
+        message = f"Dear Parent, {student.name} has outstanding fees. {', '.join(fee_details)}. Please pay to avoid inconvenience."
+        reminders.append({
+            'student': student.name,
+            'phone': student.parent_phone,
+            'message': message
+        })
     
     return jsonify({'reminders': reminders, 'count': len(reminders)})
 
@@ -3150,42 +3461,45 @@ def api_student_details(student_type):
     if not current_school_id and session.get('user_role') != 'developer':
         return jsonify({'error': 'Access denied. No school context.'}), 403
     
-    # Get school-filtered students
-    student_query = get_school_filtered_query(Student)
-    all_students = student_query.all()
+    # School-filtered students with balances computed in SQL
+    balance_query = StudentBalanceQuery()
     
     if student_type == 'total':
-        students = all_students
+        pass
     elif student_type == 'paid':
-        students = [student for student in all_students if student.is_paid_in_full()]
+        balance_query.where_status('paid')
     elif student_type == 'outstanding':
-        students = [student for student in all_students if not student.is_paid_in_full() and (student.pta_amount_paid > 0 or student.sdf_amount_paid > 0 or student.boarding_amount_paid > 0)]
+        balance_query.where_status('outstanding')
     elif student_type == 'no_payment':
-        students = [student for student in all_students if student.pta_amount_paid == 0 and student.sdf_amount_paid == 0 and student.boarding_amount_paid == 0]
+        balance_query.where_no_payments()
     elif student_type == 'net_summary':
-        students = all_students  # We'll filter in the loop below
+        # Only include students who have made payments
+        balance_query.where_has_payments()
     else:
         return jsonify({'error': 'Invalid student type'}), 400
     
+    students = balance_query.columns(
+        Student.student_id, Student.name, Student.form_class,
+        Student.pta_amount_paid, Student.sdf_amount_paid, Student.boarding_amount_paid
+    ).all()
+    
     student_data = []
     for student in students:
-        pta_balance = student.get_pta_balance()
-        sdf_balance = student.get_sdf_balance()
-        boarding_balance = student.get_boarding_balance()
+        pta_balance = student.pta_balance
+        sdf_balance = student.sdf_balance
+        boarding_balance = student.boarding_balance
         
         # For today's net, show consolidated payment info
         if student_type == 'net_summary':
-            # Only include students who have made payments
-            if student.pta_amount_paid > 0 or student.sdf_amount_paid > 0 or student.boarding_amount_paid > 0:
-                student_data.append({
-                    'student_id': student.student_id,
-                    'name': student.name,
-                    'form_class': student.form_class,
-                    'total_paid': f'{student.pta_amount_paid + student.sdf_amount_paid + student.boarding_amount_paid:.2f}',
-                    'pta_paid': f'{student.pta_amount_paid:.2f}',
-                    'sdf_paid': f'{student.sdf_amount_paid:.2f}',
-                    'boarding_paid': f'{student.boarding_amount_paid:.2f}'
-                })
+            student_data.append({
+                'student_id': student.student_id,
+                'name': student.name,
+                'form_class': student.form_class,
+                'total_paid': f'{student.pta_amount_paid + student.sdf_amount_paid + student.boarding_amount_paid:.2f}',
+                'pta_paid': f'{student.pta_amount_paid:.2f}',
+                'sdf_paid': f'{student.sdf_amount_paid:.2f}',
+                'boarding_paid': f'{student.boarding_amount_paid:.2f}'
+            })
         else:
             student_data.append({
                 'student_id': student.student_id,
@@ -3209,25 +3523,11 @@ def api_todays_financial_summary():
     current_school_id = get_current_school_id()
     today = datetime.now().date()
     
-    # Get totals (school-filtered) - include all other income to balance to 110,000
-    if current_school_id:
-        # Get all student income (not just today's)
-        total_pta_income = db.session.query(db.func.sum(Student.pta_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        total_sdf_income = db.session.query(db.func.sum(Student.sdf_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        total_boarding_income = db.session.query(db.func.sum(Student.boarding_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        # Include all other income (not just today's) to balance to 110,000
-        total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        today_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, date=today).scalar() or 0
-    else:
-        # Developer view - all schools
-        total_pta_income = db.session.query(db.func.sum(Student.pta_amount_paid)).scalar() or 0
-        total_sdf_income = db.session.query(db.func.sum(Student.sdf_amount_paid)).scalar() or 0
-        total_boarding_income = db.session.query(db.func.sum(Student.boarding_amount_paid)).scalar() or 0
-        # Include all other income (not just today's) to balance to 110,000
-        total_other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-        today_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(date=today).scalar() or 0
-    
-    today_income = total_pta_income + total_sdf_income + total_boarding_income + total_other_income
+    # Get totals (school-filtered, cached) - include all other income to balance to 110,000
+    totals = get_school_summary().totals
+    today_expenditure = totals.spent_on_day
+    
+    today_income = totals.total_collected
     today_net = today_income - today_expenditure
     
     # Get recent transactions (school-filtered) - include all other income
@@ -3288,6 +3588,195 @@ def api_todays_financial_summary():
         'net_hidden': '****'
     })
 
+@app.route('/api/students')
+@login_required
+def api_students():
+    """One page of students as JSON; pass next_cursor back as ?cursor= for the next page"""
+    search_query = request.args.get('search', '').strip()
+    query = match_students(get_school_filtered_query(Student), search_query)
+    cursor, page_size = get_page_args(request.args)
+    page = paginate(query, student_sort_keys(), cursor, page_size)
+    
+    students = []
+    for student in page.items:
+        decrypted_data = decrypt_student_data(student)
+        students.append({
+            'id': student.id,
+            'student_id': decrypted_data['student_id'],
+            'name': decrypted_data['name'],
+            'sex': decrypted_data['sex'],
+            'form_class': decrypted_data['form_class']
+        })
+    
+    stats, total_girls, total_boys = get_enrollment_stats(query)
+    return jsonify({
+        'items': students,
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size,
+        'stats': {
+            'classes': stats,
+            'total_girls': total_girls,
+            'total_boys': total_boys,
+            'total_enrollment': total_girls + total_boys
+        }
+    })
+
+@app.route('/api/students/autocomplete')
+@login_required
+def api_students_autocomplete():
+    """Top matches for the payment form's student box (?q=, ?limit=), with their fee balances"""
+    current_school_id = get_current_school_id()
+    if not current_school_id:
+        return jsonify({'students': []})
+    
+    matches = get_student_index(current_school_id).search(request.args.get('q', ''), get_limit_arg(request.args))
+    if not matches:
+        return jsonify({'students': []})
+    
+    # Balances of the matches only, from one query
+    balances = StudentBalanceQuery(
+        get_school_filtered_query(Student).filter(Student.id.in_([match['id'] for match in matches]))
+    )
+    rows = {row.id: row for row in balances.columns(
+        Student.id, Student.pta_amount_paid, Student.sdf_amount_paid, Student.boarding_amount_paid
+    )}
+    
+    students = []
+    for match in matches:
+        row = rows.get(match['id'])
+        if row is None:
+            continue
+        students.append({
+            'id': match['id'],
+            'student_id': match['student_id'],
+            'name': match['name'],
+            'form_class': match['form_class'],
+            'pta_required': float(row.pta_required),
+            'sdf_required': float(row.sdf_required),
+            'boarding_required': float(row.boarding_required),
+            'pta_amount_paid': float(row.pta_amount_paid or 0),
+            'sdf_amount_paid': float(row.sdf_amount_paid or 0),
+            'boarding_amount_paid': float(row.boarding_amount_paid or 0),
+            'pta_balance': float(row.pta_balance),
+            'sdf_balance': float(row.sdf_balance),
+            'boarding_balance': float(row.boarding_balance)
+        })
+    return jsonify({'students': students})
+
+@app.route('/api/income')
+@login_required
+def api_income():
+    """One page of student payment records as JSON, with the school's collection totals"""
+    search_query = {
+        'student_name': request.args.get('student_name', '').strip(),
+        'form_class': request.args.get('form_class', '').strip(),
+        'student_id': request.args.get('student_id', '').strip()
+    }
+    page = get_income_page(search_query)
+    records = build_income_records(page.items)
+    for record in records:
+        record['date'] = record['date'].isoformat() if record['date'] else None
+    
+    totals = get_financial_totals()
+    return jsonify({
+        'items': records,
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size,
+        'totals': {
+            'pta': totals.pta_collected,
+            'sdf': totals.sdf_collected,
+            'boarding': totals.boarding_collected,
+            'other_income': totals.other_income_collected,
+            'grand_total': totals.total_collected
+        }
+    })
+
+@app.route('/api/expenditure')
+@login_required
+def api_expenditure():
+    """One page of expenditures as JSON (newest first), with the per-fund totals"""
+    page = get_expenditure_page()
+    expenditures = [{
+        'id': expenditure.id,
+        'date': expenditure.date.isoformat() if expenditure.date else None,
+        'activity_service': expenditure.activity_service,
+        'voucher_no': expenditure.voucher_no,
+        'cheque_no': expenditure.cheque_no,
+        'amount_paid': expenditure.amount_paid,
+        'fund_type': expenditure.fund_type
+    } for expenditure in page.items]
+    
+    return jsonify({
+        'items': expenditures,
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size,
+        'totals': get_financial_totals().to_dict()
+    })
+
+@app.route('/api/other_income')
+@login_required
+def api_other_income():
+    """One page of other income records as JSON (newest first), with the collected total"""
+    page = get_other_income_page(*get_page_args(request.args))
+    other_incomes = [{
+        'id': other_income.id,
+        'date': other_income.date.isoformat() if other_income.date else None,
+        'customer_name': other_income.decrypted_customer_name,
+        'income_type': other_income.decrypted_income_type,
+        'total_charge': other_income.total_charge,
+        'amount_paid': other_income.amount_paid,
+        'balance': other_income.balance
+    } for other_income in page.items]
+    
+    return jsonify({
+        'items': other_incomes,
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size,
+        'totals': {'other_income': get_financial_totals().other_income_collected}
+    })
+
+@app.route('/api/export/students')
+@login_required
+def api_export_students():
+    """Stream the students with their balances as CSV (?status=, ?form_class=)"""
+    if request.args.get('format', 'csv').lower() != 'csv':
+        return jsonify({'error': 'Unsupported format'}), 400
+    rows = student_rows(get_school_filtered_query(Student), status=request.args.get('status'),
+                        form_class=request.args.get('form_class'))
+    return csv_response('students', STUDENT_HEADER, rows)
+
+@app.route('/api/export/income')
+@login_required
+def api_export_income():
+    """Stream income records as CSV (?start_date=, ?end_date=, ?fund=)"""
+    try:
+        filters = get_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return csv_response('income', INCOME_HEADER, income_rows(get_school_filtered_query(Income), filters))
+
+@app.route('/api/export/expenditure')
+@login_required
+def api_export_expenditure():
+    """Stream expenditures as CSV (?start_date=, ?end_date=, ?fund=)"""
+    try:
+        filters = get_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return csv_response('expenditure', EXPENDITURE_HEADER,
+                        expenditure_rows(get_school_filtered_query(Expenditure), filters))
+
+@app.route('/api/export/other_income')
+@login_required
+def api_export_other_income():
+    """Stream other income records as CSV (?start_date=, ?end_date=)"""
+    try:
+        filters = get_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return csv_response('other_income', OTHER_INCOME_HEADER,
+                        other_income_rows(get_school_filtered_query(OtherIncome), filters))
+
 @app.route('/school_config', methods=['GET', 'POST'])
 @login_required
 def school_config():
@@ -3385,7 +3874,25 @@ def developer_settings():
         except Exception as e:
             flash(f'Error updating credentials: {str(e)}', 'error')
     
-    return render_template('developer_settings.html')
+    return render_template('developer_settings.html', backup_status=get_backup_status(app))
+
+@app.route('/developer/backups', methods=['GET', 'POST'])
+@login_required
+def developer_backups():
+    """Start an online database backup (POST) or report its progress (GET, JSON)"""
+    if session.get('user_role') != 'developer':
+        flash('Access denied. Developer privileges required.', 'error')
+        return redirect(url_for('index'))
+    
+    if request.method == 'GET':
+        return jsonify(get_backup_status(app))
+    
+    if get_backup_status(app)['state'] in BACKUP_RUNNING_STATES:
+        flash('A backup is already running.', 'info')
+    else:
+        run_backup_in_background(app)
+        flash('Backup started; progress is shown on this page.', 'success')
+    return redirect(url_for('developer_settings', dev_access=1))
 
 @app.route('/delete_expenditure/<int:expenditure_id>', methods=['POST'])
 @login_required
@@ -3396,6 +3903,7 @@ def delete_expenditure(expenditure_id):
         expenditure_query = get_school_filtered_query(Expenditure)
         expenditure = expenditure_query.filter_by(id=expenditure_id).first_or_404()
         db.session.delete(expenditure)
+        mark_school_data_changed(expenditure.school_id)
         db.session.commit()
         flash('Expenditure record deleted successfully!', 'success')
     except Exception as e:
@@ -3419,6 +3927,7 @@ def edit_expenditure(expenditure_id):
             expenditure.amount_paid = float(request.form['amount_paid'])
             expenditure.fund_type = request.form['fund_type']
             
+            mark_school_data_changed(expenditure.school_id)
             db.session.commit()
             flash('Expenditure record updated successfully!', 'success')
             return redirect(url_for('expenditure'))
@@ -3462,6 +3971,7 @@ def delete_student(student_id):
         
         # Delete the student record
         db.session.delete(student)
+        mark_school_data_changed(student.school_id)
         db.session.commit()
         
         flash(f'Student "{student_name}" (ID: {student_id_number}) and all related payment records deleted successfully!', 'success')
@@ -3539,45 +4049,36 @@ def budget():
             flash('No school access configured. Please contact administrator.', 'error')
             return redirect(url_for('index'))
         
-        # Ensure Budget table exists
-        db.create_all()
-        
-        # Get school-filtered budget items
+        # Get school-filtered budget items with the amount spent on each, in one query
         budget_query = get_school_filtered_query(Budget)
-        budget_items = budget_query.order_by(Budget.id).all()
+        budget_rows = get_budget_spending(budget_query, Budget.id)
         
         # If no budget items exist, create them from expenditure records (school-specific)
-        if not budget_items:
+        if not budget_rows and current_school_id:
             expenditure_query = get_school_filtered_query(Expenditure)
             activities = expenditure_query.with_entities(Expenditure.activity_service).distinct().all()
-            for activity in activities:
-                budget_item = Budget(
-                    school_id=current_school_id,
-                    activity_service=activity[0], 
-                    proposed_allocation=0.0
-                )
-                db.session.add(budget_item)
-            db.session.commit()
-            budget_items = budget_query.order_by(Budget.activity_service).all()
+            if activities:
+                db.session.execute(Budget.__table__.insert(), [
+                    {'school_id': current_school_id, 'activity_service': activity[0], 'proposed_allocation': 0.0,
+                     'is_category': False, 'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}
+                    for activity in activities
+                ])
+                db.session.commit()
+                budget_rows = get_budget_spending(budget_query, Budget.activity_service)
+        budget_items = [item for item, spent in budget_rows]
         
         # Calculate totals (school-filtered)
         total_budget = sum(item.proposed_allocation for item in budget_items)
-        if current_school_id:
-            pta_income = db.session.query(db.func.sum(Student.pta_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            sdf_income = db.session.query(db.func.sum(Student.sdf_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            boarding_income = db.session.query(db.func.sum(Student.boarding_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-            other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        else:
-            # Developer view - all schools
-            pta_income = db.session.query(db.func.sum(Student.pta_amount_paid)).scalar() or 0
-            sdf_income = db.session.query(db.func.sum(Student.sdf_amount_paid)).scalar() or 0
-            boarding_income = db.session.query(db.func.sum(Student.boarding_amount_paid)).scalar() or 0
-            other_income = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
-        total_income = pta_income + sdf_income + boarding_income + other_income
-        
-        # Calculate actual spending per activity
+        totals = get_financial_totals()
+        pta_income = totals.pta_collected
+        sdf_income = totals.sdf_collected
+        boarding_income = totals.boarding_collected
+        other_income = totals.other_income_collected
+        total_income = totals.total_collected
+        
+        # Actual spending per activity
         spending_data = []
-        for item in budget_items:
+        for item, spent in budget_rows:
             if item.is_category:
                 spending_data.append({
                     'activity': item.activity_service,
@@ -3587,10 +4088,6 @@ def budget():
                     'is_category': True
                 })
             else:
-                if current_school_id:
-                    spent = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, activity_service=item.activity_service).scalar() or 0
-                else:
-                    spent = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(activity_service=item.activity_service).scalar() or 0
                 balance = item.proposed_allocation - spent
                 spending_data.append({
                     'activity': item.activity_service,
@@ -3660,17 +4157,27 @@ def budget():
 @app.route('/update_budget', methods=['POST'])
 @login_required
 def update_budget():
+    current_school_id = get_current_school_id()
+    if not current_school_id and session.get('user_role') != 'developer':
+        flash('No school access configured. Please contact administrator.', 'error')
+        return redirect(url_for('index'))
+    
     try:
-        # Ensure Budget table exists
-        db.create_all()
+        allocations = [
+            {'budget_id': int(key.replace('allocation_', '')), 'allocation': float(value) if value else 0.0}
+            for key, value in request.form.items() if key.startswith('allocation_')
+        ]
         
-        for key, value in request.form.items():
-            if key.startswith('allocation_'):
-                budget_id = int(key.replace('allocation_', ''))
-                allocation = float(value) if value else 0.0
-                budget_item = Budget.query.get(budget_id)
-                if budget_item:
-                    budget_item.proposed_allocation = allocation
+        # One executemany UPDATE, limited to the current school's budget lines
+        if allocations:
+            table = Budget.__table__
+            statement = table.update().where(table.c.id == db.bindparam('budget_id'))
+            if current_school_id:
+                statement = statement.where(table.c.school_id == current_school_id)
+            db.session.execute(
+                statement.values(proposed_allocation=db.bindparam('allocation'), updated_at=datetime.utcnow()),
+                allocations
+            )
         
         db.session.commit()
         flash('Budget updated successfully!', 'success')
@@ -3724,30 +4231,23 @@ def add_budget_item():
 @app.route('/sms_notifications')
 @login_required
 def sms_notifications():
-    # Get school-filtered students with outstanding balances
-    student_query = get_school_filtered_query(Student)
-    students = student_query.all()
+    # Get school-filtered students with outstanding balances (filtered in SQL)
+    student_rows = StudentBalanceQuery().where_not_paid().rows().all()
     students_with_balances = []
     students_with_phones = []
     
-    for student in students:
-        pta_balance = student.get_pta_balance()
-        sdf_balance = student.get_sdf_balance()
-        boarding_balance = student.get_boarding_balance()
-        total_balance = pta_balance + sdf_balance + boarding_balance
+    for row in student_rows:
+        student_data = {
+            'student': row.Student,
+            'pta_balance': row.pta_balance,
+            'sdf_balance': row.sdf_balance,
+            'boarding_balance': row.boarding_balance,
+            'total_balance': row.total_balance
+        }
+        students_with_balances.append(student_data)
         
-        if total_balance > 0:
-            student_data = {
-                'student': student,
-                'pta_balance': pta_balance,
-                'sdf_balance': sdf_balance,
-                'boarding_balance': boarding_balance,
-                'total_balance': total_balance
-            }
-            students_with_balances.append(student_data)
-            
-            if student.parent_phone:
-                students_with_phones.append(student_data)
+        if row.Student.parent_phone:
+            students_with_phones.append(student_data)
     
     # Count SMS sent today (placeholder - would need SMS log table)
     sms_sent_today = 0
@@ -3797,17 +4297,14 @@ def send_bulk_sms_reminders():
         print(f"DEBUG: Request headers: {dict(request.headers)}")
         print(f"DEBUG: Request data: {request.get_data()}")
         # Get school-filtered students with balances and phone numbers
-        student_query = get_school_filtered_query(Student)
-        students = student_query.all()
+        student_rows = StudentBalanceQuery().where_not_paid().where_has_phone().rows().all()
         students_to_notify = []
         
-        for student in students:
-            total_balance = student.get_pta_balance() + student.get_sdf_balance() + student.get_boarding_balance()
-            if total_balance > 0 and student.parent_phone:
-                students_to_notify.append({
-                    'student': student,
-                    'parent_phone': student.parent_phone
-                })
+        for row in student_rows:
+            students_to_notify.append({
+                'student': row.Student,
+                'parent_phone': row.Student.parent_phone
+            })
         
         if not students_to_notify:
             return jsonify({'success': False, 'error': 'No students with balances and phone numbers found'})
@@ -3878,16 +4375,11 @@ def print_income():
     all_students = student_query.all()
     
     # Calculate totals
-    if current_school_id:
-        pta_total = db.session.query(db.func.sum(Student.pta_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        sdf_total = db.session.query(db.func.sum(Student.sdf_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        boarding_total = db.session.query(db.func.sum(Student.boarding_amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-        other_income_total = db.session.query(db.func.sum(OtherIncome.amount_paid)).filter_by(school_id=current_school_id).scalar() or 0
-    else:
-        pta_total = db.session.query(db.func.sum(Student.pta_amount_paid)).scalar() or 0
-        sdf_total = db.session.query(db.func.sum(Student.sdf_amount_paid)).scalar() or 0
-        boarding_total = db.session.query(db.func.sum(Student.boarding_amount_paid)).scalar() or 0
-        other_income_total = db.session.query(db.func.sum(OtherIncome.amount_paid)).scalar() or 0
+    totals = get_financial_totals()
+    pta_total = totals.pta_collected
+    sdf_total = totals.sdf_collected
+    boarding_total = totals.boarding_collected
+    other_income_total = totals.other_income_collected
     
     # Prepare student records
     student_records = []
@@ -3918,13 +4410,13 @@ def print_students():
         flash('No school access configured. Please contact administrator.', 'error')
         return redirect(url_for('index'))
     
-    # Get school-filtered students
-    student_query = get_school_filtered_query(Student)
-    all_students = student_query.all()
+    # Get school-filtered students with payment status computed in SQL
+    student_rows = StudentBalanceQuery().rows().all()
     
     # Decrypt student data and prepare for printing
     students_data = []
-    for student in all_students:
+    for row in student_rows:
+        student = row.Student
         decrypted_data = decrypt_student_data(student)
         students_data.append({
             'student_id': decrypted_data['student_id'],
@@ -3935,7 +4427,7 @@ def print_students():
             'pta_paid': student.pta_amount_paid,
             'sdf_paid': student.sdf_amount_paid,
             'boarding_paid': student.boarding_amount_paid,
-            'is_paid_in_full': student.is_paid_in_full()
+            'is_paid_in_full': row.payment_status == 'paid'
         })
     
     # Sort by student ID
@@ -3956,16 +4448,11 @@ def print_expenditure():
     expenditures = expenditure_query.order_by(Expenditure.date.desc()).all()
     
     # Calculate totals by fund type
-    if current_school_id:
-        pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='PTA').scalar() or 0
-        sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='SDF').scalar() or 0
-        boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='Boarding').scalar() or 0
-        other_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(school_id=current_school_id, fund_type='Other Income').scalar() or 0
-    else:
-        pta_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='PTA').scalar() or 0
-        sdf_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='SDF').scalar() or 0
-        boarding_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='Boarding').scalar() or 0
-        other_expenditure = db.session.query(db.func.sum(Expenditure.amount_paid)).filter_by(fund_type='Other Income').scalar() or 0
+    totals = get_financial_totals()
+    pta_expenditure = totals.pta_spent
+    sdf_expenditure = totals.sdf_spent
+    boarding_expenditure = totals.boarding_spent
+    other_expenditure = totals.other_income_spent
     
     return render_template('print_expenditure.html',
                          expenditures=expenditures,
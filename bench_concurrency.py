@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Load test for the gunicorn worker profiles on the income and dashboard pages.
+
+Creates a throwaway school with students and payments, then for every
+profile starts gunicorn with gunicorn.conf.py (WEB_CONCURRENCY workers,
+GUNICORN_THREADS threads each) and drives /income and / from concurrent
+clients for a fixed time. Throughput should grow with workers up to the
+number of cores; threads help while requests wait on the database.
+
+The server imports this module, so the pages render with minimal stand-in
+templates when the real ones are not available.
+
+Usage: python bench_concurrency.py [profiles] [seconds] [students]
+       profiles like 1x1,2x1,2x4 (workers x threads), default sized to the cores
+"""
+
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+os.environ.setdefault('SECRET_KEY', 'bench-concurrency-secret')
+
+import requests
+from jinja2 import ChoiceLoader, DictLoader
+
+from app import app, db
+from bench_income_page import FALLBACK_TEMPLATES, add_payments, create_school, remove_school
+
+PATHS = ('/income', '/')
+
+logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader(dict(
+    FALLBACK_TEMPLATES,
+    **{'index.html': '{{ total_students }} {{ paid_in_full }} {{ today_income }}'
+                     '{% for p in recent_payments %}{{ p.student_id }}{% endfor %}'},
+))])
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _session_cookie(school_id):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'logged_in': True, 'user_role': 'school_admin', 'school_id': school_id})
+
+
+def start_server(workers, threads, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads), PORT=str(port))
+    env.pop('DB_POOL_SIZE', None)
+    env.pop('DB_MAX_OVERFLOW', None)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--access-logfile', '/dev/null', '--log-level', 'warning', 'bench_concurrency:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/health', timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def drive(port, cookie, clients, seconds):
+    """Requests per second and error count per path from concurrent clients."""
+    done = {path: 0 for path in PATHS}
+    errors = {path: 0 for path in PATHS}
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def client(number):
+        http = requests.Session()
+        http.cookies.set('session', cookie)
+        path_index = number
+        while time.time() < stop_at:
+            path = PATHS[path_index % len(PATHS)]
+            path_index += 1
+            try:
+                ok = http.get(f'http://127.0.0.1:{port}{path}', allow_redirects=False, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                (done if ok else errors)[path] += 1
+
+    workers = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {path: done[path] / seconds for path in PATHS}, errors
+
+
+def main():
+    cores = os.cpu_count() or 1
+    profiles = sys.argv[1].split(',') if len(sys.argv) > 1 else sorted({'1x1', f'{cores}x1', f'{cores}x4'})
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    student_count = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+
+    with app.app_context():
+        db.create_all()
+        school_id = create_school(student_count)
+        try:
+            add_payments(school_id, student_count, 0, student_count * 5)
+            cookie = _session_cookie(school_id)
+
+            print(f"📊 {student_count} students, {seconds:.0f} s per profile, {cores} cores")
+            print(f"{'workers x threads':>18} {'/income req/s':>14} {'/ req/s':>10} {'errors':>7}")
+            for profile in profiles:
+                workers, threads = (int(n) for n in profile.split('x'))
+                port = _free_port()
+                server = start_server(workers, threads, port)
+                try:
+                    rates, errors = drive(port, cookie, clients=workers * threads * 2, seconds=seconds)
+                finally:
+                    server.terminate()
+                    server.wait()
+                print(f"{profile:>18} {rates['/income']:>14.1f} {rates['/']:>10.1f} {sum(errors.values()):>7}")
+        finally:
+            remove_school(school_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the /income and /income_grouped pages.
+
+Creates a throwaway school with a fixed number of students, grows the number
+of recorded payments and times both pages. Page time should stay roughly flat
+as payments grow, because the latest payment per student comes from a single
+query instead of a scan of the Income table per student.
+
+Usage: python bench_income_page.py [students] [payments,payments,...]
+"""
+
+import logging
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from jinja2 import ChoiceLoader, DictLoader
+
+from app import app, db, SchoolConfiguration, Student, Income
+
+# Minimal stand-ins, used only when the real templates are not available
+FALLBACK_TEMPLATES = {
+    'income.html': '{% for r in recorded_payments %}{{ r.student_id }}{{ r.date }}{{ r.deposit_ref_no }}\n{% endfor %}',
+    'income_grouped.html': '{% for s in students %}{{ s.student_id }}{{ s.last_payment_date }}{{ s.last_deposit_slip }}\n{% endfor %}',
+}
+ROUNDS = 3
+
+
+def create_school(student_count):
+    school = SchoolConfiguration(school_name='Benchmark School', is_active=True, subscription_status='absolute')
+    db.session.add(school)
+    db.session.commit()
+    db.session.execute(Student.__table__.insert(), [
+        {
+            'school_id': school.id, 'student_id': f'{number:04d}', 'name': f'Student {number}',
+            'sex': 'Female' if number % 2 else 'Male', 'form_class': f'Form {number % 4 + 1}',
+            'pta_amount_paid': 0, 'sdf_amount_paid': 0, 'boarding_amount_paid': 0,
+        }
+        for number in range(1, student_count + 1)
+    ])
+    db.session.commit()
+    return school.id
+
+
+def add_payments(school_id, student_count, start, count):
+    first_day = date(2024, 1, 1)
+    db.session.execute(Income.__table__.insert(), [
+        {
+            'school_id': school_id, 'payment_date': first_day + timedelta(days=number % 300),
+            'student_id': f'{number % student_count + 1:04d}', 'student_name': 'Student',
+            'form_class': 'Form 1', 'payment_reference': f'SLIP{number:06d}',
+            'fee_type': 'PTA' if number % 2 else 'SDF', 'amount_paid': 1000, 'balance': 0,
+        }
+        for number in range(start, start + count)
+    ])
+    db.session.commit()
+
+
+def remove_school(school_id):
+    for table in reversed(db.metadata.sorted_tables):
+        if 'school_id' in table.c:
+            db.session.execute(table.delete().where(table.c.school_id == school_id))
+    db.session.execute(SchoolConfiguration.__table__.delete().where(SchoolConfiguration.id == school_id))
+    db.session.commit()
+
+
+def time_page(client, path):
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+    return statistics.median(timings) * 1000
+
+
+def main():
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    payment_steps = [int(n) for n in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1000, 4000, 16000]
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader(FALLBACK_TEMPLATES)])
+
+    with app.app_context():
+        db.create_all()
+        school_id = create_school(student_count)
+        try:
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['user_role'] = 'school_admin'
+                sess['school_id'] = school_id
+
+            print(f"📊 {student_count} students, median of {ROUNDS} requests")
+            print(f"{'payments':>10} {'/income ms':>12} {'/income_grouped ms':>20}")
+            recorded = 0
+            for total in payment_steps:
+                add_payments(school_id, student_count, recorded, total - recorded)
+                recorded = total
+                income_ms = time_page(client, '/income')
+                grouped_ms = time_page(client, '/income_grouped')
+                print(f"{total:>10} {income_ms:>12.1f} {grouped_ms:>20.1f}")
+        finally:
+            remove_school(school_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the SQLite pragma profile under concurrent reads and writes.
+
+For each profile a fresh database file is created with the app's tables and
+filled with students and payments. Reader threads then run the balance
+report query while one writer records payments, one commit each, the way
+the income page and the payment form share a desktop install. Read and
+write latencies are reported per profile.
+
+With the stock settings (rollback journal, synchronous=FULL) every commit
+locks readers out and waits for the disk twice; with the tuned profile
+(WAL, synchronous=NORMAL, larger cache, mmap) readers are not blocked and
+commits are cheaper.
+
+Usage: python bench_sqlite_pragmas.py [seconds] [readers] [students]
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, event, func, select
+
+from app import db, Income, Student
+from sqlite_tuning import DEFAULT_PRAGMAS, apply_pragmas
+from tenant_schemas import DEFAULT_SCHEMA_MAP
+
+PROFILES = {
+    'stock': {'busy_timeout': DEFAULT_PRAGMAS['busy_timeout']},
+    'tuned': DEFAULT_PRAGMAS,
+}
+SCHOOL_ID = 1
+
+logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+
+def create_database(path, pragmas, student_count):
+    engine = create_engine(
+        f'sqlite:///{path}', connect_args={'check_same_thread': False},
+        execution_options={'schema_translate_map': DEFAULT_SCHEMA_MAP},
+    )
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+    db.metadata.create_all(engine, tables=[Student.__table__, Income.__table__])
+    with engine.begin() as connection:
+        connection.execute(Student.__table__.insert(), [
+            {'school_id': SCHOOL_ID, 'student_id': f'{number:05d}', 'name': f'Student {number}',
+             'sex': 'Female' if number % 2 else 'Male', 'form_class': f'Form {number % 4 + 1}'}
+            for number in range(student_count)
+        ])
+        connection.execute(Income.__table__.insert(), [_payment(number, student_count) for number in range(student_count * 5)])
+    return engine
+
+
+def _payment(number, student_count):
+    return {'school_id': SCHOOL_ID, 'payment_date': date(2024, 1, 1), 'student_id': f'{number % student_count:05d}',
+            'student_name': 'Student', 'form_class': 'Form 1', 'payment_reference': f'SLIP{number:07d}',
+            'fee_type': 'PTA', 'amount_paid': 1000, 'balance': 0}
+
+
+def run(engine, seconds, readers, student_count):
+    """Read and write latencies (ms) while the writer and readers run together."""
+    report = (select(Income.student_id, func.sum(Income.amount_paid))
+              .where(Income.school_id == SCHOOL_ID).group_by(Income.student_id))
+    read_times, write_times = [], []
+    stop_at = time.perf_counter() + seconds
+
+    def reader():
+        with engine.connect() as connection:
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                connection.execute(report).all()
+                connection.rollback()
+                read_times.append((time.perf_counter() - started) * 1000)
+
+    def writer():
+        number = student_count * 5
+        with engine.connect() as connection:
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                connection.execute(Income.__table__.insert(), _payment(number, student_count))
+                connection.commit()
+                write_times.append((time.perf_counter() - started) * 1000)
+                number += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return read_times, write_times
+
+
+def _p95(times):
+    return statistics.quantiles(times, n=20)[-1] if len(times) > 1 else times[0]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    student_count = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    print(f"📊 {student_count} students, {readers} readers + 1 writer, {seconds:.0f} s per profile")
+    print(f"{'profile':>8} {'reads':>7} {'read p50':>9} {'read p95':>9} {'writes':>7} {'write p50':>10} {'write p95':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, pragmas in PROFILES.items():
+            engine = create_database(os.path.join(directory, f'{name}.db'), pragmas, student_count)
+            try:
+                read_times, write_times = run(engine, seconds, readers, student_count)
+            finally:
+                engine.dispose()
+            print(f"{name:>8} {len(read_times):>7} {statistics.median(read_times):>8.2f}ms {_p95(read_times):>8.2f}ms "
+                  f"{len(write_times):>7} {statistics.median(write_times):>9.2f}ms {_p95(write_times):>9.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the database-side student search.
+
+Creates throwaway schools sharing a fixed number of students, then times
+ranked as-you-type searches (one growing prefix at a time) in one school.
+Every search should stay well under 20 ms with the search index installed.
+
+Usage: python bench_student_search.py [students] [schools]
+"""
+
+import logging
+import random
+import statistics
+import sys
+import time
+
+from app import app, db, SchoolConfiguration, Student, get_school_filtered_query
+from student_search import install_student_search, match_students, search_backend
+
+FIRST_NAMES = ['John', 'Mary', 'Peter', 'Grace', 'Joseph', 'Faith', 'James', 'Mercy', 'Brian', 'Joyce']
+LAST_NAMES = ['Okello', 'Achieng', 'Banda', 'Phiri', 'Wafula', 'Mwangi', 'Otieno', 'Kamau', 'Njoroge', 'Mutua']
+QUERIES = ['j', 'jo', 'joh', 'john', 'john o', 'john ok', 'ba', 'banda', 'form 3', '004', '0042']
+LIMIT = 20
+ROUNDS = 5
+
+
+def create_schools(student_count, school_count):
+    rng = random.Random(7)
+    school_ids = []
+    for index in range(school_count):
+        school = SchoolConfiguration(school_name=f'Benchmark School {index}', is_active=True,
+                                     subscription_status='absolute')
+        db.session.add(school)
+        db.session.commit()
+        school_ids.append(school.id)
+
+    per_school = student_count // school_count
+    for school_id in school_ids:
+        db.session.execute(Student.__table__.insert(), [
+            {
+                'school_id': school_id, 'student_id': f'{number:04d}',
+                'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'sex': 'Female' if number % 2 else 'Male', 'form_class': f'Form {number % 4 + 1}',
+                'pta_amount_paid': 0, 'sdf_amount_paid': 0, 'boarding_amount_paid': 0,
+            }
+            for number in range(1, per_school + 1)
+        ])
+    db.session.commit()
+    return school_ids
+
+
+def remove_schools(school_ids):
+    for school_id in school_ids:
+        for table in reversed(db.metadata.sorted_tables):
+            if 'school_id' in table.c:
+                db.session.execute(table.delete().where(table.c.school_id == school_id))
+        db.session.execute(SchoolConfiguration.__table__.delete().where(SchoolConfiguration.id == school_id))
+    db.session.commit()
+
+
+def time_search(school_id, text):
+    timings = []
+    with app.test_request_context('/'):
+        from flask import session
+        session['logged_in'] = True
+        session['user_role'] = 'school_admin'
+        session['school_id'] = school_id
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            results = match_students(get_school_filtered_query(Student), text, ranked=True).limit(LIMIT).all()
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(results)
+
+
+def main():
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    school_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+        install_student_search()
+        school_ids = create_schools(student_count, school_count)
+        try:
+            print(f"📊 {student_count} students in {school_count} schools, backend {search_backend()}, "
+                  f"median of {ROUNDS} searches, top {LIMIT}")
+            print(f"{'query':>10} {'ms':>8} {'results':>8}")
+            for text in QUERIES:
+                elapsed, found = time_search(school_ids[0], text)
+                print(f"{text!r:>10} {elapsed:>8.2f} {found:>8}")
+        finally:
+            remove_schools(school_ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Bulk posting of student fee payments from bank deposit-slip files.
+
+Rows of (student_id, date, deposit_ref, pta, sdf, boarding) are posted in a
+single transaction:
+
+- every student in the batch is loaded with IN queries and the rows are
+  checked in file order against that in-memory state, so a student paying
+  twice in one file sees the first payment's balance and installment count;
+- a row is posted completely or not at all: any fee over its balance, past
+  its installment limit (Student.can_pay_installment) or already posted
+  with the same deposit reference rejects the whole row;
+- receipt numbers come from one block of the school's receipt sequence and
+  Income, Receipt and queued SMS rows are written with executemany INSERTs.
+
+Rejected rows are reported with their line number; the rest are posted.
+
+CSV columns (header names are case-insensitive):
+    student_id, date (YYYY-MM-DD or DD/MM/YYYY), deposit_ref, pta, sdf, boarding
+
+Usage: python bulk_payments.py <school_id> <file.csv> [--dry-run]
+"""
+
+import csv
+import sys
+from datetime import datetime
+
+# (fee type, row key, Student column prefix)
+FEES = (('PTA', 'pta', 'pta'), ('SDF', 'sdf', 'sdf'), ('Boarding', 'boarding', 'boarding'))
+
+COLUMN_ALIASES = {
+    'student_id': 'student_id', 'id': 'student_id', 'student_number': 'student_id', 'student_no': 'student_id',
+    'date': 'date', 'payment_date': 'date',
+    'deposit_ref': 'deposit_ref', 'deposit_ref_no': 'deposit_ref', 'deposit_slip_ref': 'deposit_ref',
+    'reference': 'deposit_ref', 'payment_reference': 'deposit_ref',
+    'pta': 'pta', 'pta_amount': 'pta', 'sdf': 'sdf', 'sdf_amount': 'sdf',
+    'boarding': 'boarding', 'boarding_amount': 'boarding',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+class BulkPaymentResult:
+    """Outcome of a bulk posting: posted rows, receipts issued and the per-row error report."""
+
+    def __init__(self):
+        self.posted = 0
+        self.total_amount = 0.0
+        self.receipts = []
+        self.sms_queued = 0
+        self.errors = []
+
+    def add_error(self, line, row, message):
+        self.errors.append({'line': line, 'student_id': row.get('student_id', ''),
+                            'deposit_ref': row.get('deposit_ref', ''), 'error': message})
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def to_dict(self):
+        return {'posted': self.posted, 'failed': self.failed, 'total_amount': self.total_amount,
+                'receipts': self.receipts, 'sms_queued': self.sms_queued, 'errors': self.errors}
+
+
+def canonical_row(row):
+    """Row keyed by the canonical column names; unknown columns are dropped."""
+    values = {}
+    for name, value in row.items():
+        column = COLUMN_ALIASES.get((name or '').strip().lower().replace(' ', '_'))
+        if column and column not in values:
+            values[column] = value.strip() if isinstance(value, str) else value
+    return values
+
+
+def read_payment_rows(stream):
+    """Yield (line number, row) from a CSV stream with rows keyed by the canonical column names."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        values = canonical_row(row)
+        if any(values.values()):
+            yield reader.line_num, values
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    """Amount from a cell such as '45,000' or 45000; None if it is not a valid amount."""
+    if value is None or value == '':
+        return 0.0
+    try:
+        amount = float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+    return amount if amount >= 0 else None
+
+
+def parse_payment_row(row):
+    """Return (payment, None) or (None, error message) for one raw row."""
+    student_id = str(row.get('student_id') or '').strip()
+    if not student_id:
+        return None, 'Student ID is required'
+    payment_date = _parse_date(str(row.get('date') or '').strip())
+    if payment_date is None:
+        return None, f"Invalid date {row.get('date')!r} (use YYYY-MM-DD or DD/MM/YYYY)"
+    deposit_ref = str(row.get('deposit_ref') or '').strip()
+    if not deposit_ref:
+        return None, 'Deposit slip reference is required'
+    if len(deposit_ref) > 100:
+        return None, 'Deposit slip reference is longer than 100 characters'
+
+    amounts = {}
+    for fee_type, key, _ in FEES:
+        amount = _parse_amount(row.get(key))
+        if amount is None:
+            return None, f"Invalid {fee_type} amount {row.get(key)!r}"
+        amounts[fee_type] = amount
+    if sum(amounts.values()) <= 0:
+        return None, 'At least one payment amount is required'
+    return {'student_id': student_id, 'payment_date': payment_date, 'deposit_ref': deposit_ref,
+            'amounts': amounts}, None
+
+
+def _check_payment(student, payment, fee_context):
+    """Error message if any fee of the payment breaks a rule, else None (nothing is changed)."""
+    for fee_type, _, prefix in FEES:
+        amount = payment['amounts'][fee_type]
+        if amount <= 0:
+            continue
+        if not student.can_pay_installment(fee_type):
+            return f'Maximum {fee_type} installments already reached for this student'
+        balance = getattr(student, f'get_{prefix}_balance')(fee_context)
+        if amount > balance:
+            return f'{fee_type} amount (MK {amount:,.2f}) exceeds the remaining balance (MK {balance:,.2f})'
+    return None
+
+
+def post_payments(school_id, rows, dry_run=False):
+    """Post an iterable of (line number, raw row) for a school in one transaction.
+    With dry_run=True everything is checked but nothing is written.
+    Must run inside an application context.
+    """
+    from app import (db, Income, Receipt, get_fee_context, get_students_by_student_ids,
+                     decrypt_student_data, mark_school_data_changed)
+    from school_sequences import RECEIPT, next_sequence_value
+    from sms_outbox import queue_payment_confirmations
+    from daily_fund_summary import record_ledger_rows
+
+    result = BulkPaymentResult()
+    payments = []
+    for line, row in rows:
+        payment, error = parse_payment_row(row)
+        if error:
+            result.add_error(line, row, error)
+        else:
+            payments.append((line, row, payment))
+
+    students = get_students_by_student_ids([payment['student_id'] for _, _, payment in payments], school_id)
+    already_posted = set()
+    references = list({payment['deposit_ref'] for _, _, payment in payments})
+    for start in range(0, len(references), 500):
+        already_posted.update(db.session.query(Income.student_id, Income.payment_reference).filter(
+            Income.school_id == school_id, Income.payment_reference.in_(references[start:start + 500])
+        ))
+
+    fee_context = get_fee_context(school_id)
+    accepted = []
+    for line, row, payment in payments:
+        student = students.get(payment['student_id'])
+        key = (payment['student_id'], payment['deposit_ref'])
+        if student is None:
+            result.add_error(line, row, f"Student {payment['student_id']} not found")
+            continue
+        if key in already_posted:
+            result.add_error(line, row, f"Deposit slip {payment['deposit_ref']} is already posted for this student")
+            continue
+        error = _check_payment(student, payment, fee_context)
+        if error:
+            result.add_error(line, row, error)
+            continue
+
+        # Apply to the in-memory student so later rows see the new balances
+        fees = []
+        for fee_type, _, prefix in FEES:
+            amount = payment['amounts'][fee_type]
+            if amount > 0:
+                setattr(student, f'{prefix}_amount_paid', (getattr(student, f'{prefix}_amount_paid') or 0) + amount)
+                setattr(student, f'{prefix}_installments', (getattr(student, f'{prefix}_installments') or 0) + 1)
+                fees.append((fee_type, amount, getattr(student, f'get_{prefix}_balance')(fee_context),
+                             getattr(student, f'{prefix}_installments')))
+        already_posted.add(key)
+        accepted.append((student, payment, fees))
+
+    if dry_run or not accepted:
+        db.session.rollback()
+        result.posted = len(accepted)
+        result.total_amount = sum(amount for _, _, fees in accepted for _, amount, _, _ in fees)
+        result.errors.sort(key=lambda error: error['line'])
+        return result
+
+    try:
+        receipt_count = sum(len(fees) for _, _, fees in accepted)
+        next_number = next_sequence_value(school_id, RECEIPT, receipt_count)
+        now = datetime.utcnow()
+        income_rows, receipt_rows, confirmations = [], [], []
+        for student, payment, fees in accepted:
+            decrypted_data = decrypt_student_data(student)
+            common = {'school_id': school_id, 'payment_date': payment['payment_date'],
+                      'student_id': decrypted_data['student_id'], 'student_name': decrypted_data['name'],
+                      'form_class': decrypted_data['form_class'], 'created_at': now}
+            for fee_type, amount, balance, installment in fees:
+                receipt_no = f'{next_number:04d}'
+                next_number += 1
+                income_rows.append(dict(common, payment_reference=payment['deposit_ref'], fee_type=fee_type,
+                                        amount_paid=amount, balance=balance))
+                receipt_rows.append(dict(common, receipt_no=receipt_no, deposit_slip_ref=payment['deposit_ref'],
+                                         fee_type=fee_type, amount_paid=amount, balance=balance,
+                                         installment_number=installment))
+                result.receipts.append(receipt_no)
+                result.total_amount += amount
+            if student.parent_phone:
+                confirmations.append((student.id, student.parent_phone, {
+                    'amount': sum(amount for _, amount, _, _ in fees),
+                    'fee_type': ', '.join(fee_type for fee_type, _, _, _ in fees),
+                    'receipt_no': result.receipts[-1],
+                    'date': payment['payment_date'].strftime('%B %d, %Y'),
+                }))
+
+        db.session.execute(Income.__table__.insert(), income_rows)
+        record_ledger_rows(Income, income_rows)
+        db.session.execute(Receipt.__table__.insert(), receipt_rows)
+        result.sms_queued = queue_payment_confirmations(school_id, confirmations)
+        mark_school_data_changed(school_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    result.posted = len(accepted)
+    result.errors.sort(key=lambda error: error['line'])
+    return result
+
+
+def main():
+    from app import app
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) != 2:
+        print(__doc__)
+        return False
+    school_id, path = int(args[0]), args[1]
+    dry_run = '--dry-run' in sys.argv
+
+    with app.app_context():
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            result = post_payments(school_id, read_payment_rows(stream), dry_run=dry_run)
+
+    print(f"✅ {'Would post' if dry_run else 'Posted'} {result.posted} payments, MK {result.total_amount:,.2f}")
+    for error in result.errors:
+        print(f"❌ line {error['line']}: {error['error']}")
+    return not result.errors
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,100 @@
+"""
+Shared pytest fixtures for the SmartFee test scripts.
+Tests run against the local SQLite database, so every school created here
+is removed again together with its tenant rows.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def app_ctx():
+    """Application context with all tables created."""
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.rollback()
+
+
+@pytest.fixture
+def make_school(app_ctx):
+    """Factory creating throwaway schools; their data is deleted on teardown."""
+    from app import db, SchoolConfiguration
+    from tenant_context import invalidate_tenant_status
+    created = []
+
+    def _make_school(name='Test School', **kwargs):
+        school = SchoolConfiguration(school_name=name, is_active=True, subscription_status='absolute', **kwargs)
+        db.session.add(school)
+        db.session.commit()
+        created.append(school.id)
+        return school
+
+    yield _make_school
+
+    db.session.rollback()
+    for school_id in created:
+        for table in reversed(db.metadata.sorted_tables):
+            if 'school_id' in table.c:
+                db.session.execute(table.delete().where(table.c.school_id == school_id))
+        db.session.execute(SchoolConfiguration.__table__.delete().where(SchoolConfiguration.id == school_id))
+    db.session.commit()
+    # School ids are reused by SQLite, so forget the deleted schools' cached status
+    for school_id in created:
+        invalidate_tenant_status(school_id)
+
+
+@pytest.fixture
+def school_request(app_ctx):
+    """Open a request context logged in as the admin of the given school."""
+    @contextmanager
+    def _school_request(school_id, role='school_admin', path='/'):
+        with app_ctx.test_request_context(path):
+            from flask import session
+            session['logged_in'] = True
+            session['user_role'] = role
+            session['school_id'] = school_id
+            yield
+    return _school_request
+
+
+@pytest.fixture
+def logged_in_client(app_ctx):
+    """Factory for test clients logged in with the given school and role."""
+    def _logged_in_client(school_id, role='school_admin'):
+        client = app_ctx.test_client()
+        with client.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['user_role'] = role
+            sess['school_id'] = school_id
+            sess['username'] = role
+        return client
+    return _logged_in_client
+
+
+@pytest.fixture
+def count_queries(app_ctx):
+    """Context manager returning a list that collects every SQL statement executed."""
+    from app import db
+
+    @contextmanager
+    def _count_queries():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return _count_queries
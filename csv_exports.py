@@ -0,0 +1,173 @@
+"""
+Streaming CSV exports of students, income, expenditure and other income.
+
+Each export selects only the columns it writes, reads them with yield_per
+(a server-side cursor on PostgreSQL) and writes the CSV through a generator
+into a chunked response, so memory use stays flat however many rows a
+school has. Ledger exports accept ?start_date=, ?end_date= (YYYY-MM-DD) and
+?fund= (PTA, SDF or Boarding); the student export accepts ?status= and
+?form_class=.
+"""
+
+import csv
+import io
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+EXPORT_BATCH_SIZE = 1000
+FUNDS = ('PTA', 'SDF', 'Boarding')
+
+STUDENT_HEADER = [
+    'Student ID', 'Name', 'Sex', 'Form/Class', 'Parent Phone',
+    'PTA Required', 'PTA Paid', 'PTA Balance',
+    'SDF Required', 'SDF Paid', 'SDF Balance',
+    'Boarding Required', 'Boarding Paid', 'Boarding Balance',
+    'Total Required', 'Total Paid', 'Total Balance',
+    'Payment Status',
+]
+INCOME_HEADER = ['Date', 'Student ID', 'Student Name', 'Form/Class', 'Fee Type', 'Amount Paid', 'Balance',
+                 'Payment Reference']
+EXPENDITURE_HEADER = ['Date', 'Activity/Service', 'Voucher No', 'Cheque No', 'Fund', 'Amount Paid']
+OTHER_INCOME_HEADER = ['Date', 'Customer Name', 'Income Type', 'Total Charge', 'Amount Paid', 'Balance']
+
+
+def get_export_filters(args):
+    """{'start_date', 'end_date', 'fund'} from request.args; raises ValueError for bad values."""
+    filters = {}
+    for name in ('start_date', 'end_date'):
+        value = args.get(name)
+        if value:
+            try:
+                filters[name] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+    fund = args.get('fund')
+    if fund:
+        matches = [name for name in FUNDS if name.lower() == fund.lower()]
+        if not matches:
+            raise ValueError(f"fund must be one of {', '.join(FUNDS)}")
+        filters['fund'] = matches[0]
+    return filters
+
+
+def _apply_filters(query, date_column, fund_column, filters):
+    if filters.get('start_date'):
+        query = query.filter(date_column >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.filter(date_column <= filters['end_date'])
+    if filters.get('fund') and fund_column is not None:
+        query = query.filter(fund_column == filters['fund'])
+    return query
+
+
+def _decryptor():
+    """decrypt(value, school_id, phone=False) using each school's key, looked up once per export."""
+    from app import db, SchoolConfiguration, decrypt_sensitive_field, decrypt_phone_field
+
+    keys = dict(db.session.query(SchoolConfiguration.id, SchoolConfiguration.encryption_key)
+                .filter(SchoolConfiguration.encryption_key.isnot(None)))
+
+    def decrypt(value, school_id, phone=False):
+        key = keys.get(school_id)
+        if not key or value is None:
+            return value
+        return (decrypt_phone_field if phone else decrypt_sensitive_field)(value, school_id, key)
+    return decrypt
+
+
+def csv_chunks(header, rows, rows_per_chunk=EXPORT_BATCH_SIZE):
+    """Yield the CSV text in chunks of rows_per_chunk rows, reusing one buffer."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(name, header, rows):
+    """Chunked text/csv download; rows is a generator run while the response is sent."""
+    filename = f'{name}_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    return Response(stream_with_context(csv_chunks(header, rows)), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        # Stop nginx from buffering the whole file before sending it on
+        'X-Accel-Buffering': 'no',
+    })
+
+
+def student_rows(base_query, status=None, form_class=None):
+    from app import Student
+    from student_balances import StudentBalanceQuery
+
+    balances = StudentBalanceQuery(base_query)
+    if status:
+        balances.where_status(status)
+    if form_class:
+        balances.query = balances.query.filter(Student.form_class == form_class)
+    query = balances.columns(
+        Student.school_id, Student.student_id, Student.name, Student.sex, Student.form_class, Student.parent_phone,
+        Student.pta_amount_paid, Student.sdf_amount_paid, Student.boarding_amount_paid,
+    ).order_by(Student.id)
+
+    decrypt = _decryptor()
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        paid = [float(row.pta_amount_paid or 0), float(row.sdf_amount_paid or 0), float(row.boarding_amount_paid or 0)]
+        required = [float(row.pta_required), float(row.sdf_required), float(row.boarding_required)]
+        balance = [float(row.pta_balance), float(row.sdf_balance), float(row.boarding_balance)]
+        yield [
+            decrypt(row.student_id, row.school_id), decrypt(row.name, row.school_id),
+            decrypt(row.sex, row.school_id), decrypt(row.form_class, row.school_id),
+            decrypt(row.parent_phone, row.school_id, phone=True) or '',
+            required[0], paid[0], balance[0],
+            required[1], paid[1], balance[1],
+            required[2], paid[2], balance[2],
+            sum(required), sum(paid), sum(balance),
+            'Paid in Full' if row.payment_status == 'paid' else 'Outstanding',
+        ]
+
+
+def income_rows(base_query, filters):
+    from app import Income
+
+    query = _apply_filters(base_query, Income.payment_date, Income.fee_type, filters).with_entities(
+        Income.school_id, Income.payment_date, Income.student_id, Income.student_name, Income.form_class,
+        Income.fee_type, Income.amount_paid, Income.balance, Income.payment_reference,
+    ).order_by(Income.payment_date, Income.id)
+
+    decrypt = _decryptor()
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        yield [row.payment_date.isoformat(), row.student_id, row.student_name, row.form_class, row.fee_type,
+               row.amount_paid, row.balance, decrypt(row.payment_reference, row.school_id) or '']
+
+
+def expenditure_rows(base_query, filters):
+    from app import Expenditure
+
+    query = _apply_filters(base_query, Expenditure.date, Expenditure.fund_type, filters).with_entities(
+        Expenditure.date, Expenditure.activity_service, Expenditure.voucher_no, Expenditure.cheque_no,
+        Expenditure.fund_type, Expenditure.amount_paid,
+    ).order_by(Expenditure.date, Expenditure.id)
+
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        yield [row.date.isoformat(), row.activity_service, row.voucher_no, row.cheque_no, row.fund_type,
+               row.amount_paid]
+
+
+def other_income_rows(base_query, filters):
+    from app import OtherIncome
+
+    # Other income is not tied to a fund, so only the date range applies
+    query = _apply_filters(base_query, OtherIncome.date, None, filters).with_entities(
+        OtherIncome.school_id, OtherIncome.date, OtherIncome.customer_name, OtherIncome.income_type,
+        OtherIncome.total_charge, OtherIncome.amount_paid, OtherIncome.balance,
+    ).order_by(OtherIncome.date, OtherIncome.id)
+
+    decrypt = _decryptor()
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        yield [row.date.isoformat(), decrypt(row.customer_name, row.school_id),
+               decrypt(row.income_type, row.school_id), row.total_charge, row.amount_paid, row.balance]
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Daily per-fund rollup of the ledger for reports.
+
+daily_fund_summary holds one row per (school, date, fund) with the student
+fees collected, the money spent, the other income received and the number
+of ledger rows behind them. Reports read these rows instead of the raw
+Income, Expenditure and OtherIncome tables.
+
+The rollup is kept up to date in the same transaction as the ledger: ORM
+flushes that add, edit or delete ledger rows apply their differences with
+one upsert per (school, date, fund). Writes that bypass the ORM (bulk
+inserts) must call record_ledger_rows(). Other income is booked under the
+'Other Income' fund, which is also the fund_type of spending from it.
+
+Usage:
+    python daily_fund_summary.py              # rebuild the rollup of every school
+    python daily_fund_summary.py <school_id>  # rebuild one school
+"""
+
+import sys
+from collections import defaultdict
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+OTHER_INCOME_FUND = 'Other Income'
+AMOUNT_COLUMNS = ('income', 'expenditure', 'other_income')
+
+_PENDING_KEY = 'daily_fund_summary_stored_values'
+
+# model name -> (date attribute, fund attribute or None, amount column in the rollup)
+_LEDGER = {
+    'Income': ('payment_date', 'fee_type', 'income'),
+    'Expenditure': ('date', 'fund_type', 'expenditure'),
+    'OtherIncome': ('date', None, 'other_income'),
+}
+
+
+def _ledger_spec(obj):
+    return _LEDGER.get(type(obj).__name__)
+
+
+def _empty():
+    return dict.fromkeys(AMOUNT_COLUMNS + ('tx_count',), 0)
+
+
+def _add(deltas, values, column, sign):
+    school_id, day, fund, amount = values
+    if school_id is None or day is None or fund is None:
+        return
+    delta = deltas[(school_id, day, fund)]
+    delta[column] += sign * (amount or 0)
+    delta['tx_count'] += sign
+
+
+def _watched(spec):
+    date_attr, fund_attr, _ = spec
+    return ('school_id', date_attr, 'amount_paid') + ((fund_attr,) if fund_attr else ())
+
+
+def _as_tuple(values, spec):
+    date_attr, fund_attr, _ = spec
+    fund = values[fund_attr] if fund_attr else OTHER_INCOME_FUND
+    return values['school_id'], values[date_attr], fund, values['amount_paid']
+
+
+def _current_values(obj, spec):
+    return _as_tuple({name: getattr(obj, name) for name in _watched(spec)}, spec)
+
+
+def _stored_values(session, obj, spec):
+    """Values of a ledger object as stored before this flush."""
+    state = inspect(obj)
+    values = {}
+    for name in _watched(spec):
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        elif not history.added:
+            values[name] = getattr(obj, name)
+        else:
+            # Overwritten without the old value being loaded: read it from the table
+            table = type(obj).__table__
+            row = session.connection().execute(
+                table.select().with_only_columns(*(table.c[n] for n in _watched(spec)))
+                .where(table.c.id == state.identity[0])
+            ).first()
+            return _as_tuple(dict(row._mapping), spec) if row else None
+    return _as_tuple(values, spec)
+
+
+def apply_summary_deltas(deltas, bind=None):
+    """Add {(school_id, date, fund): {income, expenditure, other_income, tx_count}} to the rollup."""
+    from app import db, DailyFundSummary
+
+    bind = bind if bind is not None else db.session
+    rows = [dict(delta, school_id=school_id, date=day, fund=fund)
+            for (school_id, day, fund), delta in deltas.items() if any(delta.values())]
+    if not rows:
+        return
+    table = DailyFundSummary.__table__
+    dialect = bind.get_bind().dialect.name if hasattr(bind, 'get_bind') else bind.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        bind.execute(statement.on_conflict_do_update(
+            index_elements=['school_id', 'date', 'fund'],
+            set_={name: table.c[name] + statement.excluded[name] for name in AMOUNT_COLUMNS + ('tx_count',)},
+        ), rows)
+        return
+    for row in rows:
+        updated = bind.execute(
+            table.update()
+            .where(table.c.school_id == row['school_id'], table.c.date == row['date'], table.c.fund == row['fund'])
+            .values({name: table.c[name] + row[name] for name in AMOUNT_COLUMNS + ('tx_count',)})
+        ).rowcount
+        if not updated:
+            bind.execute(table.insert().values(row))
+
+
+def record_ledger_rows(model, rows, bind=None):
+    """Book rows inserted outside the ORM (dicts of column values) in the rollup."""
+    date_attr, fund_attr, column = _LEDGER[model.__name__]
+    deltas = defaultdict(_empty)
+    for row in rows:
+        fund = row.get(fund_attr) if fund_attr else OTHER_INCOME_FUND
+        _add(deltas, (row.get('school_id'), row.get(date_attr), fund, row.get('amount_paid')), column, 1)
+    apply_summary_deltas(deltas, bind=bind)
+
+
+def _capture_stored_values(session, flush_context, instances):
+    """Before the flush, remember the stored values of ledger rows being changed or deleted."""
+    captured = []
+    for obj in session.deleted:
+        spec = _ledger_spec(obj)
+        if spec:
+            captured.append((obj, spec, _stored_values(session, obj, spec), False))
+    for obj in session.dirty:
+        spec = _ledger_spec(obj)
+        if spec and obj not in session.deleted and any(
+            inspect(obj).attrs[name].history.has_changes() for name in _watched(spec)
+        ):
+            captured.append((obj, spec, _stored_values(session, obj, spec), True))
+    session.info[_PENDING_KEY] = captured
+
+
+def _record_flush(session, flush_context):
+    deltas = defaultdict(_empty)
+    for obj in session.new:
+        spec = _ledger_spec(obj)
+        if spec:
+            _add(deltas, _current_values(obj, spec), spec[2], 1)
+    for obj, spec, stored, still_exists in session.info.pop(_PENDING_KEY, ()):
+        if stored:
+            _add(deltas, stored, spec[2], -1)
+        if still_exists:
+            _add(deltas, _current_values(obj, spec), spec[2], 1)
+    if deltas:
+        apply_summary_deltas(deltas, bind=session.connection())
+
+
+def rebuild_daily_summary(school_id=None):
+    """Recompute the rollup from the ledger tables for one school (or every school) and commit.
+    Returns the number of rollup rows written. Must run inside an application context.
+    """
+    from app import db, DailyFundSummary, Income, Expenditure, OtherIncome
+
+    sources = (
+        (Income, Income.payment_date, Income.fee_type, 'income'),
+        (Expenditure, Expenditure.date, Expenditure.fund_type, 'expenditure'),
+        (OtherIncome, OtherIncome.date, None, 'other_income'),
+    )
+    deltas = defaultdict(_empty)
+    try:
+        for model, date_column, fund_column, column in sources:
+            group_by = [model.school_id, date_column] + ([fund_column] if fund_column is not None else [])
+            query = db.session.query(*group_by, func.sum(model.amount_paid), func.count())
+            if school_id is not None:
+                query = query.filter(model.school_id == school_id)
+            for row in query.group_by(*group_by):
+                fund = row[2] if fund_column is not None else OTHER_INCOME_FUND
+                delta = deltas[(row[0], row[1], fund)]
+                delta[column] += row[-2] or 0
+                delta['tx_count'] += row[-1]
+
+        delete = DailyFundSummary.__table__.delete()
+        if school_id is not None:
+            delete = delete.where(DailyFundSummary.school_id == school_id)
+        db.session.execute(delete)
+        apply_summary_deltas(deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(deltas)
+
+
+def backfill_daily_summary():
+    """Build the rollup once for databases whose ledger predates it; returns the rows written."""
+    from app import db, DailyFundSummary, Income, Expenditure, OtherIncome
+
+    if db.session.query(DailyFundSummary.school_id).first() is not None:
+        return 0
+    if not any(db.session.query(model.id).first() for model in (Income, Expenditure, OtherIncome)):
+        return 0
+    return rebuild_daily_summary()
+
+
+def _discard_pending(session, *args):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def summary_query(start=None, end=None):
+    """School-filtered rollup rows between start and end (inclusive)."""
+    from app import DailyFundSummary, get_school_filtered_query
+
+    query = get_school_filtered_query(DailyFundSummary)
+    if start is not None:
+        query = query.filter(DailyFundSummary.date >= start)
+    if end is not None:
+        query = query.filter(DailyFundSummary.date <= end)
+    return query
+
+
+def get_fund_totals(start=None, end=None):
+    """{fund: {income, expenditure, other_income, tx_count}} for the current school and period."""
+    from app import DailyFundSummary
+
+    totals = defaultdict(_empty)
+    for fund, income, expenditure, other_income, tx_count in summary_query(start, end).with_entities(
+        DailyFundSummary.fund, func.sum(DailyFundSummary.income), func.sum(DailyFundSummary.expenditure),
+        func.sum(DailyFundSummary.other_income), func.sum(DailyFundSummary.tx_count),
+    ).group_by(DailyFundSummary.fund):
+        totals[fund] = {'income': income or 0, 'expenditure': expenditure or 0,
+                        'other_income': other_income or 0, 'tx_count': tx_count or 0}
+    return totals
+
+
+event.listen(Session, 'before_flush', _capture_stored_values)
+event.listen(Session, 'after_flush', _record_flush)
+event.listen(Session, 'after_rollback', _discard_pending)
+
+
+def main():
+    from app import app, db
+
+    school_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    with app.app_context():
+        db.create_all()
+        rows = rebuild_daily_summary(school_id)
+    print(f"✅ Rebuilt daily fund summary: {rows} rows for {'school ' + str(school_id) if school_id else 'all schools'}")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -39,9 +39,9 @@ def ensure_school_access(school_id: int | None = None) -> bool:
     
     # Validate that the school is still active and not blocked
     try:
-        from app import SchoolConfiguration
-        school = SchoolConfiguration.query.get(current_school_id)
-        if not school or not school.is_active or school.is_blocked:
+        from tenant_context import get_tenant_context
+        school = get_tenant_context().status
+        if not school or not school.is_open:
             return False
     except Exception:
         return False
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Online backups without stopping the app.
+
+SQLite: the database is copied with the sqlite3 online backup API, a few
+pages per step with a short pause between steps, from a background thread.
+Requests keep reading and writing meanwhile: in WAL mode the copy reads one
+snapshot in a single read transaction, and without WAL a step that sees
+another connection's write restarts the copy. Either way the result is a
+consistent database, never a torn file. The copy is checked with PRAGMA
+integrity_check, optionally gzipped, and old copies are rotated out.
+
+PostgreSQL: every active school gets a logical snapshot, read in one
+REPEATABLE READ transaction through the app's own engine (no pg_dump):
+the school's tenant schema tables plus its rows in the global tables,
+written as gzipped JSON lines.
+
+Processes coordinate through BACKUP_DIR: a run holds an exclusive lock on
+backup.lock (released by the OS if the process dies), and its progress is
+written to backup_status.json, so any worker can report it. The scheduler
+checks whether a run is due while holding the same lock, so however many
+processes run it, one backup is made per interval. Under gunicorn it is
+started in every worker by post_fork (gunicorn.conf.py), never in the
+preloaded master; elsewhere (python app.py, run_app.py) when app.py loads.
+
+Settings (app.config, from the environment):
+    BACKUP_DIR             where backups go (default instance/backups)
+    BACKUP_KEEP            copies kept per database or school (default 7)
+    BACKUP_COMPRESS        gzip the SQLite copy (default off)
+    BACKUP_INTERVAL_HOURS  run in the background every N hours (default 0: off)
+
+Usage: python db_backups.py    (one backup now, e.g. from cron)
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+try:
+    import fcntl
+except ImportError:  # Windows desktop installs
+    fcntl = None
+    import msvcrt
+
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.005      # seconds between steps, so writers get the database
+SQLITE_PREFIX = 'smartfee_backup_'
+STAMP_FORMAT = '%Y%m%d_%H%M%S'
+LOCK_FILE = 'backup.lock'
+STATUS_FILE = 'backup_status.json'
+RUNNING_STATES = ('running', 'verifying', 'compressing')
+
+
+def _try_lock(directory):
+    """Exclusive lock on BACKUP_DIR/backup.lock without waiting; the open file, or None if held."""
+    handle = open(os.path.join(directory, LOCK_FILE), 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def _unlock(handle):
+    if not fcntl:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    handle.close()
+
+
+def _read_status(directory):
+    try:
+        with open(os.path.join(directory, STATUS_FILE)) as status_file:
+            return json.load(status_file)
+    except (OSError, ValueError):
+        return {'state': 'idle'}
+
+
+def _write_status(directory, status):
+    # Replace the file in one step so readers never see half a status
+    path = os.path.join(directory, STATUS_FILE)
+    with open(path + '.tmp', 'w') as status_file:
+        json.dump(status, status_file)
+    os.replace(path + '.tmp', path)
+
+
+def get_backup_status(app):
+    """The current or last backup run of any process: state, progress, duration, files, error."""
+    directory = app.config['BACKUP_DIR']
+    status = _read_status(directory)
+    if status['state'] in RUNNING_STATES and os.path.isdir(directory):
+        # Nobody holds the lock: the process running it died
+        lock = _try_lock(directory)
+        if lock:
+            _unlock(lock)
+            status['state'] = 'interrupted'
+    return status
+
+
+def backup_settings(environ=os.environ, instance_path='instance'):
+    """BACKUP_* settings for app.config."""
+    return {
+        'BACKUP_DIR': environ.get('BACKUP_DIR') or os.path.join(instance_path, 'backups'),
+        'BACKUP_KEEP': int(environ.get('BACKUP_KEEP', 7)),
+        'BACKUP_COMPRESS': environ.get('BACKUP_COMPRESS', '').lower() in ('1', 'true', 'yes'),
+        'BACKUP_INTERVAL_HOURS': float(environ.get('BACKUP_INTERVAL_HOURS', 0)),
+    }
+
+
+def backup_sqlite(source_path, target_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None):
+    """Online copy of a live SQLite file; progress(done_pages, total_pages) after each step."""
+    def step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        time.sleep(pause)
+
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            # One read transaction pins the snapshot for every step, so concurrent
+            # commits neither restart the copy nor wait for it
+            source.execute('BEGIN')
+            source.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        source.backup(target, pages=pages, progress=step)
+    finally:
+        target.close()
+        source.close()
+
+
+def check_integrity(path):
+    """PRAGMA integrity_check on a database file; returns the problems (empty when ok)."""
+    connection = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+    finally:
+        connection.close()
+    return [] if rows == ['ok'] else rows
+
+
+def compress(path):
+    """Gzip path to path.gz and remove the original."""
+    with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+        shutil.copyfileobj(source, target)
+    os.remove(path)
+    return path + '.gz'
+
+
+def rotate(directory, prefix, keep):
+    """Delete all but the newest keep files starting with prefix; returns the deleted names."""
+    names = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+    expired = names[:-keep] if keep > 0 else []
+    for name in expired:
+        os.remove(os.path.join(directory, name))
+    return expired
+
+
+def snapshot_school(connection, school_id, target_path, schema=None):
+    """Write one school's rows as gzipped JSON lines; returns the row count per table.
+    schema: the school's tenant schema, or None when tenant tables are shared.
+    """
+    from app import db
+    from tenant_schemas import TENANT_SCHEMA, tenant_schema_map
+
+    connection = connection.execution_options(schema_translate_map=tenant_schema_map(schema))
+    counts = {}
+    with gzip.open(target_path, 'wt', encoding='utf-8') as target:
+        target.write(json.dumps({'school_id': school_id, 'schema': schema,
+                                 'created_at': datetime.utcnow().isoformat()}) + '\n')
+        for table in db.metadata.sorted_tables:
+            if table.name == 'school_configuration':
+                query = table.select().where(table.c.id == school_id)
+            elif 'school_id' in table.c:
+                query = table.select().where(table.c.school_id == school_id)
+            elif table.schema == TENANT_SCHEMA:
+                query = table.select()
+            else:
+                continue
+            counts[table.name] = 0
+            for row in connection.execute(query).mappings():
+                target.write(json.dumps({'table': table.name, 'row': dict(row)}, default=str) + '\n')
+                counts[table.name] += 1
+    return counts
+
+
+def _backup_sqlite_database(app, directory, stamp, update_status):
+    from app import db
+
+    target = os.path.join(directory, f'{SQLITE_PREFIX}{stamp}.db')
+    backup_sqlite(db.engine.url.database, target,
+                  progress=lambda done, total: update_status(pages_done=done, pages_total=total))
+    update_status(state='verifying')
+    problems = check_integrity(target)
+    if problems:
+        os.rename(target, target + '.corrupt')
+        raise RuntimeError(f"integrity check failed: {'; '.join(problems[:3])}")
+    if app.config['BACKUP_COMPRESS']:
+        update_status(state='compressing')
+        target = compress(target)
+    rotate(directory, SQLITE_PREFIX, app.config['BACKUP_KEEP'])
+    return [target]
+
+
+def _snapshot_tenants(app, directory, stamp, update_status):
+    from app import db, SchoolConfiguration, get_tenant_schema_name
+
+    files = []
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+        school_ids = connection.execute(
+            select(SchoolConfiguration.id).where(SchoolConfiguration.is_active.is_(True)).order_by(SchoolConfiguration.id)
+        ).scalars().all()
+        for done, school_id in enumerate(school_ids):
+            update_status(schools_done=done, schools_total=len(school_ids))
+            prefix = f'school_{school_id}_snapshot_'
+            schema = get_tenant_schema_name(school_id) if app.config.get('TENANT_SCHEMAS') else None
+            target = os.path.join(directory, f'{prefix}{stamp}.jsonl.gz')
+            snapshot_school(connection, school_id, target, schema)
+            files.append(target)
+            rotate(directory, prefix, app.config['BACKUP_KEEP'])
+        update_status(schools_done=len(school_ids))
+    return files
+
+
+def _seconds_until_due(status, interval):
+    """Seconds until the next scheduled run, from the last run's finish time."""
+    if not status.get('finished_at'):
+        return 0
+    elapsed = (datetime.now() - datetime.fromisoformat(status['finished_at'])).total_seconds()
+    return interval - elapsed
+
+
+def run_backup(app, interval=None):
+    """Back up the app's database now; returns the status of the run.
+    While another process or thread runs a backup, returns its status instead.
+    interval: seconds; skip the run (returning None) unless the last one finished that long ago.
+    """
+    directory = app.config['BACKUP_DIR']
+    os.makedirs(directory, exist_ok=True)
+    lock = _try_lock(directory)
+    if lock is None:
+        return get_backup_status(app)
+    try:
+        if interval is not None and _seconds_until_due(_read_status(directory), interval) > 0:
+            return None
+
+        status = {'state': 'running', 'started_at': datetime.now().isoformat(timespec='seconds')}
+
+        def update_status(**values):
+            status.update(values)
+            _write_status(directory, status)
+
+        update_status()
+        started = time.perf_counter()
+        stamp = datetime.now().strftime(STAMP_FORMAT)
+        try:
+            with app.app_context():
+                from app import db
+                if db.engine.dialect.name == 'sqlite':
+                    files = _backup_sqlite_database(app, directory, stamp, update_status)
+                else:
+                    files = _snapshot_tenants(app, directory, stamp, update_status)
+            status.update(state='done', files=files, size=sum(os.path.getsize(path) for path in files))
+        except Exception as e:
+            status.update(state='failed', error=str(e))
+        update_status(duration=round(time.perf_counter() - started, 2),
+                      finished_at=datetime.now().isoformat(timespec='seconds'))
+        return dict(status)
+    finally:
+        _unlock(lock)
+
+
+def run_backup_in_background(app):
+    """Start run_backup in a daemon thread so the request returns at once."""
+    threading.Thread(target=run_backup, args=(app,), name='db-backup', daemon=True).start()
+
+
+def start_backup_scheduler(app):
+    """Back up every BACKUP_INTERVAL_HOURS in a daemon thread of this process.
+    Safe to start in every worker: whether a run is due is decided under the
+    backup lock from the last finished run in BACKUP_DIR.
+    """
+    interval = app.config['BACKUP_INTERVAL_HOURS'] * 3600
+
+    def schedule():
+        while True:
+            try:
+                run_backup(app, interval)
+                wait = _seconds_until_due(_read_status(app.config['BACKUP_DIR']), interval)
+            except Exception as e:
+                print(f"Scheduled backup error: {e}")
+                wait = interval
+            time.sleep(max(wait, 60))
+
+    threading.Thread(target=schedule, name='db-backup-scheduler', daemon=True).start()
+
+
+def main():
+    from app import app
+
+    status = run_backup(app)
+    if status['state'] in RUNNING_STATES:
+        print(f"❌ Another backup has been running since {status['started_at']}")
+        return False
+    if status['state'] != 'done':
+        print(f"❌ Backup failed after {status['duration']} s: {status.get('error')}")
+        return False
+    for path in status['files']:
+        print(f"✅ {path}")
+    print(f"✅ Backup finished in {status['duration']} s ({status['size'] / 1024:.0f} KiB)")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Reconciliation of deposit slips against bank statement exports.
+
+Statement lines are stored in bank_statement_line with their match status,
+keyed by a hash of the line, so importing the same export again (or a
+longer one covering the same days) only adds and matches the new lines.
+
+The ledger side is the school's Income rows for the statement period,
+grouped into deposits: all rows of one day with the same normalised
+payment reference, or per student and day when the reference is missing
+(the Receipt deposit_slip_ref is used when only the Income row lost it).
+Slip books restart, so the day is part of every deposit key. Both sides
+are put in hash indexes, so matching is linear:
+
+- exact: the line's reference (or a word of its description) is the
+  reference of an unclaimed deposit with the same amount (the nearest
+  day wins);
+- fuzzy: no reference match, but an unclaimed deposit has the same amount
+  within DATE_WINDOW_DAYS of the line (the nearest one wins);
+- unmatched: neither. A reference found with a different amount is
+  noted on the line.
+
+Deposits claimed by an earlier run are not offered again. Ledger deposits
+in the period with no statement line are reported as well.
+
+CSV columns (header names are case-insensitive):
+    date (or transaction_date, value_date), reference (or ref, slip_no),
+    description (or narrative, details), amount (or credit), debit
+Debit lines are ignored.
+
+Usage: python deposit_reconciliation.py <school_id> <statement.csv>
+"""
+
+import csv
+import hashlib
+import re
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+DATE_WINDOW_DAYS = 3
+
+COLUMN_ALIASES = {
+    'date': 'date', 'transaction_date': 'date', 'value_date': 'date', 'posting_date': 'date',
+    'reference': 'reference', 'ref': 'reference', 'ref_no': 'reference', 'slip_no': 'reference',
+    'deposit_ref': 'reference', 'cheque_no': 'reference',
+    'description': 'description', 'narrative': 'description', 'details': 'description', 'particulars': 'description',
+    'amount': 'amount', 'credit': 'amount', 'credit_amount': 'amount',
+    'debit': 'debit', 'debit_amount': 'debit',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d %b %Y', '%d-%b-%Y')
+
+# Words banks and clerks put in front of the slip number
+_REFERENCE_PREFIXES = re.compile(r'^(?:DEPOSIT|DEP|SLIP|REF|NO)+')
+_NOT_ALNUM = re.compile(r'[^0-9A-Z]')
+
+
+class ReconciliationResult:
+    """Outcome of a reconciliation run."""
+
+    def __init__(self):
+        self.new_lines = 0
+        self.already_imported = 0
+        self.exact = 0
+        self.fuzzy = 0
+        self.unmatched = 0
+        self.errors = []
+        self.unmatched_deposits = []
+
+    def add_error(self, line, message):
+        self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {'new_lines': self.new_lines, 'already_imported': self.already_imported,
+                'exact': self.exact, 'fuzzy': self.fuzzy, 'unmatched': self.unmatched,
+                'errors': self.errors, 'unmatched_deposits': self.unmatched_deposits}
+
+
+def normalise_reference(value):
+    """'Dep. slip no 00123' and 'SLIP-123' both become '123'."""
+    reference = _NOT_ALNUM.sub('', str(value or '').upper())
+    stripped = _REFERENCE_PREFIXES.sub('', reference).lstrip('0')
+    return stripped or reference
+
+
+def _cents(amount):
+    return int(round(amount * 100))
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    value = str(value or '').replace(',', '').strip()
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def read_statement_rows(stream):
+    """Yield (line number, row) from a CSV stream with rows keyed by the canonical column names."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        values = {}
+        for name, value in row.items():
+            column = COLUMN_ALIASES.get((name or '').strip().lower().replace(' ', '_'))
+            if column and column not in values:
+                values[column] = (value or '').strip()
+        if any(values.values()):
+            yield reader.line_num, values
+
+
+def parse_statement_row(row):
+    """Return (values, None), (None, error message), or (None, None) for a debit line."""
+    transaction_date = _parse_date(row.get('date', ''))
+    if transaction_date is None:
+        return None, f"Invalid date {row.get('date', '')!r}"
+    amount, debit = _parse_amount(row.get('amount')), _parse_amount(row.get('debit'))
+    if amount is None or debit is None:
+        return None, f"Invalid amount {row.get('amount') or row.get('debit')!r}"
+    if amount <= 0 or debit > 0:
+        return None, None
+    reference = row.get('reference', '')[:100]
+    description = row.get('description', '')[:400]
+    return {'transaction_date': transaction_date, 'reference': reference, 'description': description,
+            'normalised_reference': normalise_reference(reference) if reference else '',
+            'amount': amount}, None
+
+
+def line_hash(values, occurrence):
+    """Stable identity of a statement line; occurrence tells identical lines of one export apart."""
+    key = '|'.join((values['transaction_date'].isoformat(), values['reference'], values['description'],
+                    f"{values['amount']:.2f}", str(occurrence)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def import_statement(school_id, rows, result):
+    """Store the statement lines not imported before; returns nothing, counts go to result."""
+    from app import db, BankStatementLine
+
+    lines = {}
+    occurrences = defaultdict(int)
+    for line, row in rows:
+        values, error = parse_statement_row(row)
+        if error:
+            result.add_error(line, error)
+        elif values:
+            identity = (values['transaction_date'], values['reference'], values['description'], values['amount'])
+            occurrences[identity] += 1
+            lines[line_hash(values, occurrences[identity])] = values
+
+    hashes = list(lines)
+    existing = set()
+    for start in range(0, len(hashes), 500):
+        existing.update(key for (key,) in db.session.query(BankStatementLine.line_hash).filter(
+            BankStatementLine.school_id == school_id, BankStatementLine.line_hash.in_(hashes[start:start + 500])
+        ))
+
+    new_rows = [dict(values, school_id=school_id, line_hash=key, status='unmatched')
+                for key, values in lines.items() if key not in existing]
+    if new_rows:
+        db.session.execute(BankStatementLine.__table__.insert(), new_rows)
+    result.new_lines = len(new_rows)
+    result.already_imported = len(existing)
+
+
+def load_ledger_deposits(school_id, start, end):
+    """{deposit key: deposit} for the school's Income rows between start and end.
+    The key is 'reference:date' with the normalised payment reference, or '#student_id:date' when it is missing.
+    """
+    from app import db, Income, Receipt, SchoolConfiguration, decrypt_sensitive_field
+
+    school = db.session.get(SchoolConfiguration, school_id)
+    key = school.encryption_key if school else None
+
+    def plain(reference):
+        return decrypt_sensitive_field(reference, school_id, key) if key and reference else reference
+
+    # References kept on the receipt when the income row lost its own
+    receipt_references = {}
+    for student_id, payment_date, fee_type, amount, reference in db.session.query(
+        Receipt.student_id, Receipt.payment_date, Receipt.fee_type, Receipt.amount_paid, Receipt.deposit_slip_ref
+    ).filter(Receipt.school_id == school_id, Receipt.payment_date.between(start, end)):
+        if reference:
+            receipt_references[(student_id, payment_date, fee_type, _cents(amount))] = plain(reference)
+
+    deposits = {}
+    for student_id, student_name, payment_date, fee_type, amount, reference in db.session.query(
+        Income.student_id, Income.student_name, Income.payment_date, Income.fee_type, Income.amount_paid,
+        Income.payment_reference
+    ).filter(Income.school_id == school_id, Income.payment_date.between(start, end)):
+        reference = plain(reference) or receipt_references.get((student_id, payment_date, fee_type, _cents(amount)))
+        normalised = normalise_reference(reference) if reference else None
+        deposit_key = f"{normalised or '#' + student_id}:{payment_date.isoformat()}"
+        deposit = deposits.get(deposit_key)
+        if deposit is None:
+            deposit = deposits[deposit_key] = {'key': deposit_key, 'reference': reference or '',
+                                               'normalised_reference': normalised,
+                                               'payment_date': payment_date, 'amount': 0.0, 'students': []}
+        deposit['amount'] += amount
+        if student_id not in deposit['students']:
+            deposit['students'].append(student_id)
+    return deposits
+
+
+def _match_lines(lines, deposits):
+    """Yield (line, status, deposit, note) for every line, claiming deposits as they match."""
+    claimed = set()
+    by_reference = defaultdict(list)
+    for deposit in deposits.values():
+        if deposit['normalised_reference']:
+            by_reference[deposit['normalised_reference']].append(deposit)
+
+    exact_matches, remaining = [], []
+    for line in lines:
+        candidates = [line.normalised_reference] if line.normalised_reference else []
+        candidates += [normalise_reference(word) for word in (line.description or '').split()
+                       if sum(ch.isdigit() for ch in word) >= 3]
+        deposit, note = None, None
+        for candidate in candidates:
+            found = [d for d in by_reference.get(candidate, ()) if d['key'] not in claimed]
+            same_amount = [d for d in found if _cents(d['amount']) == _cents(line.amount)]
+            if same_amount:
+                deposit = min(same_amount, key=lambda d: abs((d['payment_date'] - line.transaction_date).days))
+                break
+            if found:
+                note = f"Reference {found[0]['reference']} is in the ledger with MK {found[0]['amount']:,.2f}"
+        if deposit:
+            claimed.add(deposit['key'])
+            exact_matches.append((line, 'exact', deposit, None))
+        else:
+            remaining.append((line, note))
+    yield from exact_matches
+
+    # Fuzzy pass only after every exact match has claimed its deposit
+    by_amount_and_day = defaultdict(list)
+    for deposit in deposits.values():
+        if deposit['key'] not in claimed:
+            by_amount_and_day[(_cents(deposit['amount']), deposit['payment_date'])].append(deposit)
+    # Same day first, then one day either side, and so on
+    offsets = sorted(range(-DATE_WINDOW_DAYS, DATE_WINDOW_DAYS + 1), key=abs)
+    for line, note in remaining:
+        cents, match = _cents(line.amount), None
+        for offset in offsets:
+            candidates = by_amount_and_day.get((cents, line.transaction_date + timedelta(days=offset)))
+            if candidates:
+                match = candidates.pop(0)
+                break
+        if match:
+            yield line, 'fuzzy', match, note
+        else:
+            yield line, 'unmatched', None, note
+
+
+def reconcile(school_id, result=None):
+    """Match the school's unmatched statement lines against the unclaimed ledger deposits.
+    Must run inside an application context; the caller commits.
+    """
+    from app import db, BankStatementLine
+    from sqlalchemy import bindparam
+
+    result = result or ReconciliationResult()
+    lines = db.session.query(
+        BankStatementLine.id, BankStatementLine.transaction_date, BankStatementLine.normalised_reference,
+        BankStatementLine.description, BankStatementLine.amount
+    ).filter_by(school_id=school_id, status='unmatched').all()
+    if not lines:
+        return result
+
+    start = min(line.transaction_date for line in lines)
+    end = max(line.transaction_date for line in lines)
+    window = timedelta(days=DATE_WINDOW_DAYS)
+    deposits = load_ledger_deposits(school_id, start - window, end + window)
+    # Every key carries its deposit's day, so only claims of deposits in this window are looked up
+    keys = list(deposits)
+    for chunk in range(0, len(keys), 500):
+        for (key,) in db.session.query(BankStatementLine.ledger_key).filter(
+            BankStatementLine.school_id == school_id, BankStatementLine.ledger_key.in_(keys[chunk:chunk + 500])
+        ):
+            deposits.pop(key, None)
+
+    now = datetime.utcnow()
+    updates, claimed = [], set()
+    for line, status, deposit, note in _match_lines(lines, deposits):
+        setattr(result, status, getattr(result, status) + 1)
+        if deposit:
+            claimed.add(deposit['key'])
+        updates.append({'line_id': line.id, 'new_status': status, 'new_key': deposit['key'] if deposit else None,
+                        'new_note': note, 'new_matched_at': now if deposit else None})
+
+    table = BankStatementLine.__table__
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('line_id')).values(
+            status=bindparam('new_status'), ledger_key=bindparam('new_key'),
+            note=bindparam('new_note'), matched_at=bindparam('new_matched_at')),
+        updates,
+    )
+    db.session.expire_all()
+
+    result.unmatched_deposits = [{
+        'reference': deposit['reference'], 'payment_date': deposit['payment_date'].isoformat(),
+        'amount': deposit['amount'], 'students': deposit['students'],
+    } for key, deposit in sorted(deposits.items(), key=lambda item: (item[1]['payment_date'], item[0]))
+        if key not in claimed and start <= deposit['payment_date'] <= end]
+    return result
+
+
+def reconcile_statement(school_id, stream):
+    """Import a statement CSV stream and reconcile the school's open lines in one transaction."""
+    from app import db
+
+    result = ReconciliationResult()
+    try:
+        import_statement(school_id, read_statement_rows(stream), result)
+        reconcile(school_id, result)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    result.errors.sort(key=lambda error: error['line'])
+    return result
+
+
+def main():
+    from app import app
+
+    if len(sys.argv) != 3:
+        print(__doc__)
+        return False
+    school_id, path = int(sys.argv[1]), sys.argv[2]
+
+    with app.app_context():
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            result = reconcile_statement(school_id, stream)
+
+    print(f"✅ {result.new_lines} new statement lines ({result.already_imported} already imported)")
+    print(f"✅ {result.exact} exact, {result.fuzzy} fuzzy matches")
+    if result.unmatched:
+        print(f"❌ {result.unmatched} statement lines without a ledger deposit")
+    if result.unmatched_deposits:
+        print(f"❌ {len(result.unmatched_deposits)} ledger deposits not on the statement")
+    for error in result.errors:
+        print(f"❌ line {error['line']}: {error['error']}")
+    return not result.errors
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,119 @@
+"""
+All-time fund totals for dashboards, reports and print views.
+
+Collected amounts (student fees per fund plus other income) come from one
+aggregate statement and spending per fund from one GROUP BY fund_type
+statement, instead of a separate SUM query per fund and table.
+"""
+
+from sqlalchemy import case, func
+
+FUND_TYPES = ('PTA', 'SDF', 'Boarding', 'Other Income')
+
+# Expenditure.fund_type value -> attribute prefix
+_FUND_KEYS = {'PTA': 'pta', 'SDF': 'sdf', 'Boarding': 'boarding', 'Other Income': 'other_income'}
+
+
+class FinancialTotals:
+    """Collected, spent and remaining amounts per fund for one school (or all schools)."""
+
+    def __init__(self, collected, spent, spent_on_day):
+        self.pta_collected = collected.get('pta', 0)
+        self.sdf_collected = collected.get('sdf', 0)
+        self.boarding_collected = collected.get('boarding', 0)
+        self.other_income_collected = collected.get('other_income', 0)
+
+        self.pta_spent = spent.get('pta', 0)
+        self.sdf_spent = spent.get('sdf', 0)
+        self.boarding_spent = spent.get('boarding', 0)
+        self.other_income_spent = spent.get('other_income', 0)
+        # Spending of every fund type, including ones outside FUND_TYPES
+        self.total_spent = sum(spent.values())
+
+        # Spending on the requested day (0 when no day was given)
+        self.spent_on_day = spent_on_day
+
+    @property
+    def fees_collected(self):
+        """Student fees collected across PTA, SDF and boarding."""
+        return self.pta_collected + self.sdf_collected + self.boarding_collected
+
+    @property
+    def total_collected(self):
+        """Student fees plus other income."""
+        return self.fees_collected + self.other_income_collected
+
+    @property
+    def pta_balance(self):
+        return self.pta_collected - self.pta_spent
+
+    @property
+    def sdf_balance(self):
+        return self.sdf_collected - self.sdf_spent
+
+    @property
+    def boarding_balance(self):
+        return self.boarding_collected - self.boarding_spent
+
+    @property
+    def other_income_balance(self):
+        return self.other_income_collected - self.other_income_spent
+
+    def to_dict(self):
+        return {
+            'pta_collected': self.pta_collected,
+            'sdf_collected': self.sdf_collected,
+            'boarding_collected': self.boarding_collected,
+            'other_income_collected': self.other_income_collected,
+            'pta_spent': self.pta_spent,
+            'sdf_spent': self.sdf_spent,
+            'boarding_spent': self.boarding_spent,
+            'other_income_spent': self.other_income_spent,
+            'total_collected': self.total_collected,
+            'total_spent': self.total_spent,
+            'spent_on_day': self.spent_on_day,
+        }
+
+
+def get_financial_totals(spent_on=None):
+    """Fund totals for the current school (all schools in the developer view).
+
+    Runs two statements: one for everything collected and one grouped by
+    expenditure fund type. When spent_on is a date, the grouped statement also
+    sums that day's spending via SUM(CASE ...).
+    """
+    from app import db, Student, OtherIncome, Expenditure, get_school_filtered_query
+
+    other_income_total = (
+        get_school_filtered_query(OtherIncome)
+        .with_entities(func.coalesce(func.sum(OtherIncome.amount_paid), 0))
+        .scalar_subquery()
+    )
+    collected_row = (
+        get_school_filtered_query(Student)
+        .with_entities(
+            func.coalesce(func.sum(Student.pta_amount_paid), 0).label('pta'),
+            func.coalesce(func.sum(Student.sdf_amount_paid), 0).label('sdf'),
+            func.coalesce(func.sum(Student.boarding_amount_paid), 0).label('boarding'),
+            other_income_total.label('other_income'),
+        )
+        .one()
+    )
+    collected = dict(collected_row._mapping)
+
+    if spent_on is not None:
+        day_amount = func.sum(case((Expenditure.date == spent_on, Expenditure.amount_paid), else_=0))
+    else:
+        day_amount = func.sum(0)
+    spent = {}
+    spent_on_day = 0
+    for fund_type, amount, amount_on_day in (
+        get_school_filtered_query(Expenditure)
+        .with_entities(Expenditure.fund_type, func.sum(Expenditure.amount_paid), day_amount)
+        .group_by(Expenditure.fund_type)
+    ):
+        key = _FUND_KEYS.get(fund_type, fund_type)
+        spent[key] = spent.get(key, 0) + (amount or 0)
+        spent_on_day += amount_on_day or 0
+
+    return FinancialTotals(collected, spent, spent_on_day)
@@ -5,13 +5,20 @@ import os
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
 backlog = 2048
 
-# Worker processes
-workers = 1
-worker_class = "sync"
+# Worker processes: WEB_CONCURRENCY workers with GUNICORN_THREADS threads each.
+# More than one thread switches to the threaded (gthread) worker.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = "gthread" if threads > 1 else "sync"
 worker_connections = 1000
 timeout = 30
 keepalive = 2
 
+# One pooled database connection per thread in every worker (workers x threads in total),
+# read by app.py when it builds the engine
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(max(2, threads // 2)))
+
 # Restart workers after this many requests, to help prevent memory leaks
 max_requests = 1000
 max_requests_jitter = 100
@@ -34,4 +41,25 @@ tmp_upload_dir = None
 
 # SSL
 keyfile = None
-certfile = None
\ No newline at end of file
+certfile = None
+
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool instead of the one inherited from the master,
+    and open its connections before the first request arrives."""
+    from app import app, db
+
+    with app.app_context():
+        # close=False leaves the master's connections to the master
+        db.engine.dispose(close=False)
+        try:
+            connections = [db.engine.connect() for _ in range(threads)]
+            for connection in connections:
+                connection.close()
+        except Exception as e:
+            server.log.warning(f"Worker {worker.pid}: could not warm database connections: {e}")
+
+    # Scheduled backups run from the workers; the backup lock lets only one of them back up per interval
+    if app.config['BACKUP_INTERVAL_HOURS'] > 0:
+        from db_backups import start_backup_scheduler
+        start_backup_scheduler(app)
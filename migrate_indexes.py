@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Idempotent migration for the indexes declared on the tenant tables.
+
+db.create_all() only builds indexes together with new tables, so databases
+created before the indexes were declared need this migration:
+
+- SQLite: every missing index is created in the main database
+  (also run automatically by ensure_database_schema on startup).
+- PostgreSQL: indexes are created in public and in every school_N tenant schema.
+
+Usage:
+    python migrate_indexes.py           # create missing indexes
+    python migrate_indexes.py --check   # EXPLAIN the hot queries and report index usage
+"""
+
+import sys
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+TENANT_TABLES = (
+    'student', 'income', 'expenditure', 'fund_configuration',
+    'receipt', 'other_income', 'budget', 'professional_receipt',
+)
+# Tables that only live in the public schema
+GLOBAL_TABLES = ('notification_log', 'sms_outbox', 'bank_statement_line')
+
+
+def _tenant_schemas(connection):
+    rows = connection.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name LIKE 'school\\_%' ORDER BY schema_name"
+    ))
+    return [row[0] for row in rows]
+
+
+def create_indexes():
+    """Create every declared index that is missing; safe to run repeatedly.
+    Returns a list of (schema, index_name, error) where error is None on success.
+    Must run inside an application context.
+    """
+    from app import db
+    from tenant_schemas import tenant_schema_map
+
+    tables = {table.name: table for table in db.metadata.sorted_tables}
+    results = []
+    with db.engine.connect() as connection:
+        targets = [(None, TENANT_TABLES + GLOBAL_TABLES)]
+        if connection.dialect.name == 'postgresql':
+            targets += [(schema, TENANT_TABLES) for schema in _tenant_schemas(connection)]
+
+        for schema, table_names in targets:
+            existing_tables = set(inspect(connection).get_table_names(schema=schema))
+            for table_name in table_names:
+                if table_name not in existing_tables:
+                    continue
+                for index in sorted(tables[table_name].indexes, key=lambda i: i.name):
+                    try:
+                        # Tenant tables resolve to the tenant schema (or public)
+                        connection.execute(CreateIndex(index, if_not_exists=True),
+                                           execution_options={'schema_translate_map': tenant_schema_map(schema)})
+                        connection.commit()
+                        results.append((schema, index.name, None))
+                    except Exception as e:
+                        connection.rollback()
+                        results.append((schema, index.name, str(e)))
+    return results
+
+
+def _hot_queries(school_id):
+    """(description, expected index, statement) for the query shapes the routes run."""
+    from app import (Income, Expenditure, FundConfiguration, Receipt, OtherIncome,
+                     Budget, ProfessionalReceipt, NotificationLog)
+    from datetime import date
+
+    start, end = date(2024, 1, 1), date(2024, 12, 31)
+    return [
+        ('latest payment of a student', 'ix_income_school_student_date',
+         select(Income.payment_date).where(Income.school_id == school_id, Income.student_id == '0001')
+         .order_by(Income.payment_date.desc()).limit(1)),
+        ('income for a date range', 'ix_income_school_date',
+         select(Income.id).where(Income.school_id == school_id, Income.payment_date.between(start, end))),
+        ('income totals per fee type', 'ix_income_school_fee_type_date',
+         select(func.sum(Income.amount_paid)).where(Income.school_id == school_id, Income.fee_type == 'PTA')),
+        ('expenditure for a date range', 'ix_expenditure_school_date',
+         select(Expenditure.id).where(Expenditure.school_id == school_id, Expenditure.date.between(start, end))),
+        ('expenditure per fund type', 'ix_expenditure_school_fund_type',
+         select(func.sum(Expenditure.amount_paid)).where(Expenditure.school_id == school_id,
+                                                         Expenditure.fund_type == 'SDF')),
+        ('spend per budget activity', 'ix_expenditure_school_activity',
+         select(Expenditure.activity_service, func.count()).where(Expenditure.school_id == school_id)
+         .group_by(Expenditure.activity_service)),
+        ('budget lines of a school', 'ix_budget_school_activity',
+         select(Budget.id).where(Budget.school_id == school_id, Budget.activity_service == 'Stationery')),
+        ('active fund configuration', 'ix_fund_configuration_school_active',
+         select(FundConfiguration.id).where(FundConfiguration.school_id == school_id,
+                                            FundConfiguration.is_active == True)),
+        ('receipts of a student', 'ix_receipt_school_student',
+         select(Receipt.id).where(Receipt.school_id == school_id, Receipt.student_id == '0001')),
+        ('receipts for a date range', 'ix_receipt_school_date',
+         select(Receipt.id).where(Receipt.school_id == school_id, Receipt.payment_date.between(start, end))),
+        ('other income for a date range', 'ix_other_income_school_date',
+         select(OtherIncome.id).where(OtherIncome.school_id == school_id, OtherIncome.date.between(start, end))),
+        ('professional receipt of a student', 'ix_professional_receipt_school_student',
+         select(ProfessionalReceipt.id).where(ProfessionalReceipt.school_id == school_id,
+                                              ProfessionalReceipt.student_id == '0001')),
+        ('recent notifications', 'ix_notification_log_school_sent',
+         select(NotificationLog.id).where(NotificationLog.school_id == school_id)
+         .order_by(NotificationLog.sent_at.desc()).limit(3)),
+    ]
+
+
+def check_index_usage(school_id=1):
+    """EXPLAIN every hot query and report whether its index is used.
+    Returns a list of (description, expected_index, used, plan).
+    """
+    from app import db
+    from tenant_schemas import DEFAULT_SCHEMA_MAP
+
+    report = []
+    with db.engine.connect() as connection:
+        is_postgres = connection.dialect.name == 'postgresql'
+        if is_postgres:
+            # Tiny tables would otherwise be sequentially scanned whatever indexes exist
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+        for description, expected_index, statement in _hot_queries(school_id):
+            sql = str(statement.compile(dialect=connection.dialect, schema_translate_map=DEFAULT_SCHEMA_MAP,
+                                        render_schema_translate=True, compile_kwargs={'literal_binds': True}))
+            explain = "EXPLAIN " if is_postgres else "EXPLAIN QUERY PLAN "
+            rows = connection.execute(text(explain + sql)).fetchall()
+            plan = '\n'.join(str(row[-1]) for row in rows)
+            report.append((description, expected_index, expected_index in plan, plan))
+        connection.rollback()
+    return report
+
+
+def main():
+    from app import app
+
+    with app.app_context():
+        if '--check' in sys.argv:
+            report = check_index_usage()
+            for description, expected_index, used, plan in report:
+                print(f"{'✅' if used else '❌'} {description}: {expected_index}")
+                if not used:
+                    print(f"   plan: {plan}")
+            return all(used for _, _, used, _ in report)
+
+        results = create_indexes()
+        for schema, index_name, error in results:
+            location = schema or 'main'
+            if error:
+                print(f"❌ {location}.{index_name}: {error}")
+            else:
+                print(f"✅ {location}.{index_name}")
+        return all(error is None for _, _, error in results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,120 @@
+"""
+Keyset (seek) pagination for the tenant list pages.
+
+Pages are cut on a stable, unique sort key instead of OFFSET, so every page
+costs the same however deep the user goes and rows inserted meanwhile never
+shift a page. The cursor is the sort key of the last row shown, encoded as an
+opaque URL-safe token.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import BigInteger, case, cast, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Sort position of student IDs that are not plain numbers (after every number)
+NON_NUMERIC_STUDENT_ID = 10 ** 12
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError('unknown cursor value')
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Sort key values from a cursor token; None for a missing or malformed token."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list):
+            return None
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError):
+        return None
+
+
+def get_page_args(args):
+    """(cursor, page_size) from request.args ('cursor' and 'page_size')."""
+    try:
+        page_size = int(args.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    return args.get('cursor') or None, page_size
+
+
+def student_number(student_id_column):
+    """Numeric sort key for student IDs such as '0042'; other IDs sort last."""
+    from app import db
+
+    if db.engine.dialect.name == 'postgresql':
+        is_number = student_id_column.op('~')('^[0-9]{1,12}$')
+    else:
+        is_number = (student_id_column != '') & ~student_id_column.op('GLOB')('*[^0-9]*')
+    return case((is_number, cast(student_id_column, BigInteger)), else_=NON_NUMERIC_STUDENT_ID)
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the page after it."""
+
+    def __init__(self, items, next_cursor, page_size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+
+def paginate(query, sort_keys, cursor=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """Return the KeysetPage of query following cursor.
+
+    sort_keys must end in a unique column (usually the primary key) so the
+    order is total. All keys sort in the same direction.
+    """
+    sort_keys = list(sort_keys)
+    values = decode_cursor(cursor)
+    if values is not None and len(values) == len(sort_keys):
+        position = tuple_(*sort_keys)
+        after = tuple_(*values)
+        query = query.filter(position < after if descending else position > after)
+
+    ordering = [key.desc() if descending else key.asc() for key in sort_keys]
+    rows = (
+        query.order_by(None)
+        .add_columns(*[key.label(f'sort_key_{index}') for index, key in enumerate(sort_keys)])
+        .order_by(*ordering)
+        .limit(page_size + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(list(rows[-1][1:]))
+    return KeysetPage([row[0] for row in rows], next_cursor, page_size)
@@ -0,0 +1,124 @@
+"""
+Payment pattern histograms computed in the database.
+
+Payments are counted and summed per day of the week, per fee type and per
+amount range with three GROUP BY queries, so the work and the response size
+do not depend on how many years of payments a school has. Amount ranges
+come from CASE buckets over configurable edges.
+
+Results for the default edges are cached per school in this process (one
+entry each) and tagged with the school's data version, which write routes
+bump when payments are posted. Custom edges are computed on every request,
+so arbitrary ?edges= values cannot grow the cache.
+"""
+
+import threading
+
+from sqlalchemy import Integer, case, cast, extract, func, literal_column
+
+DAY_NAMES = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+DEFAULT_AMOUNT_EDGES = (1000, 5000, 10000, 20000)
+MAX_AMOUNT_EDGES = 20
+
+_lock = threading.Lock()
+_patterns = {}
+
+
+def parse_amount_edges(value):
+    """Amount range edges from '1000,5000,...'; raises ValueError unless they increase."""
+    if not value:
+        return DEFAULT_AMOUNT_EDGES
+    try:
+        edges = tuple(float(edge) for edge in value.split(','))
+    except ValueError:
+        raise ValueError('edges must be a comma-separated list of amounts')
+    if not 0 < len(edges) <= MAX_AMOUNT_EDGES or edges[0] <= 0 or any(
+            low >= high for low, high in zip(edges, edges[1:])):
+        raise ValueError(f'edges must be 1 to {MAX_AMOUNT_EDGES} increasing positive amounts')
+    return tuple(int(edge) if edge.is_integer() else edge for edge in edges)
+
+
+def amount_range_labels(edges):
+    """'0-1000', '1001-5000', ..., '20000+' for the given edges."""
+    labels, low = [], 0
+    for edge in edges:
+        labels.append(f'{low}-{edge}')
+        low = edge + 1 if isinstance(edge, int) else edge
+    labels.append(f'{edges[-1]}+')
+    return labels
+
+
+def day_of_week(column, dialect):
+    """0 (Sunday) to 6 (Saturday) for a date column."""
+    if dialect == 'postgresql':
+        return cast(extract('dow', column), Integer)
+    return cast(func.strftime(literal_column("'%w'"), column), Integer)
+
+
+def amount_range(amount, edges):
+    """Index of the edges range an amount falls in (len(edges) above the last edge)."""
+    return case(*((amount <= edge, index) for index, edge in enumerate(edges)), else_=len(edges))
+
+
+def compute_payment_patterns(income_query, edges=DEFAULT_AMOUNT_EDGES):
+    """Day-of-week, fee type and amount range histograms of an Income query."""
+    from app import Income
+
+    dialect = income_query.session.get_bind().dialect.name
+    count, amount = func.count(Income.id), func.coalesce(func.sum(Income.amount_paid), 0)
+
+    def histogram(key):
+        # GROUP BY the output name, so the CASE edge parameters appear only once
+        bucket = literal_column('bucket')
+        return income_query.with_entities(key.label('bucket'), count, amount).group_by(bucket).order_by(bucket)
+
+    day_patterns = {name: {'count': 0, 'amount': 0.0} for name in DAY_NAMES}
+    for day, day_count, day_amount in histogram(day_of_week(Income.payment_date, dialect)):
+        if day is not None:
+            day_patterns[DAY_NAMES[int(day)]] = {'count': day_count, 'amount': float(day_amount)}
+
+    fund_patterns = {fee_type or 'Unspecified': {'count': fee_count, 'amount': float(fee_amount)}
+                     for fee_type, fee_count, fee_amount in histogram(Income.fee_type)}
+
+    labels = amount_range_labels(edges)
+    payment_ranges = {label: {'count': 0, 'amount': 0.0} for label in labels}
+    for index, range_count, range_amount in histogram(amount_range(Income.amount_paid, edges)):
+        payment_ranges[labels[index]] = {'count': range_count, 'amount': float(range_amount)}
+
+    return {
+        'day_patterns': day_patterns,
+        'fund_patterns': fund_patterns,
+        'payment_ranges': payment_ranges,
+        'total_payments': sum(bucket['count'] for bucket in fund_patterns.values()),
+    }
+
+
+def get_payment_patterns(edges=DEFAULT_AMOUNT_EDGES):
+    """Payment patterns of the current school, recomputed only after its data changed.
+    Only the default edges are cached; the developer view across all schools is not cached.
+    """
+    from app import Income, get_current_school_id, get_school_data_version, get_school_filtered_query
+
+    school_id = get_current_school_id()
+    if not school_id or edges != DEFAULT_AMOUNT_EDGES:
+        return compute_payment_patterns(get_school_filtered_query(Income), edges)
+
+    version = get_school_data_version(school_id)
+    with _lock:
+        cached = _patterns.get(school_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    patterns = compute_payment_patterns(get_school_filtered_query(Income), edges)
+    with _lock:
+        _patterns[school_id] = (version, patterns)
+    return patterns
+
+
+def clear_payment_patterns(school_id=None):
+    """Drop this worker's cached patterns for one school (or all schools)."""
+    with _lock:
+        if school_id is None:
+            _patterns.clear()
+        else:
+            _patterns.pop(school_id, None)
@@ -1,12 +1,59 @@
-from app import db, Receipt
-
-def reassign_receipt_numbers():
-    # Get all receipts ordered by payment_date, then by id for tie-breaker
-    receipts = Receipt.query.order_by(Receipt.payment_date, Receipt.id).all()
-    for idx, receipt in enumerate(receipts, start=1):
-        receipt.receipt_no = f"{idx:04d}"
-    db.session.commit()
-    print(f"Reassigned receipt numbers for {len(receipts)} receipts.")
-
-if __name__ == "__main__":
-    reassign_receipt_numbers()
+"""
+Renumber receipts per school in payment order (payment_date, then id).
+
+Each school's receipts become 0001, 0002, ... in one set-based UPDATE, and
+the school's receipt sequence is reset so new receipts continue after them.
+
+Usage: python reassign_receipt_numbers.py [school_id ...]   (default: every school)
+"""
+
+import sys
+
+from sqlalchemy import String, case, cast, func, select, update
+
+from app import app, db, Receipt, SchoolSequence
+from school_sequences import RECEIPT
+
+
+def _receipt_number(position):
+    """position formatted like f"{n:04d}"."""
+    if db.engine.dialect.name == 'postgresql':
+        # lpad alone would truncate numbers above 9999
+        text = cast(position, String)
+        return case((position < 10000, func.lpad(text, 4, '0')), else_=text)
+    return func.printf('%04d', position)
+
+
+def reassign_receipt_numbers(school_ids=None):
+    receipts = Receipt.__table__
+    ranked = select(
+        receipts.c.id,
+        func.row_number().over(
+            partition_by=receipts.c.school_id,
+            order_by=(receipts.c.payment_date, receipts.c.id)
+        ).label('position')
+    )
+    if school_ids:
+        ranked = ranked.where(receipts.c.school_id.in_(school_ids))
+    ranked = ranked.subquery()
+
+    result = db.session.execute(
+        update(receipts)
+        .where(receipts.c.id == ranked.c.id)
+        .values(receipt_no=_receipt_number(ranked.c.position))
+    )
+
+    # The sequences reseed from the highest renumbered receipt on next use
+    sequences = db.session.query(SchoolSequence).filter(SchoolSequence.name == RECEIPT)
+    if school_ids:
+        sequences = sequences.filter(SchoolSequence.school_id.in_(school_ids))
+    sequences.delete(synchronize_session=False)
+
+    db.session.commit()
+    print(f"Reassigned receipt numbers for {result.rowcount} receipts.")
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        reassign_receipt_numbers([int(arg) for arg in sys.argv[1:]] or None)
@@ -0,0 +1,131 @@
+"""
+Per-school number sequences for receipts, professional receipts and student IDs.
+
+Each (school_id, name) row of school_sequence holds the last number handed
+out. Numbers are taken with a single UPDATE ... RETURNING, so two workers can
+never read the same value: PostgreSQL locks the row and SQLite takes its write
+lock before reading. Bulk imports reserve a whole block in a short
+transaction of their own (BEGIN IMMEDIATE on SQLite).
+
+A sequence is seeded from the highest number already in use the first time a
+school needs it.
+"""
+
+from sqlalchemy import case, select, update
+
+RECEIPT = 'receipt'
+PROFESSIONAL_RECEIPT = 'professional_receipt'
+STUDENT_ID = 'student_id'
+# Not a number series: counts changes to a school's student list (see student_autocomplete.py)
+STUDENT_ROSTER = 'student_roster'
+
+
+def _numbered_column(name):
+    from app import Receipt, ProfessionalReceipt, Student
+    return {
+        RECEIPT: Receipt.receipt_no,
+        PROFESSIONAL_RECEIPT: ProfessionalReceipt.receipt_no,
+        STUDENT_ID: Student.student_id,
+    }.get(name)
+
+
+def _highest_in_use(bind, school_id, name):
+    """Highest numeric value already stored for the school (0 when none)."""
+    column = _numbered_column(name)
+    if column is None:
+        return 0
+    numbers = [int(value) for (value,) in bind.execute(
+        select(column).where(column.class_.school_id == school_id)
+    ) if value and value.isdigit()]
+    return max(numbers, default=0)
+
+
+def _seed(bind, school_id, name):
+    """Create the sequence row if missing; concurrent seeders leave exactly one row."""
+    from app import db, SchoolSequence
+
+    start = _highest_in_use(bind, school_id, name)
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        bind.execute(
+            insert(SchoolSequence.__table__)
+            .values(school_id=school_id, name=name, value=start)
+            .on_conflict_do_nothing(index_elements=['school_id', 'name'])
+        )
+    elif bind.execute(select(SchoolSequence.value).filter_by(school_id=school_id, name=name)).first() is None:
+        bind.execute(SchoolSequence.__table__.insert().values(school_id=school_id, name=name, value=start))
+
+
+def _update_returning(bind, school_id, name, new_value):
+    """Apply new_value (an expression of the current value) and return the result, or None."""
+    from app import db, SchoolSequence
+
+    table = SchoolSequence.__table__
+    statement = (
+        update(table)
+        .where(table.c.school_id == school_id, table.c.name == name)
+        .values(value=new_value(table.c.value))
+    )
+    if db.engine.dialect.update_returning:
+        row = bind.execute(statement.returning(table.c.value)).first()
+        return row[0] if row else None
+    # No RETURNING (SQLite < 3.35): the UPDATE already holds the write lock for this transaction
+    if not bind.execute(statement).rowcount:
+        return None
+    return bind.execute(select(table.c.value).where(table.c.school_id == school_id, table.c.name == name)).scalar()
+
+
+def next_sequence_value(school_id, name, count=1, bind=None):
+    """Take count consecutive numbers inside the current transaction and return the first.
+    Numbers are only consumed if the transaction commits.
+    """
+    from app import db
+
+    bind = bind if bind is not None else db.session
+    last = _update_returning(bind, school_id, name, lambda value: value + count)
+    if last is None:
+        _seed(bind, school_id, name)
+        last = _update_returning(bind, school_id, name, lambda value: value + count)
+    return last - count + 1
+
+
+def peek_sequence_value(school_id, name):
+    """Next number the sequence would hand out, without taking it (read only)."""
+    from app import db, SchoolSequence
+
+    value = db.session.query(SchoolSequence.value).filter_by(school_id=school_id, name=name).scalar()
+    if value is None:
+        value = _highest_in_use(db.session, school_id, name)
+    return value + 1
+
+
+def advance_sequence(school_id, name, number, bind=None):
+    """Make sure number is never handed out again, e.g. after a manually entered student ID."""
+    from app import db
+
+    bind = bind if bind is not None else db.session
+    advance = lambda value: case((value < number, number), else_=value)
+    if _update_returning(bind, school_id, name, advance) is None:
+        _seed(bind, school_id, name)
+        _update_returning(bind, school_id, name, advance)
+
+
+def reserve_sequence_block(school_id, name, count):
+    """Reserve count numbers for a bulk import in a transaction of their own.
+    Returns a range of the reserved numbers. The reservation is committed at
+    once, so call this before writing through the session (SQLite allows a
+    single writer) and accept gaps if the import later fails.
+    """
+    from app import db
+
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Take the write lock up front instead of upgrading from a read lock
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        first = next_sequence_value(school_id, name, count, bind=connection)
+        connection.commit()
+    return range(first, first + count)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Outbox for parent SMS confirmations.
+
+Bulk payment posting queues one sms_outbox row per payment in the same
+transaction as the ledger rows, so a payment is never confirmed unless it
+was saved and a slow SMS gateway never holds up the posting. Queued messages
+are sent by send_queued_sms(): from one long-lived sender thread per process
+(woken after a bulk post, and every SENDER_POLL_SECONDS), or from cron with
+this script.
+
+Several senders may run at once (gunicorn workers, cron). Each message is
+claimed before it is sent: status goes from 'queued' to 'sending' in its own
+committed UPDATE, which only one sender can win (FOR UPDATE SKIP LOCKED on
+PostgreSQL, a conditional UPDATE on SQLite). The result is committed as soon
+as the message is sent, so a crash never resends the messages before it; the
+message in flight stays 'sending' for inspection.
+
+Usage: python sms_outbox.py [limit]
+"""
+
+import json
+import sys
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+SEND_BATCH_SIZE = 100
+MAX_ATTEMPTS = 3
+SENDER_POLL_SECONDS = 60
+
+_sender_lock = threading.Lock()
+_sender = None
+_wakeup = threading.Event()
+
+
+def queue_payment_confirmations(school_id, confirmations):
+    """Queue confirmations inside the current transaction with one executemany INSERT.
+    confirmations: (student_db_id, phone, payment_details) tuples.
+    """
+    from app import db, SmsOutbox
+
+    rows = [
+        {'school_id': school_id, 'student_db_id': student_db_id, 'phone': phone,
+         'message_type': 'payment_confirmation', 'payload': json.dumps(details), 'status': 'queued'}
+        for student_db_id, phone, details in confirmations if phone
+    ]
+    if rows:
+        db.session.execute(SmsOutbox.__table__.insert(), rows)
+    return len(rows)
+
+
+def claim_next_message(after_id=0):
+    """Mark the oldest queued message with an id above after_id as 'sending' and commit.
+    Returns its id, or None when there is nothing left to claim.
+    """
+    from app import db, SmsOutbox
+
+    queued = select(SmsOutbox.id).where(SmsOutbox.status == 'queued', SmsOutbox.id > after_id).order_by(SmsOutbox.id)
+    claim = update(SmsOutbox).values(status='sending', attempts=SmsOutbox.attempts + 1)
+    if db.engine.dialect.name == 'postgresql':
+        candidate = queued.limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        message_id = db.session.execute(claim.where(SmsOutbox.id == candidate).returning(SmsOutbox.id)).scalar()
+        db.session.commit()
+        return message_id
+
+    while True:
+        message_id = db.session.execute(queued.limit(1)).scalar()
+        if message_id is None:
+            db.session.rollback()
+            return None
+        won = db.session.execute(
+            claim.where(SmsOutbox.id == message_id, SmsOutbox.status == 'queued')
+        ).rowcount
+        db.session.commit()
+        if won:
+            return message_id
+        # Another sender claimed it first; try the next one
+
+
+def send_queued_sms(limit=SEND_BATCH_SIZE):
+    """Send up to limit queued messages; returns (sent, failed).
+    A failed message is queued again for a later pass; after MAX_ATTEMPTS it is
+    marked failed and left for inspection. Must run inside an application context.
+    """
+    from app import db, SmsOutbox, Student, sms_service
+
+    if sms_service is None:
+        return 0, 0
+
+    sent = failed = 0
+    message_id = 0
+    while sent + failed < limit:
+        message_id = claim_next_message(after_id=message_id)
+        if message_id is None:
+            break
+        message = db.session.get(SmsOutbox, message_id)
+        try:
+            student = db.session.get(Student, message.student_db_id)
+            if student is None:
+                raise LookupError('student no longer exists')
+            outcome = sms_service.send_payment_confirmation(student, message.phone, json.loads(message.payload))
+            if not outcome.get('success'):
+                raise RuntimeError(outcome.get('message') or 'SMS gateway refused the message')
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            sent += 1
+        except Exception as e:
+            message.last_error = str(e)
+            message.status = 'failed' if message.attempts >= MAX_ATTEMPTS else 'queued'
+            failed += 1
+        db.session.commit()
+    return sent, failed
+
+
+def wake_sms_sender(app):
+    """Have this process's sender thread drain the outbox now, starting it on first use.
+    The request returns at once; one thread per process does all the sending.
+    """
+    global _sender
+
+    with _sender_lock:
+        if _sender is None or not _sender.is_alive():
+            _sender = threading.Thread(target=_run_sender, args=(app,), name='sms-sender', daemon=True)
+            _sender.start()
+    _wakeup.set()
+
+
+def _run_sender(app):
+    while True:
+        _wakeup.wait(SENDER_POLL_SECONDS)
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                # Stop as soon as a pass sends nothing; failures wait for the next pass
+                while send_queued_sms()[0]:
+                    pass
+            except Exception as e:
+                print(f"Error sending queued SMS: {e}")
+
+
+def main():
+    from app import app
+
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else SEND_BATCH_SIZE
+    with app.app_context():
+        sent, failed = send_queued_sms(limit)
+    print(f"✅ {sent} SMS sent")
+    if failed:
+        print(f"❌ {failed} SMS failed (will be retried up to {MAX_ATTEMPTS} times)")
+    return not failed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
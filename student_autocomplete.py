@@ -0,0 +1,230 @@
+"""
+In-memory per-school prefix index behind /api/students/autocomplete.
+
+Each school's index is a sorted list of (key, student pk) pairs, where the
+keys are the lower-cased words of the student's name and the student ID, so
+a bisect finds every student with a word starting with the typed prefix.
+
+The index follows student changes incrementally: ORM flushes that add, edit
+or delete students bump the school's STUDENT_ROSTER counter in the same
+transaction, and once the transaction commits the changes are applied to a
+copy of this process's index, which then replaces it: a published index is
+never changed, so lookups read it without the lock. Another worker's change shows up as a counter this index has
+not seen, and the index is rebuilt from one narrow query on the next lookup.
+Writes that bypass the ORM (bulk inserts) must call mark_roster_changed().
+"""
+
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import and_, event, inspect
+from sqlalchemy.orm import Session
+
+from school_sequences import STUDENT_ROSTER, next_sequence_value
+from student_search import search_terms
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+_SEARCHED_ATTRIBUTES = ('student_id', 'name', 'form_class', 'school_id')
+_PENDING_KEY = 'student_roster_changes'
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+class StudentPrefixIndex:
+    """Sorted prefix index of one school's students."""
+
+    def __init__(self, token, students=()):
+        self.token = token
+        self._keys = []
+        self._entries = {}
+        for student in students:
+            self._entries[student['id']] = student
+            self._keys.extend((key, student['id']) for key in self._student_keys(student))
+        self._keys.sort()
+
+    @staticmethod
+    def _student_keys(student):
+        return set(search_terms(student['name'])) | set(search_terms(student['student_id']))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def copy(self, token):
+        """A new index with the same students and the given token."""
+        index = StudentPrefixIndex(token)
+        index._keys = list(self._keys)
+        index._entries = dict(self._entries)
+        return index
+
+    def put(self, student):
+        self.remove(student['id'])
+        self._entries[student['id']] = student
+        for key in self._student_keys(student):
+            entry = (key, student['id'])
+            self._keys.insert(bisect_left(self._keys, entry), entry)
+
+    def remove(self, student_pk):
+        student = self._entries.pop(student_pk, None)
+        if student is None:
+            return
+        for key in self._student_keys(student):
+            position = bisect_left(self._keys, (key, student_pk))
+            if position < len(self._keys) and self._keys[position] == (key, student_pk):
+                del self._keys[position]
+
+    def _prefixed(self, prefix):
+        """Pks of students with a key starting with prefix."""
+        found = set()
+        position = bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and self._keys[position][0].startswith(prefix):
+            found.add(self._keys[position][1])
+            position += 1
+        return found
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """Students matching every word of text as a prefix, best first.
+        Exact student IDs come first, then names starting with the first word,
+        then the rest, each alphabetically by name.
+        """
+        terms = search_terms(text)
+        if not terms:
+            return []
+        matches = None
+        for term in terms:
+            found = self._prefixed(term)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        def rank(student_pk):
+            student = self._entries[student_pk]
+            name = student['name'].lower()
+            return (
+                student['student_id'].lower() != terms[0],
+                not name.startswith(terms[0]),
+                name,
+                student_pk,
+            )
+        return [self._entries[pk] for pk in sorted(matches, key=rank)[:limit]]
+
+
+def _student_entry(student):
+    from app import decrypt_student_data
+
+    decrypted_data = decrypt_student_data(student)
+    return {
+        'id': student.id,
+        'student_id': decrypted_data['student_id'] or '',
+        'name': decrypted_data['name'] or '',
+        'form_class': decrypted_data['form_class'] or '',
+    }
+
+
+def get_roster_token(school_id):
+    """(school created_at, roster counter) of a school from one lookup; None if the school is gone."""
+    from app import db, SchoolConfiguration, SchoolSequence
+
+    row = db.session.query(SchoolConfiguration.created_at, SchoolSequence.value).outerjoin(
+        SchoolSequence, and_(SchoolSequence.school_id == SchoolConfiguration.id,
+                             SchoolSequence.name == STUDENT_ROSTER)
+    ).filter(SchoolConfiguration.id == school_id).first()
+    if row is None:
+        return None
+    return (row.created_at, row.value or 0)
+
+
+def get_student_index(school_id):
+    """The school's prefix index, rebuilt if students changed in another process."""
+    from app import Student
+
+    token = get_roster_token(school_id)
+    with _lock:
+        index = _indexes.get(school_id)
+        if index is not None and index.token == token:
+            return index
+
+    # Read after the token: a change committed in between only causes another rebuild
+    students = Student.query.filter_by(school_id=school_id).all()
+    index = StudentPrefixIndex(token, [_student_entry(student) for student in students])
+    with _lock:
+        _indexes[school_id] = index
+    return index
+
+
+def get_limit_arg(args):
+    """Number of suggestions requested with ?limit=, clamped to 1..MAX_LIMIT."""
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        limit = DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def clear_student_indexes():
+    with _lock:
+        _indexes.clear()
+
+
+def mark_roster_changed(school_id, bind=None):
+    """Record a student change made outside the ORM; other indexes rebuild on their next lookup."""
+    return next_sequence_value(school_id, STUDENT_ROSTER, bind=bind)
+
+
+def _record_flush(session, flush_context):
+    from app import Student
+
+    changes = {}
+    for student in session.new:
+        if isinstance(student, Student):
+            changes.setdefault(student.school_id, []).append((student.id, _student_entry(student)))
+    for student in session.dirty:
+        if isinstance(student, Student) and any(
+            inspect(student).attrs[name].history.has_changes() for name in _SEARCHED_ATTRIBUTES
+        ):
+            changes.setdefault(student.school_id, []).append((student.id, _student_entry(student)))
+    for student in session.deleted:
+        if isinstance(student, Student):
+            changes.setdefault(student.school_id, []).append((student.id, None))
+    if not changes:
+        return
+
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for school_id, school_changes in changes.items():
+        value = mark_roster_changed(school_id, bind=session.connection())
+        entry = pending.setdefault(school_id, {'first': value, 'changes': []})
+        entry['last'] = value
+        entry['changes'].extend(school_changes)
+
+
+def _apply_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    with _lock:
+        for school_id, entry in pending.items():
+            index = _indexes.get(school_id)
+            if index is None:
+                continue
+            if index.token is None or index.token[1] != entry['first'] - 1:
+                # Missed another process's change: rebuild on next lookup
+                del _indexes[school_id]
+                continue
+            index = index.copy((index.token[0], entry['last']))
+            for student_pk, student in entry['changes']:
+                if student is None:
+                    index.remove(student_pk)
+                else:
+                    index.put(student)
+            _indexes[school_id] = index
+
+
+def _discard_pending(session, *args):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(Session, 'after_flush', _record_flush)
+event.listen(Session, 'after_commit', _apply_commit)
+event.listen(Session, 'after_rollback', _discard_pending)
@@ -0,0 +1,136 @@
+"""
+SQL-side fee balance computation for student listings.
+
+Student.get_*_balance() and is_paid_in_full() work one ORM object at a time.
+StudentBalanceQuery expresses the same rules as SQL so listings, counts and
+filters run inside the database (SQLite and PostgreSQL alike).
+"""
+
+from sqlalchemy import case, func, literal_column
+from sqlalchemy.orm import aliased
+
+PAYMENT_STATUSES = ('paid', 'outstanding', 'no_payment')
+
+BALANCE_COLUMNS = (
+    'pta_required', 'sdf_required', 'boarding_required',
+    'pta_balance', 'sdf_balance', 'boarding_balance',
+    'total_paid', 'total_balance', 'payment_status',
+)
+
+
+def _required(student_required, config_amount, default_amount):
+    """Per-student amount when positive, else the active config amount, else the default."""
+    return case(
+        (func.coalesce(student_required, 0) > 0, student_required),
+        else_=func.coalesce(config_amount, default_amount),
+    )
+
+
+def _balance(required, paid):
+    """max(0, required - paid), as the Python balance methods compute it."""
+    remaining = required - func.coalesce(paid, 0)
+    return case((remaining > 0, remaining), else_=0)
+
+
+class StudentBalanceQuery:
+    """Student query with effective required amounts, balances and payment status.
+
+    The payment status is 'paid' when every balance is zero, 'no_payment' when
+    nothing has been paid yet and 'outstanding' otherwise.
+    """
+
+    def __init__(self, base_query=None):
+        from app import db, Student, FundConfiguration, get_school_filtered_query
+        from app import DEFAULT_PTA_AMOUNT, DEFAULT_SDF_AMOUNT, DEFAULT_BOARDING_AMOUNT
+
+        if base_query is None:
+            base_query = get_school_filtered_query(Student)
+
+        # One active configuration per school (lowest id, like an unordered .first())
+        active = (
+            db.session.query(
+                FundConfiguration.school_id.label('school_id'),
+                func.min(FundConfiguration.id).label('config_id'),
+            )
+            .filter(FundConfiguration.is_active == True)
+            .group_by(FundConfiguration.school_id)
+            .subquery('active_fund_config')
+        )
+        config = aliased(FundConfiguration, name='active_config')
+
+        self.db = db
+        self.Student = Student
+        self.query = (
+            base_query
+            .outerjoin(active, active.c.school_id == Student.school_id)
+            .outerjoin(config, config.id == active.c.config_id)
+        )
+
+        self.pta_required = _required(Student.pta_required, config.pta_amount, DEFAULT_PTA_AMOUNT)
+        self.sdf_required = _required(Student.sdf_required, config.sdf_amount, DEFAULT_SDF_AMOUNT)
+        self.boarding_required = _required(Student.boarding_required, config.boarding_amount, DEFAULT_BOARDING_AMOUNT)
+
+        self.pta_balance = _balance(self.pta_required, Student.pta_amount_paid)
+        self.sdf_balance = _balance(self.sdf_required, Student.sdf_amount_paid)
+        self.boarding_balance = _balance(self.boarding_required, Student.boarding_amount_paid)
+
+        self.total_paid = (
+            func.coalesce(Student.pta_amount_paid, 0)
+            + func.coalesce(Student.sdf_amount_paid, 0)
+            + func.coalesce(Student.boarding_amount_paid, 0)
+        )
+        self.total_balance = self.pta_balance + self.sdf_balance + self.boarding_balance
+        # Inline literals keep the expression identical wherever it is rendered
+        self.payment_status = case(
+            (self.total_balance == 0, literal_column("'paid'")),
+            (self.total_paid == 0, literal_column("'no_payment'")),
+            else_=literal_column("'outstanding'"),
+        )
+
+    def _labelled_columns(self):
+        return [getattr(self, name).label(name) for name in BALANCE_COLUMNS]
+
+    def where_status(self, *statuses):
+        """Keep students whose payment status is one of statuses."""
+        self.query = self.query.filter(self.payment_status.in_([s for s in statuses if s in PAYMENT_STATUSES]))
+        return self
+
+    def where_not_paid(self):
+        """Keep students with any outstanding balance."""
+        self.query = self.query.filter(self.total_balance > 0)
+        return self
+
+    def where_no_payments(self):
+        """Keep students who have not paid anything towards any fee."""
+        self.query = self.query.filter(self.total_paid == 0)
+        return self
+
+    def where_has_payments(self):
+        """Keep students who have paid something towards any fee."""
+        self.query = self.query.filter(self.total_paid > 0)
+        return self
+
+    def where_has_phone(self):
+        """Keep students with a parent phone number on record."""
+        Student = self.Student
+        self.query = self.query.filter(Student.parent_phone.isnot(None), Student.parent_phone != '')
+        return self
+
+    def rows(self):
+        """Query yielding (Student, pta_required, ..., payment_status) rows."""
+        return self.query.add_columns(*self._labelled_columns())
+
+    def columns(self, *entities):
+        """Column-only query: the given Student columns followed by the balance columns."""
+        return self.query.with_entities(*entities, *self._labelled_columns())
+
+    def count_by_status(self):
+        """Return {'paid': n, 'outstanding': n, 'no_payment': n} from a single GROUP BY."""
+        statuses = self.query.with_entities(self.payment_status.label('payment_status')).subquery()
+        counts = dict.fromkeys(PAYMENT_STATUSES, 0)
+        for status, count in (
+            self.db.session.query(statuses.c.payment_status, func.count())
+            .group_by(statuses.c.payment_status)
+        ):
+            counts[status] = count
+        return counts
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Bulk import of students from CSV.
+
+The file is read row by row and handled in batches: each batch is validated,
+checked for student IDs already in use with one IN query, given numbers for
+rows without an ID from one sequence block, and written with a single
+executemany INSERT in its own transaction. Rows that fail validation are
+skipped and reported with their line number; the rest are imported. A
+database error stops the import, leaving earlier batches in place.
+
+Recognised columns (header names are case-insensitive):
+    student_id (or id, student_number)   optional, numbered 0001, 0002, ... when blank
+    name (or student_name, full_name)    required
+    sex (or gender)                      M/F, Male/Female, Boy/Girl
+    form_class (or class, form)          "1", "F1", "form 1" become "Form 1"
+    parent_phone (or phone)              optional, stored as +265XXXXXXXXX
+
+Usage: python student_import.py <school_id> <file.csv> [--dry-run] [--report errors.csv]
+"""
+
+import csv
+import re
+import sys
+
+IMPORT_BATCH_SIZE = 500
+
+COLUMN_ALIASES = {
+    'student_id': 'student_id', 'id': 'student_id', 'student_number': 'student_id', 'student_no': 'student_id',
+    'name': 'name', 'student_name': 'name', 'full_name': 'name',
+    'sex': 'sex', 'gender': 'sex',
+    'form_class': 'form_class', 'class': 'form_class', 'form': 'form_class',
+    'parent_phone': 'parent_phone', 'phone': 'parent_phone', 'parent_phone_number': 'parent_phone',
+}
+
+SEX_VALUES = {
+    'm': 'Male', 'male': 'Male', 'boy': 'Male', 'b': 'Male',
+    'f': 'Female', 'female': 'Female', 'girl': 'Female', 'g': 'Female',
+}
+
+COUNTRY_CODE = '265'
+
+_FORM_CLASS = re.compile(r'^(?:form|f)?\s*([1-6])\s*([a-z])?$', re.IGNORECASE)
+
+
+class StudentImportResult:
+    """Outcome of an import: counts, assigned IDs and the per-row error report."""
+
+    def __init__(self):
+        self.imported = 0
+        self.student_ids = []
+        self.errors = []
+
+    def add_error(self, line, row, message):
+        self.errors.append({'line': line, 'student_id': row.get('student_id', ''),
+                            'name': row.get('name', ''), 'error': message})
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def write_error_report(self, stream):
+        writer = csv.DictWriter(stream, fieldnames=['line', 'student_id', 'name', 'error'])
+        writer.writeheader()
+        writer.writerows(self.errors)
+
+
+def normalise_sex(value):
+    return SEX_VALUES.get((value or '').strip().lower())
+
+
+def normalise_form_class(value):
+    value = ' '.join((value or '').split())
+    match = _FORM_CLASS.match(value)
+    if match:
+        return f"Form {match.group(1)}{(match.group(2) or '').upper()}"
+    return value or None
+
+
+def normalise_phone(value):
+    """Phone number as +265XXXXXXXXX; '' for no number, None if it is not a valid number."""
+    digits = re.sub(r'[\s\-().]', '', value or '')
+    if not digits:
+        return ''
+    if digits.startswith('+'):
+        digits = digits[1:]
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0') and len(digits) == 10:
+        digits = COUNTRY_CODE + digits[1:]
+    elif len(digits) == 9:
+        digits = COUNTRY_CODE + digits
+    if not digits.isdigit() or not 10 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def read_student_rows(stream):
+    """Yield (line number, row) with rows keyed by the canonical column names."""
+    reader = csv.DictReader(stream)
+    columns = {name: COLUMN_ALIASES.get((name or '').strip().lower().replace(' ', '_'))
+               for name in reader.fieldnames or []}
+    for row in reader:
+        values = {}
+        for name, value in row.items():
+            if columns.get(name) and columns[name] not in values:
+                values[columns[name]] = (value or '').strip()
+        if any(values.values()):
+            yield reader.line_num, values
+
+
+def validate_row(row):
+    """Return (values for the student table, None) or (None, error message)."""
+    name = ' '.join(row.get('name', '').split())
+    if not name:
+        return None, 'Name is required'
+    if len(name) > 200:
+        return None, 'Name is longer than 200 characters'
+    student_id = row.get('student_id', '')
+    if len(student_id) > 50:
+        return None, 'Student ID is longer than 50 characters'
+    sex = normalise_sex(row.get('sex'))
+    if sex is None:
+        return None, f"Sex must be Male or Female, got {row.get('sex', '')!r}"
+    form_class = normalise_form_class(row.get('form_class'))
+    if form_class is None:
+        return None, 'Class is required'
+    if len(form_class) > 50:
+        return None, 'Class is longer than 50 characters'
+    parent_phone = normalise_phone(row.get('parent_phone'))
+    if parent_phone is None:
+        return None, f"Invalid phone number {row.get('parent_phone')!r}"
+    return {'student_id': student_id, 'name': name, 'sex': sex, 'form_class': form_class,
+            'parent_phone': parent_phone or None}, None
+
+
+def _import_batch(school_id, batch, result, seen_ids, dry_run):
+    """Check a batch of (line, row, values) against existing IDs and insert it in one transaction."""
+    from app import db, Student, mark_school_data_changed
+    from school_sequences import STUDENT_ID, next_sequence_value, advance_sequence
+    from student_autocomplete import mark_roster_changed
+
+    given_ids = [values['student_id'] for _, _, values in batch if values['student_id']]
+    existing = set()
+    if given_ids:
+        existing = {student_id for (student_id,) in db.session.query(Student.student_id).filter(
+            Student.school_id == school_id, Student.student_id.in_(given_ids)
+        )}
+
+    accepted = []
+    for line, row, values in batch:
+        student_id = values['student_id']
+        if student_id and student_id in seen_ids:
+            result.add_error(line, row, f'Student ID {student_id} appears more than once in the file')
+        elif student_id and student_id in existing:
+            result.add_error(line, row, f'Student ID {student_id} already exists')
+        else:
+            if student_id:
+                seen_ids.add(student_id)
+            accepted.append(values)
+    if not accepted or dry_run:
+        result.imported += len(accepted)
+        return
+
+    try:
+        # Keep the sequence ahead of numeric IDs in the file, then number the blank rows
+        numbers = [int(values['student_id']) for values in accepted if values['student_id'].isdigit()]
+        if numbers:
+            advance_sequence(school_id, STUDENT_ID, max(numbers))
+        blank = [values for values in accepted if not values['student_id']]
+        if blank:
+            first = next_sequence_value(school_id, STUDENT_ID, len(blank))
+            for number, values in enumerate(blank, start=first):
+                values['student_id'] = f'{number:04d}'
+
+        db.session.execute(Student.__table__.insert(), [dict(values, school_id=school_id) for values in accepted])
+        mark_roster_changed(school_id)
+        mark_school_data_changed(school_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    result.imported += len(accepted)
+    result.student_ids.extend(values['student_id'] for values in accepted)
+
+
+def import_students(school_id, stream, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Import students from a CSV text stream into a school.
+    With dry_run=True rows are only validated and checked for duplicates.
+    Must run inside an application context.
+    """
+    result = StudentImportResult()
+    seen_ids = set()
+    batch = []
+    for line, row in read_student_rows(stream):
+        values, error = validate_row(row)
+        if error:
+            result.add_error(line, row, error)
+            continue
+        batch.append((line, row, values))
+        if len(batch) >= batch_size:
+            _import_batch(school_id, batch, result, seen_ids, dry_run)
+            batch = []
+    if batch:
+        _import_batch(school_id, batch, result, seen_ids, dry_run)
+    result.errors.sort(key=lambda error: error['line'])
+    return result
+
+
+def import_students_file(school_id, path, **kwargs):
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return import_students(school_id, stream, **kwargs)
+
+
+def main():
+    from app import app
+
+    argv = sys.argv[1:]
+    report_path = None
+    if '--report' in argv:
+        position = argv.index('--report')
+        report_path = argv[position + 1] if position + 1 < len(argv) else None
+        del argv[position:position + 2]
+    dry_run = '--dry-run' in argv
+    args = [arg for arg in argv if not arg.startswith('--')]
+    if len(args) != 2:
+        print(__doc__)
+        return False
+    school_id, path = int(args[0]), args[1]
+
+    with app.app_context():
+        result = import_students_file(school_id, path, dry_run=dry_run)
+
+    print(f"✅ {'Would import' if dry_run else 'Imported'} {result.imported} students into school {school_id}")
+    if result.errors:
+        print(f"❌ {result.failed} rows skipped")
+        if report_path:
+            with open(report_path, 'w', newline='') as report:
+                result.write_error_report(report)
+            print(f"   error report written to {report_path}")
+        else:
+            for error in result.errors:
+                print(f"   line {error['line']}: {error['error']}")
+    return not result.errors
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
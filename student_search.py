@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Database-side student search by name, student ID and class.
+
+- SQLite: an FTS5 table (student_fts) indexes the student table as external
+  content and is kept in sync by triggers. Every search word matches as a
+  word prefix ("jo" finds "John Okello"); results rank by bm25 with name
+  matches weighted highest. school_id is indexed too, so a school's search
+  never ranks other schools' students.
+- PostgreSQL: trigram (pg_trgm) GIN indexes on the lowered columns in public
+  and every school_N tenant schema. Every search word matches as a substring;
+  results rank by trigram similarity of the name.
+- Without either index the same filters run as plain LIKE scans.
+
+install_student_search() is idempotent. It runs on startup for SQLite; on
+PostgreSQL run this script once as a migration.
+
+Usage: python student_search.py [--rebuild]
+"""
+
+import re
+import sys
+
+from sqlalchemy import case, func, literal_column, or_, select, text
+from sqlalchemy.sql import table, column
+
+SEARCH_COLUMNS = ('name', 'student_id', 'form_class')
+
+FTS_TABLE = 'student_fts'
+
+_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "name, student_id, form_class, school_id, content='student', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')"
+)
+
+_FTS_TRIGGERS = {
+    'student_fts_insert': (
+        f"CREATE TRIGGER IF NOT EXISTS student_fts_insert AFTER INSERT ON student BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, student_id, form_class, school_id) "
+        f"VALUES (new.id, new.name, new.student_id, new.form_class, new.school_id); END"
+    ),
+    'student_fts_delete': (
+        f"CREATE TRIGGER IF NOT EXISTS student_fts_delete AFTER DELETE ON student BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, student_id, form_class, school_id) "
+        f"VALUES ('delete', old.id, old.name, old.student_id, old.form_class, old.school_id); END"
+    ),
+    'student_fts_update': (
+        f"CREATE TRIGGER IF NOT EXISTS student_fts_update AFTER UPDATE OF name, student_id, form_class, school_id "
+        f"ON student BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, student_id, form_class, school_id) "
+        f"VALUES ('delete', old.id, old.name, old.student_id, old.form_class, old.school_id); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, student_id, form_class, school_id) "
+        f"VALUES (new.id, new.name, new.student_id, new.form_class, new.school_id); END"
+    ),
+}
+
+# Trigram indexes on PostgreSQL (form_class is left to the school_id filter)
+TRIGRAM_COLUMNS = ('name', 'student_id')
+
+# Search backend per database URL: 'fts5', 'trigram' or 'like'
+_backends = {}
+
+_fts = table(FTS_TABLE, column('rowid'))
+
+# bm25 column weights: name matches outrank student ID matches, which outrank class matches
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 0.0)
+
+
+def search_terms(query_text):
+    """Lower-cased words of a search box entry."""
+    return re.findall(r'\w+', (query_text or '').lower())
+
+
+def fts_match_expression(terms, columns=SEARCH_COLUMNS, school_id=None):
+    """FTS5 query requiring every term as a word prefix in one of columns."""
+    column_filter = '{' + ' '.join(columns) + '}'
+    conditions = [f'{column_filter} : "{term}"*' for term in terms]
+    if school_id is not None:
+        conditions.insert(0, f'school_id : "{int(school_id)}"')
+    return ' AND '.join(conditions)
+
+
+def _session_school_id():
+    """School whose students the current request may see; None for developers and outside requests."""
+    from flask import has_request_context, session
+
+    if not has_request_context() or session.get('user_role') == 'developer':
+        return None
+    return session.get('school_id')
+
+
+def search_backend():
+    """How the current database searches students ('fts5', 'trigram' or 'like')."""
+    from app import db
+
+    key = str(db.engine.url)
+    if key not in _backends:
+        with db.engine.connect() as connection:
+            if connection.dialect.name == 'sqlite':
+                installed = connection.execute(text(
+                    "SELECT count(*) FROM sqlite_master WHERE name = :name"
+                ), {'name': FTS_TABLE}).scalar()
+                _backends[key] = 'fts5' if installed else 'like'
+            elif connection.dialect.name == 'postgresql':
+                installed = connection.execute(text(
+                    "SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'"
+                )).scalar()
+                _backends[key] = 'trigram' if installed else 'like'
+            else:
+                _backends[key] = 'like'
+    return _backends[key]
+
+
+def match_students(query, query_text, columns=SEARCH_COLUMNS, ranked=False, school_id=None):
+    """Restrict a Student query to students matching every word of query_text.
+
+    With ranked=True the best matches come first (then by name); otherwise the
+    query's own ordering is left alone so it can still be paginated. The query
+    keeps its own tenant filter; school_id (default: the session's school)
+    only narrows the index lookup.
+    """
+    from app import Student
+
+    terms = search_terms(query_text)
+    if not terms:
+        return query
+
+    backend = search_backend()
+    if backend == 'fts5':
+        matches = (
+            select(_fts.c.rowid, func.bm25(literal_column(FTS_TABLE), *BM25_WEIGHTS).label('rank'))
+            .where(literal_column(FTS_TABLE).op('MATCH')(
+                fts_match_expression(terms, columns, school_id if school_id is not None else _session_school_id())
+            ))
+        )
+        if not ranked:
+            return query.filter(Student.id.in_(matches.with_only_columns(_fts.c.rowid)))
+        matches = matches.subquery('student_match')
+        return query.join(matches, matches.c.rowid == Student.id).order_by(
+            matches.c.rank, Student.name, Student.id
+        )
+
+    student_columns = [getattr(Student, name) for name in columns]
+    for term in terms:
+        query = query.filter(or_(*[
+            func.lower(student_column).contains(term, autoescape=True) for student_column in student_columns
+        ]))
+    if not ranked:
+        return query
+    if backend == 'trigram':
+        best_first = func.similarity(func.lower(Student.name), ' '.join(terms)).desc()
+    else:
+        # Names starting with the first word before other matches
+        best_first = case((func.lower(Student.name).startswith(terms[0], autoescape=True), 0), else_=1)
+    return query.order_by(best_first, Student.name, Student.id)
+
+
+def _install_sqlite(connection, rebuild):
+    existing = dict(connection.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')"
+    )).fetchall())
+    if FTS_TABLE in existing and existing[FTS_TABLE] != _FTS_DDL:
+        # Index built with an older definition: recreate it
+        for name in _FTS_TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        connection.execute(text(f"DROP TABLE {FTS_TABLE}"))
+        existing = {}
+    if FTS_TABLE not in existing:
+        connection.execute(text(_FTS_DDL))
+    for ddl in _FTS_TRIGGERS.values():
+        connection.execute(text(ddl))
+    missing = set(_FTS_TRIGGERS) - set(existing)
+    if missing or rebuild:
+        # Index the students written while the triggers were missing
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return [(None, FTS_TABLE, None)]
+
+
+def _install_postgres(connection):
+    from migrate_indexes import _tenant_schemas
+
+    try:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        return [(None, 'pg_trgm', str(e))]
+
+    results = []
+    for schema in [None] + _tenant_schemas(connection):
+        qualified = f'"{schema}".student' if schema else 'student'
+        for name in TRIGRAM_COLUMNS:
+            index_name = f'ix_student_{name}_trgm'
+            try:
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {qualified} "
+                    f"USING gin (lower({name}) gin_trgm_ops)"
+                ))
+                connection.commit()
+                results.append((schema, index_name, None))
+            except Exception as e:
+                connection.rollback()
+                results.append((schema, index_name, str(e)))
+    return results
+
+
+def install_student_search(rebuild=False):
+    """Create the search index for the current database; safe to run repeatedly.
+    Returns a list of (schema, name, error) where error is None on success.
+    Must run inside an application context.
+    """
+    from app import db
+
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            try:
+                results = _install_sqlite(connection, rebuild)
+                connection.commit()
+            except Exception as e:
+                # e.g. SQLite built without FTS5: searches fall back to LIKE
+                connection.rollback()
+                results = [(None, FTS_TABLE, str(e))]
+        elif connection.dialect.name == 'postgresql':
+            results = _install_postgres(connection)
+        else:
+            results = []
+    _backends.pop(str(db.engine.url), None)
+    return results
+
+
+def main():
+    from app import app
+
+    with app.app_context():
+        results = install_student_search(rebuild='--rebuild' in sys.argv)
+        for schema, name, error in results:
+            location = schema or 'main'
+            if error:
+                print(f"❌ {location}.{name}: {error}")
+            else:
+                print(f"✅ {location}.{name}")
+        print(f"Student search backend: {search_backend()}")
+        return all(error is None for _, _, error in results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
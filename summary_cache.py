@@ -0,0 +1,69 @@
+"""
+Per-school, in-process cache of the dashboard summary.
+
+The summary (fund totals, student count and payment-status counts) is
+tagged with the school's data version from the database. Write routes bump
+that version through mark_school_data_changed(), so every gunicorn worker
+notices a change on its next lookup. A cache hit costs one version lookup
+instead of the aggregate queries.
+"""
+
+import threading
+from datetime import datetime
+
+_lock = threading.Lock()
+_summaries = {}
+
+
+class SchoolSummary:
+    """Financial totals and student counts of one school."""
+
+    def __init__(self, totals, status_counts):
+        self.totals = totals
+        self.status_counts = status_counts
+        self.total_students = sum(status_counts.values())
+        self.paid_in_full = status_counts['paid']
+        self.outstanding_count = self.total_students - self.paid_in_full
+
+
+def _compute_summary(today):
+    from financial_totals import get_financial_totals
+    from student_balances import StudentBalanceQuery
+
+    return SchoolSummary(
+        get_financial_totals(spent_on=today),
+        StudentBalanceQuery().count_by_status(),
+    )
+
+
+def get_school_summary():
+    """Summary for the current school, recomputed only after its data changed.
+    The developer view across all schools is not cached.
+    """
+    from app import get_current_school_id, get_school_data_version
+
+    today = datetime.now().date()
+    school_id = get_current_school_id()
+    if not school_id:
+        return _compute_summary(today)
+
+    # Today's spending is part of the summary, so the date is part of the tag
+    tag = (get_school_data_version(school_id), today)
+    with _lock:
+        cached = _summaries.get(school_id)
+    if cached and cached[0] == tag:
+        return cached[1]
+
+    summary = _compute_summary(today)
+    with _lock:
+        _summaries[school_id] = (tag, summary)
+    return summary
+
+
+def clear_school_summary(school_id=None):
+    """Drop this worker's cached summary for one school (or all schools)."""
+    with _lock:
+        if school_id is None:
+            _summaries.clear()
+        else:
+            _summaries.pop(school_id, None)
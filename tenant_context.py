@@ -0,0 +1,165 @@
+"""
+Per-request tenant context backed by a short-lived school status cache.
+
+A page view checks the current school's state in several places: the
+before_request hook, login_required, get_school_filtered_query and the
+template globals. get_tenant_context() builds a TenantContext once per
+request on flask.g, and the school's active/blocked/subscription state
+comes from a process-wide cache that keeps each entry for
+TENANT_STATUS_TTL seconds (TENANT_STATUS_TTL environment variable,
+default 30).
+
+Routes that block, unblock, delete a school or change its subscription
+call invalidate_tenant_status(). ORM commits that change a
+SchoolConfiguration row also drop its entry. Other workers see such a change
+when their entry expires.
+"""
+
+import os
+import threading
+import time
+
+from flask import g, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+TENANT_STATUS_TTL = float(os.environ.get('TENANT_STATUS_TTL', 30))
+
+_PENDING_KEY = 'tenant_context_changed_schools'
+
+_lock = threading.Lock()
+_statuses = {}
+
+
+class TenantStatus:
+    """Access-related state of one school, safe to share between requests."""
+
+    def __init__(self, school_id, school_name, school_address, is_active, is_blocked, subscription_status,
+                 subscription_end_date, trial_start_date):
+        self.school_id = school_id
+        self.school_name = school_name
+        self.school_address = school_address
+        self.is_active = is_active
+        self.is_blocked = is_blocked
+        self.subscription_status = subscription_status
+        self.subscription_end_date = subscription_end_date
+        self.trial_start_date = trial_start_date
+
+    def days_remaining(self):
+        from app import SchoolConfiguration
+        # Same rules as the model; only the attributes above are read
+        return SchoolConfiguration.days_remaining(self)
+
+    @property
+    def is_open(self):
+        """Active and not blocked."""
+        return bool(self.is_active) and not self.is_blocked
+
+    @property
+    def is_expired(self):
+        """Subscription ran out (absolute subscriptions never do)."""
+        return self.subscription_status != 'absolute' and self.days_remaining() <= 0
+
+
+def _load_status(school_id):
+    from app import db, SchoolConfiguration
+
+    row = db.session.query(
+        SchoolConfiguration.id, SchoolConfiguration.school_name, SchoolConfiguration.school_address,
+        SchoolConfiguration.is_active, SchoolConfiguration.is_blocked, SchoolConfiguration.subscription_status,
+        SchoolConfiguration.subscription_end_date, SchoolConfiguration.trial_start_date,
+    ).filter(SchoolConfiguration.id == school_id).first()
+    return TenantStatus(*row) if row else None
+
+
+def get_tenant_status(school_id):
+    """TenantStatus of a school (None if it does not exist), at most TENANT_STATUS_TTL seconds old."""
+    now = time.monotonic()
+    with _lock:
+        cached = _statuses.get(school_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    status = _load_status(school_id)
+    with _lock:
+        _statuses[school_id] = (now + TENANT_STATUS_TTL, status)
+    return status
+
+
+def invalidate_tenant_status(school_id=None):
+    """Forget the cached status of one school (or every school) in this worker."""
+    with _lock:
+        if school_id is None:
+            _statuses.clear()
+        else:
+            _statuses.pop(school_id, None)
+
+
+class TenantContext:
+    """Role, school and school status of the current request."""
+
+    def __init__(self, role, school_id):
+        self.role = role
+        self.school_id = school_id
+        self._status = None
+        self._status_loaded = False
+
+    @property
+    def is_developer(self):
+        return self.role == 'developer'
+
+    @property
+    def status(self):
+        """The school's TenantStatus, looked up on first use."""
+        if not self._status_loaded:
+            self._status = get_tenant_status(self.school_id) if self.school_id else None
+            self._status_loaded = True
+        return self._status
+
+    def has_access(self):
+        """Developers always; school users while their school is open and not expired."""
+        if self.is_developer:
+            return True
+        if not self.school_id or not self.status or not self.status.is_open:
+            return False
+        return not (self.status.subscription_status == 'expired' and self.status.days_remaining() <= 0)
+
+    def school_config(self):
+        """The active school's SchoolConfiguration, for templates that need every column."""
+        from app import db, SchoolConfiguration
+
+        if not self.school_id or not self.status or not self.status.is_active:
+            return None
+        return db.session.get(SchoolConfiguration, self.school_id)
+
+
+def get_tenant_context():
+    """The current request's TenantContext, built once (and again if the login changes)."""
+    role, school_id = session.get('user_role'), session.get('school_id')
+    context = g.get('tenant_context')
+    if context is None or (context.role, context.school_id) != (role, school_id):
+        context = g.tenant_context = TenantContext(role, school_id)
+    return context
+
+
+def _collect_changed_schools(session, flush_context):
+    from app import SchoolConfiguration
+
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, SchoolConfiguration) and obj.id is not None:
+            changed.add(obj.id)
+
+
+def _invalidate_committed(session):
+    for school_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_tenant_status(school_id)
+
+
+def _discard_pending(session, *args):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(Session, 'after_flush', _collect_changed_schools)
+event.listen(Session, 'after_commit', _invalidate_committed)
+event.listen(Session, 'after_rollback', _discard_pending)
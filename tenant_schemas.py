@@ -0,0 +1,58 @@
+"""
+Connection-level routing of tenant tables to each school's schema.
+
+Tenant tables (students, ledger, fund configuration, receipts, budget) are
+declared in the placeholder schema TENANT_SCHEMA. The engine's default
+schema_translate_map maps it to no schema, so scripts, background threads
+and developer requests use the unqualified tables as before.
+
+When TENANT_SCHEMAS is enabled (the default on PostgreSQL), every session
+transaction begun during a school user's request maps the placeholder to
+that school's schema (school_N) on its own connection. Global tables keep
+living in public. The schema name is filled in when a statement runs, so
+compiled statements stay cached and shared between tenants. No
+SET search_path is sent, and nothing is left behind on pooled connections
+because the mapping ends with the connection's transaction.
+"""
+
+from flask import current_app, has_request_context, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+TENANT_SCHEMA = 'tenant'
+# Engine default: tenant tables are the unqualified tables of the search path
+DEFAULT_SCHEMA_MAP = {TENANT_SCHEMA: None}
+
+
+def tenant_schema_map(schema):
+    """schema_translate_map routing the tenant tables to schema (None: unqualified)."""
+    return {TENANT_SCHEMA: schema}
+
+
+def tenant_tables():
+    """Tables that exist once per tenant schema."""
+    from app import db
+
+    return [table for table in db.metadata.sorted_tables if table.schema == TENANT_SCHEMA]
+
+
+def current_tenant_schema():
+    """Schema of the current request's school, or None outside tenant routing."""
+    from app import get_tenant_schema_name
+
+    if not has_request_context() or not current_app.config.get('TENANT_SCHEMAS'):
+        return None
+    school_id = session.get('school_id')
+    if session.get('user_role') == 'developer' or not school_id:
+        return None
+    return get_tenant_schema_name(school_id)
+
+
+def _bind_tenant_schema(session, transaction, connection):
+    schema = current_tenant_schema()
+    if schema:
+        # Changes this Connection only; it goes back to the pool when the transaction ends
+        connection.execution_options(schema_translate_map=tenant_schema_map(schema))
+
+
+event.listen(Session, 'after_begin', _bind_tenant_schema)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for budget-vs-actual spending and bulk allocation saves
+"""
+
+from datetime import date
+
+from app import db, Budget, Expenditure, get_budget_spending
+
+
+def _expenditure(school_id, activity, amount):
+    db.session.add(Expenditure(school_id=school_id, date=date(2024, 2, 1), activity_service=activity,
+                               voucher_no='V1', cheque_no='C1', amount_paid=amount, fund_type='PTA'))
+
+
+def test_spending_per_line_in_one_query(make_school, school_request, count_queries):
+    """Every budget line gets its activity's spending without a query per line"""
+    from app import get_school_filtered_query
+
+    school = make_school()
+    other = make_school()
+    for number in range(120):
+        db.session.add(Budget(school_id=school.id, activity_service=f'{number:04d} - Activity',
+                              proposed_allocation=1000))
+    _expenditure(school.id, '0001 - Activity', 300)
+    _expenditure(school.id, '0001 - Activity', 200)
+    _expenditure(school.id, '0002 - Activity', 50)
+    _expenditure(other.id, '0001 - Activity', 9999)
+    db.session.commit()
+
+    with school_request(school.id):
+        with count_queries() as statements:
+            rows = get_budget_spending(get_school_filtered_query(Budget), Budget.activity_service)
+        assert len(statements) == 1
+        assert len(rows) == 120
+        spent = {item.activity_service: amount for item, amount in rows}
+        assert (spent['0001 - Activity'], spent['0002 - Activity'], spent['0003 - Activity']) == (500, 50, 0)
+
+
+def test_update_budget_is_scoped_to_school(make_school, logged_in_client):
+    """Allocations are saved in bulk and never touch another school's lines"""
+    school = make_school()
+    other = make_school()
+    mine = Budget(school_id=school.id, activity_service='1506 - Stationery', proposed_allocation=0)
+    theirs = Budget(school_id=other.id, activity_service='1506 - Stationery', proposed_allocation=10)
+    db.session.add_all([mine, theirs])
+    db.session.commit()
+
+    response = logged_in_client(school.id).post('/update_budget', data={
+        f'allocation_{mine.id}': '2500', f'allocation_{theirs.id}': '1', 'other_field': 'x',
+    })
+    assert response.status_code == 302
+
+    db.session.expire_all()
+    assert db.session.get(Budget, mine.id).proposed_allocation == 2500
+    assert db.session.get(Budget, theirs.id).proposed_allocation == 10
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk posting of deposit-slip payment files
+"""
+
+import io
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db, Student, Income, Receipt, SmsOutbox
+from bulk_payments import post_payments, read_payment_rows
+from sms_outbox import claim_next_message, send_queued_sms
+
+CSV = """Student ID,Date,Deposit Ref,PTA,SDF,Boarding
+0001,2024-02-01,SLIP1,"10,000",,
+0001,02/02/2024,SLIP2,5000,2000,
+0002,2024-02-01,SLIP3,999999,,
+,2024-02-01,SLIP4,100,,
+0002,yesterday,SLIP5,100,,
+0009,2024-02-01,SLIP6,100,,
+0002,2024-02-01,SLIP7,100,50000,
+"""
+
+
+def _add_student(school_id, student_id, name, **kwargs):
+    student = Student(school_id=school_id, student_id=student_id, name=name, sex='Male', form_class='Form 1',
+                      pta_required=20000, sdf_required=10000, **kwargs)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+def test_rows_are_posted_or_rejected_whole(make_school):
+    """Each row is posted in full or reported, and later rows see earlier rows' balances"""
+    school = make_school()
+    first = _add_student(school.id, '0001', 'Grace Banda', parent_phone='+265991234567')
+    second = _add_student(school.id, '0002', 'John Phiri')
+
+    result = post_payments(school.id, read_payment_rows(io.StringIO(CSV)))
+
+    assert result.posted == 2
+    assert result.total_amount == 17000
+    assert [(error['line'], error['error']) for error in result.errors] == [
+        (4, 'PTA amount (MK 999,999.00) exceeds the remaining balance (MK 20,000.00)'),
+        (5, 'Student ID is required'),
+        (6, "Invalid date 'yesterday' (use YYYY-MM-DD or DD/MM/YYYY)"),
+        (7, 'Student 0009 not found'),
+        (8, 'SDF amount (MK 50,000.00) exceeds the remaining balance (MK 10,000.00)'),
+    ]
+    db.session.refresh(first)
+    db.session.refresh(second)
+    assert (first.pta_amount_paid, first.pta_installments, first.sdf_amount_paid) == (15000, 2, 2000)
+    assert (second.pta_amount_paid, second.pta_installments) == (0, 0)
+
+    receipts = Receipt.query.filter_by(school_id=school.id).order_by(Receipt.receipt_no).all()
+    assert [r.receipt_no for r in receipts] == result.receipts == ['0001', '0002', '0003']
+    assert [(r.fee_type, r.balance, r.installment_number) for r in receipts] == [
+        ('PTA', 10000, 1), ('PTA', 5000, 2), ('SDF', 8000, 1)]
+    assert Income.query.filter_by(school_id=school.id, student_id='0002').count() == 0
+
+
+def test_installment_limit_and_duplicate_slips(make_school):
+    """PTA installment limits apply and a deposit slip is posted only once per student"""
+    school = make_school()
+    _add_student(school.id, '0001', 'Grace Banda', pta_installments=2)
+    rows = [{'student_id': '0001', 'date': '2024-02-01', 'deposit_ref': 'SLIP1', 'pta': 100}]
+
+    assert post_payments(school.id, enumerate(rows, start=1)).posted == 1
+    again = post_payments(school.id, enumerate(rows, start=1))
+    assert again.errors[0]['error'] == 'Deposit slip SLIP1 is already posted for this student'
+
+    rows[0]['deposit_ref'] = 'SLIP2'
+    limited = post_payments(school.id, enumerate(rows, start=1))
+    assert limited.errors[0]['error'] == 'Maximum PTA installments already reached for this student'
+
+
+def test_dry_run_writes_nothing(make_school):
+    """A dry run checks the rows without posting or using receipt numbers"""
+    school = make_school()
+    student = _add_student(school.id, '0001', 'Grace Banda')
+
+    result = post_payments(school.id, read_payment_rows(io.StringIO(CSV)), dry_run=True)
+
+    assert result.posted == 2
+    assert Income.query.filter_by(school_id=school.id).count() == 0
+    db.session.refresh(student)
+    assert student.pta_amount_paid == 0
+
+
+def test_batch_api_and_sms_outbox(make_school, monkeypatch):
+    """The JSON endpoint posts the batch and queues one SMS per payment for sending later"""
+    started = []
+    monkeypatch.setattr('app.wake_sms_sender', started.append)
+    school = make_school()
+    _add_student(school.id, '0001', 'Grace Banda', parent_phone='+265991234567')
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_role'] = 'school_admin'
+        sess['school_id'] = school.id
+
+    response = client.post('/api/payments/batch', json={'payments': [
+        {'student_id': '0001', 'payment_date': '2024-02-01', 'deposit_ref_no': 'SLIP1', 'pta_amount': 100,
+         'sdf_amount': 200},
+        {'student_id': '0001', 'payment_date': '2024-02-01', 'deposit_ref_no': ''},
+    ]})
+
+    data = response.get_json()
+    assert (data['posted'], data['failed'], data['sms_queued']) == (1, 1, 1)
+    assert data['errors'][0]['line'] == 2
+    assert started == [app]
+    assert client.post('/api/payments/batch', json={'payments': 'x'}).status_code == 400
+
+    message = SmsOutbox.query.filter_by(school_id=school.id).one()
+    assert message.status == 'queued'
+    send_queued_sms()
+    db.session.refresh(message)
+    assert (message.status, message.attempts) == ('sent', 1)
+
+
+def _queue_messages(school_id, student, count):
+    db.session.add_all([SmsOutbox(school_id=school_id, student_db_id=student.id, phone='+265991234567',
+                                  payload='{}', status='queued') for _ in range(count)])
+    db.session.commit()
+    return [m.id for m in SmsOutbox.query.filter_by(school_id=school_id).order_by(SmsOutbox.id)]
+
+
+class _Gateway:
+    """Stand-in SMS gateway recording the messages it was asked to send."""
+
+    def __init__(self, crash_on=None):
+        self.sent = []
+        self.crash_on = crash_on
+
+    def send_payment_confirmation(self, student, phone, details):
+        if len(self.sent) == self.crash_on:
+            raise KeyboardInterrupt('worker killed')
+        self.sent.append(phone)
+        return {'success': True}
+
+
+def test_message_claimed_by_another_sender_is_skipped(make_school):
+    """A message another sender claims between our SELECT and UPDATE is not taken again"""
+    school = make_school()
+    first, second = _queue_messages(school.id, _add_student(school.id, '0001', 'Grace'), 2)
+
+    rival_done = []
+
+    def rival_claims_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE sms_outbox') and not rival_done:
+            rival_done.append(True)
+            with db.engine.begin() as rival:
+                rival.execute(SmsOutbox.__table__.update().where(SmsOutbox.id == first).values(status='sending'))
+
+    event.listen(db.engine, 'before_cursor_execute', rival_claims_first)
+    try:
+        assert claim_next_message() == second
+        assert claim_next_message() is None
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', rival_claims_first)
+    assert db.session.get(SmsOutbox, second).attempts == 1
+
+
+def test_crash_mid_batch_does_not_resend(make_school, monkeypatch):
+    """Each result is committed at once, so a sender killed mid-batch never resends earlier messages"""
+    school = make_school()
+    ids = _queue_messages(school.id, _add_student(school.id, '0001', 'Grace'), 3)
+    gateway = _Gateway(crash_on=1)
+    monkeypatch.setattr('app.sms_service', gateway)
+
+    with pytest.raises(KeyboardInterrupt):
+        send_queued_sms()
+    db.session.rollback()
+    statuses = lambda: [db.session.get(SmsOutbox, i).status for i in ids]
+    assert statuses() == ['sent', 'sending', 'queued']
+
+    gateway.crash_on = None
+    assert send_queued_sms() == (1, 0)
+    assert len(gateway.sent) == 2 and statuses() == ['sent', 'sending', 'sent']
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the class x fund x sex collection statistics
+"""
+
+from app import db, Student, FundConfiguration
+from collection_stats import collection_breakdown
+
+
+STUDENTS = [
+    # student_id, sex, form_class, pta_paid, sdf_paid
+    ('0001', 'Female', 'Form 1', 30000, 2000),   # paid in full
+    ('0002', 'Male', 'Form 1', 10000, 0),        # partial
+    ('0003', 'Male', 'Form 1', 0, 0),            # no payment
+    ('0004', 'Female', 'Form 2', 0, 2000),       # partial
+]
+
+
+def _setup_school(make_school):
+    school = make_school()
+    db.session.add(FundConfiguration(school_id=school.id, term_name='Term 1', pta_amount=30000,
+                                     sdf_amount=2000, boarding_amount=0, is_active=True))
+    for student_id, sex, form_class, pta, sdf in STUDENTS:
+        db.session.add(Student(school_id=school.id, student_id=student_id, name=f'Student {student_id}', sex=sex,
+                               form_class=form_class, pta_amount_paid=pta, sdf_amount_paid=sdf))
+    other = make_school()
+    db.session.add(Student(school_id=other.id, student_id='0001', name='Other', sex='Male', form_class='Form 1',
+                           pta_amount_paid=500))
+    db.session.commit()
+    return school
+
+
+def test_breakdown_totals(make_school, school_request, count_queries):
+    """Whole-school, per-fund and per-class figures come from one query"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        with count_queries() as statements:
+            breakdown = collection_breakdown()
+        assert len(statements) == 1
+
+        total = breakdown.total()
+        assert (total['total_students'], total['paid_in_full'], total['partial_payments'],
+                total['no_payments']) == (4, 1, 2, 1)
+        assert total['funds']['PTA'] == {'required': 120000, 'collected': 40000, 'outstanding': 80000,
+                                         'collection_rate': 33.33}
+        assert total['funds']['SDF']['outstanding'] == 4000
+        assert total['total_required'] == 128000
+        assert total['collection_rate'] == round(44000 / 128000 * 100, 2)
+
+        classes = breakdown.by_class()
+        assert list(classes) == ['Form 1', 'Form 2']
+        assert classes['Form 2']['total_collected'] == 2000
+        assert breakdown.by_class_and_sex()['Form 1']['Male']['no_payments'] == 1
+
+
+def test_class_drill_down_and_enrollment(make_school, school_request):
+    """One class splits by sex; enrollment counts match the old girls/boys stats"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        breakdown = collection_breakdown()
+        form_one = breakdown.for_class('Form 1')
+        assert form_one.by_sex()['Male']['total_students'] == 2
+        assert form_one.by_sex()['Female']['collection_rate'] == 100
+        assert breakdown.for_class('Form 4') is None
+
+        stats, girls, boys = breakdown.enrollment()
+        assert (girls, boys) == (2, 2)
+        assert stats['Form 1'] == {'girls': 1, 'boys': 2, 'total': 3}
+
+
+def test_empty_school(make_school, school_request):
+    school = make_school()
+    with school_request(school.id):
+        breakdown = collection_breakdown()
+        assert breakdown.total()['total_students'] == 0
+        assert breakdown.total()['collection_rate'] == 0
+        assert breakdown.enrollment() == ({}, 0, 0)
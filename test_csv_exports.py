@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming CSV exports
+"""
+
+import csv
+import io
+from datetime import date
+
+from app import db, Student, Income, Expenditure, OtherIncome
+from csv_exports import csv_chunks
+
+
+def _rows(response):
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_csv_chunks_reuse_one_buffer():
+    """Rows are yielded in chunks and nothing is repeated between chunks"""
+    chunks = list(csv_chunks(['a'], ([i] for i in range(5)), rows_per_chunk=2))
+    assert chunks == ['a\r\n0\r\n1\r\n', '2\r\n3\r\n', '4\r\n']
+
+
+def test_student_export_streams_balances(make_school, logged_in_client):
+    """The student export is a streamed attachment with SQL-computed balances"""
+    school = make_school()
+    other = make_school()
+    db.session.add_all([
+        Student(school_id=school.id, student_id='0001', name='Grace Banda', sex='Female', form_class='Form 1',
+                pta_required=100, sdf_required=50, boarding_required=1, pta_amount_paid=100, sdf_amount_paid=50,
+                boarding_amount_paid=1),
+        Student(school_id=school.id, student_id='0002', name='John Phiri', sex='Male', form_class='Form 2',
+                pta_required=100, sdf_required=50, boarding_required=1, pta_amount_paid=40),
+        Student(school_id=other.id, student_id='0001', name='Other School', sex='Male', form_class='Form 1'),
+    ])
+    db.session.commit()
+
+    response = logged_in_client(school.id).get('/api/export/students')
+
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="students_export_')
+    rows = _rows(response)
+    assert rows[0][:2] == ['Student ID', 'Name']
+    assert [(row[0], row[1], row[7], row[16], row[17]) for row in rows[1:]] == [
+        ('0001', 'Grace Banda', '0.0', '0.0', 'Paid in Full'),
+        ('0002', 'John Phiri', '60.0', '111.0', 'Outstanding'),
+    ]
+    outstanding = _rows(logged_in_client(school.id).get('/api/export/students?status=outstanding'))
+    assert [row[0] for row in outstanding[1:]] == ['0002']
+
+
+def test_ledger_exports_filter_by_date_and_fund(make_school, logged_in_client):
+    """Income, expenditure and other income exports honour the date range and fund"""
+    school = make_school()
+    for day, fee_type in ((1, 'PTA'), (2, 'SDF'), (20, 'PTA')):
+        db.session.add(Income(school_id=school.id, payment_date=date(2024, 3, day), student_id='0001',
+                              student_name='Grace Banda', form_class='Form 1', payment_reference=f'SLIP{day}',
+                              fee_type=fee_type, amount_paid=day, balance=0))
+        db.session.add(Expenditure(school_id=school.id, date=date(2024, 3, day), activity_service='Chalk',
+                                   voucher_no=str(day), cheque_no='C', amount_paid=day, fund_type=fee_type))
+        db.session.add(OtherIncome(school_id=school.id, date=date(2024, 3, day), customer_name='Hall hire',
+                                   income_type='Rent', total_charge=day, amount_paid=day, balance=0))
+    db.session.commit()
+    client = logged_in_client(school.id)
+
+    income = _rows(client.get('/api/export/income?start_date=2024-03-01&end_date=2024-03-10&fund=pta'))
+    assert income[1:] == [['2024-03-01', '0001', 'Grace Banda', 'Form 1', 'PTA', '1.0', '0.0', 'SLIP1']]
+    expenditure = _rows(client.get('/api/export/expenditure?fund=SDF'))
+    assert [row[2] for row in expenditure[1:]] == ['2']
+    other_income = _rows(client.get('/api/export/other_income?start_date=2024-03-02'))
+    assert [row[0] for row in other_income[1:]] == ['2024-03-02', '2024-03-20']
+
+    bad = client.get('/api/export/income?fund=Library')
+    assert bad.status_code == 400
+    assert bad.get_json()['error'] == 'fund must be one of PTA, SDF, Boarding'
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests for the online backups, their rotation and the tenant snapshots
+"""
+
+import gzip
+import json
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db, Student
+from db_backups import (LOCK_FILE, STATUS_FILE, backup_sqlite, check_integrity, compress, get_backup_status, rotate,
+                        run_backup, snapshot_school)
+
+
+def _live_database(path, rows):
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('CREATE TABLE payment (id INTEGER PRIMARY KEY, note TEXT)')
+    connection.executemany('INSERT INTO payment (note) VALUES (?)', [('x' * 200,)] * rows)
+    connection.commit()
+    return connection
+
+
+def test_online_copy_is_consistent_while_writes_continue(tmp_path):
+    """Writes keep committing during the copy, and the copy is a complete, intact snapshot"""
+    source = str(tmp_path / 'live.db')
+    writer_connection = _live_database(source, 5000)
+    committed = []
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            writer_connection.execute("INSERT INTO payment (note) VALUES ('during backup')")
+            writer_connection.commit()
+            committed.append(time.perf_counter())
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    progress = []
+    try:
+        backup_sqlite(source, str(tmp_path / 'copy.db'), pages=16, pause=0.001,
+                      progress=lambda done, total: progress.append((done, total)))
+    finally:
+        stop.set()
+        thread.join()
+        writer_connection.close()
+
+    assert committed and len(progress) > 1 and progress[-1][0] == progress[-1][1]
+    assert check_integrity(str(tmp_path / 'copy.db')) == []
+    with sqlite3.connect(str(tmp_path / 'copy.db')) as copy:
+        assert copy.execute("SELECT count(*) FROM payment WHERE note != 'during backup'").fetchone() == (5000,)
+
+
+def test_compress_and_rotate(tmp_path):
+    """Compressed copies are valid gzip; rotation keeps only the newest copies of each kind"""
+    path = tmp_path / 'smartfee_backup_20250101_000000.db'
+    _live_database(str(path), 10).close()
+    compressed = compress(str(path))
+    assert not path.exists() and gzip.open(compressed).read(16) == b'SQLite format 3\x00'
+
+    for stamp in ('20250102_000000', '20250103_000000', '20250104_000000'):
+        (tmp_path / f'smartfee_backup_{stamp}.db').write_bytes(b'')
+    (tmp_path / 'school_1_snapshot_20250101_000000.jsonl.gz').write_bytes(b'')
+
+    assert rotate(str(tmp_path), 'smartfee_backup_', 2) == [
+        'smartfee_backup_20250101_000000.db.gz', 'smartfee_backup_20250102_000000.db']
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'school_1_snapshot_20250101_000000.jsonl.gz',
+        'smartfee_backup_20250103_000000.db', 'smartfee_backup_20250104_000000.db']
+
+
+def test_school_snapshot_holds_only_that_school(make_school, tmp_path):
+    """A logical snapshot contains the school's rows from tenant and global tables only"""
+    school, other = make_school(name='Snapshot School'), make_school(name='Other School')
+    db.session.add_all([
+        Student(school_id=school.id, student_id='0001', name='Grace', sex='Female', form_class='Form 1'),
+        Student(school_id=other.id, student_id='0001', name='John', sex='Male', form_class='Form 1'),
+    ])
+    db.session.commit()
+
+    with db.engine.connect() as connection:
+        counts = snapshot_school(connection, school.id, str(tmp_path / 'snapshot.jsonl.gz'))
+
+    with gzip.open(tmp_path / 'snapshot.jsonl.gz', 'rt') as snapshot:
+        header, *lines = [json.loads(line) for line in snapshot]
+    assert header['school_id'] == school.id
+    assert counts['student'] == 1 and counts['school_configuration'] == 1
+    assert [line['row']['name'] for line in lines if line['table'] == 'student'] == ['Grace']
+
+
+def test_developer_backup_reports_progress(app_ctx, tmp_path, monkeypatch):
+    """The developer backup writes a verified copy and its status shows pages and duration"""
+    monkeypatch.setitem(app.config, 'BACKUP_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'BACKUP_COMPRESS', True)
+
+    status = run_backup(app)
+    assert status['state'] == 'done', status.get('error')
+    assert status['pages_done'] == status['pages_total'] > 0 and status['duration'] >= 0
+    assert [p.name.endswith('.db.gz') for p in tmp_path.glob('smartfee_backup_*')] == [True]
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(logged_in=True, user_role='developer', username='developer')
+    assert client.get('/developer/backups').get_json()['files'] == status['files']
+
+
+# Another process that takes the backup lock, reports a run in progress and waits to be killed
+_HOLDER = """
+import fcntl, json, os, sys
+directory = sys.argv[1]
+lock = open(os.path.join(directory, '%s'), 'a+')
+fcntl.flock(lock, fcntl.LOCK_EX)
+with open(os.path.join(directory, '%s'), 'w') as status:
+    json.dump({'state': 'running', 'started_at': '2025-01-01T00:00:00', 'pages_done': 5}, status)
+print('locked', flush=True)
+sys.stdin.read()
+""" % (LOCK_FILE, STATUS_FILE)
+
+
+def test_backups_coordinate_across_processes(app_ctx, tmp_path, monkeypatch):
+    """A run in another process is reported here and blocks a second run; a dead run shows as interrupted"""
+    pytest.importorskip('fcntl')
+    monkeypatch.setitem(app.config, 'BACKUP_DIR', str(tmp_path))
+    holder = subprocess.Popen([sys.executable, '-c', _HOLDER, str(tmp_path)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        assert get_backup_status(app)['pages_done'] == 5
+        assert run_backup(app)['state'] == 'running'
+        assert not list(tmp_path.glob('smartfee_backup_*'))
+    finally:
+        holder.kill()
+        holder.wait()
+
+    assert get_backup_status(app)['state'] == 'interrupted'
+    assert run_backup(app)['state'] == 'done'
+
+
+def test_scheduled_run_waits_for_interval(app_ctx, tmp_path, monkeypatch):
+    """The scheduler's run is skipped while the last backup finished less than an interval ago"""
+    monkeypatch.setitem(app.config, 'BACKUP_DIR', str(tmp_path))
+    assert run_backup(app, interval=3600)['state'] == 'done'
+    assert run_backup(app, interval=3600) is None
+    assert len(list(tmp_path.glob('smartfee_backup_*'))) == 1
+
+    status_path = tmp_path / STATUS_FILE
+    status = json.loads(status_path.read_text())
+    status['finished_at'] = (datetime.now() - timedelta(hours=2)).isoformat(timespec='seconds')
+    status_path.write_text(json.dumps(status))
+    assert run_backup(app, interval=3600)['state'] == 'done'
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for reconciling deposit slips against bank statements
+"""
+
+import io
+from datetime import date
+
+from app import app, db, Income, Receipt, BankStatementLine
+from deposit_reconciliation import normalise_reference, reconcile_statement
+
+STATEMENT = """Date,Reference,Description,Credit,Debit
+01/02/2024,Dep slip no 001,Cash deposit,"15,000.00",
+04/02/2024,,DEPOSIT 0042 GRACE,7000,
+07/02/2024,,CASH,3000,
+08/02/2024,R5,Cash,999,
+09/02/2024,,Bank charges,,50
+yesterday,,Cash,10,
+"""
+
+
+def _income(school_id, student_id, payment_date, reference, amount, fee_type='PTA'):
+    db.session.add(Income(school_id=school_id, student_id=student_id, student_name='Student', form_class='Form 1',
+                          payment_date=payment_date, payment_reference=reference, fee_type=fee_type,
+                          amount_paid=amount, balance=0))
+
+
+def _ledger(school_id):
+    _income(school_id, '0001', date(2024, 2, 1), 'SLIP-001', 10000)
+    _income(school_id, '0001', date(2024, 2, 1), 'SLIP-001', 5000, fee_type='SDF')
+    # Reference lost on the income row but kept on the receipt
+    _income(school_id, '0002', date(2024, 2, 3), '', 7000)
+    db.session.add(Receipt(school_id=school_id, receipt_no='0003', student_id='0002', student_name='Student',
+                           form_class='Form 1', payment_date=date(2024, 2, 3), deposit_slip_ref='DEP 0042',
+                           fee_type='PTA', amount_paid=7000, balance=0))
+    _income(school_id, '0003', date(2024, 2, 5), 'X9', 3000)
+    _income(school_id, '0004', date(2024, 2, 8), 'R5', 4000)
+    db.session.commit()
+
+
+def test_normalise_reference():
+    """Prefixes, punctuation and leading zeros are ignored"""
+    assert normalise_reference('Dep. slip no 00123') == '123'
+    assert normalise_reference('slip-123') == '123'
+    assert normalise_reference('ABC/77') == 'ABC77'
+    assert normalise_reference('000') == '000'
+
+
+def test_statement_lines_are_matched_and_persisted(make_school):
+    """Exact, fuzzy and unmatched lines are stored with their status and missing deposits reported"""
+    school = make_school()
+    _ledger(school.id)
+
+    result = reconcile_statement(school.id, io.StringIO(STATEMENT))
+
+    assert (result.new_lines, result.exact, result.fuzzy, result.unmatched) == (4, 2, 1, 1)
+    assert result.errors == [{'line': 7, 'error': "Invalid date 'yesterday'"}]
+    assert [(deposit['reference'], deposit['amount']) for deposit in result.unmatched_deposits] == [('R5', 4000)]
+    lines = {line.amount: line for line in BankStatementLine.query.filter_by(school_id=school.id)}
+    assert (lines[15000].status, lines[15000].ledger_key) == ('exact', '1:2024-02-01')
+    assert (lines[7000].status, lines[7000].ledger_key) == ('exact', '42:2024-02-03')
+    assert (lines[3000].status, lines[3000].ledger_key) == ('fuzzy', 'X9:2024-02-05')
+    assert lines[999].status == 'unmatched'
+    assert lines[999].note == 'Reference R5 is in the ledger with MK 4,000.00'
+
+
+def test_rerun_only_processes_new_lines(make_school):
+    """Importing the same export again adds nothing; new lines are matched against unclaimed deposits"""
+    school = make_school()
+    _ledger(school.id)
+    reconcile_statement(school.id, io.StringIO(STATEMENT))
+
+    again = reconcile_statement(school.id, io.StringIO(STATEMENT))
+    assert (again.new_lines, again.already_imported, again.exact, again.fuzzy) == (0, 4, 0, 0)
+
+    longer = reconcile_statement(school.id, io.StringIO(STATEMENT + "10/02/2024,R-5,,4000,\n01/02/2024,,,15000,\n"))
+    assert (longer.new_lines, longer.exact, longer.fuzzy) == (2, 1, 0)
+    # The slip of the second 15,000 was claimed by the first run
+    assert longer.unmatched == 2
+    assert BankStatementLine.query.filter_by(school_id=school.id).count() == 6
+
+
+def test_slip_number_reused_in_another_period(make_school):
+    """A slip number claimed in one term still matches its deposit in the next, and days are never summed"""
+    school = make_school()
+    _income(school.id, '0001', date(2024, 2, 1), 'SLIP 00123', 5000)
+    _income(school.id, '0002', date(2024, 5, 6), 'DEP-123', 8000)
+    # Same slip number twice within one statement window
+    _income(school.id, '0003', date(2024, 5, 7), '123', 2000)
+    db.session.commit()
+
+    first = reconcile_statement(school.id, io.StringIO("Date,Reference,Credit\n01/02/2024,123,5000\n"))
+    assert first.exact == 1
+    second = reconcile_statement(school.id, io.StringIO(
+        "Date,Reference,Credit\n07/05/2024,SLIP 123,8000\n07/05/2024,123,2000\n"))
+    assert (second.exact, second.unmatched, second.unmatched_deposits) == (2, 0, [])
+    keys = sorted(line.ledger_key for line in BankStatementLine.query.filter_by(school_id=school.id))
+    assert keys == ['123:2024-02-01', '123:2024-05-06', '123:2024-05-07']
+
+
+def test_api_lists_lines_by_status(make_school):
+    """The JSON API pages through the school's lines filtered by status"""
+    school = make_school()
+    _ledger(school.id)
+    reconcile_statement(school.id, io.StringIO(STATEMENT))
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_role'] = 'school_admin'
+        sess['school_id'] = school.id
+
+    data = client.get('/api/reconciliation?status=exact&page_size=1').get_json()
+    assert [line['amount'] for line in data['items']] == [7000]
+    data = client.get(f"/api/reconciliation?status=exact&page_size=1&cursor={data['next_cursor']}").get_json()
+    assert [line['amount'] for line in data['items']] == [15000]
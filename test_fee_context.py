@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the request-scoped fee context used by the Student balance methods
+"""
+
+from app import db, Student, FundConfiguration, get_fee_context, invalidate_fee_context
+
+
+def _add_students(school_id, count, **amounts):
+    for number in range(1, count + 1):
+        db.session.add(Student(
+            school_id=school_id,
+            student_id=f"{number:04d}",
+            name=f"Student {number}",
+            sex='Female' if number % 2 else 'Male',
+            form_class='Form 1',
+            **amounts
+        ))
+    db.session.commit()
+
+
+def test_balances_use_active_config(make_school, school_request):
+    """Balances fall back to the active configuration when no per-student amount is set"""
+    school = make_school()
+    db.session.add(FundConfiguration(school_id=school.id, term_name='Term 1', pta_amount=30000,
+                                     sdf_amount=2000, boarding_amount=10000, is_active=True))
+    _add_students(school.id, 1, pta_amount_paid=30000, sdf_amount_paid=500)
+
+    with school_request(school.id):
+        student = Student.query.filter_by(school_id=school.id).one()
+        assert student.get_pta_balance() == 0
+        assert student.get_sdf_balance() == 1500
+        assert student.get_boarding_balance() == 10000
+        assert not student.is_paid_in_full()
+
+
+def test_defaults_without_active_config(make_school, school_request):
+    """Without a fund configuration the historical default amounts apply"""
+    school = make_school()
+    _add_students(school.id, 1)
+
+    with school_request(school.id):
+        fee_context = get_fee_context()
+        assert (fee_context.pta_amount, fee_context.sdf_amount, fee_context.boarding_amount) == (45000, 5000, 0)
+        student = Student.query.filter_by(school_id=school.id).one()
+        assert student.get_pta_balance(fee_context) == 45000
+
+
+def test_query_count_independent_of_students(make_school, school_request, count_queries):
+    """Checking every student costs the same number of queries for 5 and 50 students"""
+    counts = []
+    for size in (5, 50):
+        school = make_school()
+        db.session.add(FundConfiguration(school_id=school.id, term_name='Term 1', pta_amount=100,
+                                         sdf_amount=100, is_active=True))
+        _add_students(school.id, size)
+        db.session.expire_all()
+
+        with school_request(school.id):
+            with count_queries() as statements:
+                students = Student.query.filter_by(school_id=school.id).all()
+                paid = [s for s in students if s.is_paid_in_full()]
+            counts.append(len(statements))
+            assert paid == []
+
+    assert counts[0] == counts[1]
+
+
+def test_invalidate_reloads_config(make_school, school_request):
+    """A cached context is refreshed after invalidate_fee_context"""
+    school = make_school()
+    config = FundConfiguration(school_id=school.id, term_name='Term 1', pta_amount=100,
+                               sdf_amount=100, is_active=True)
+    db.session.add(config)
+    db.session.commit()
+
+    with school_request(school.id):
+        assert get_fee_context().pta_amount == 100
+        config.pta_amount = 250
+        db.session.commit()
+        assert get_fee_context().pta_amount == 100
+        invalidate_fee_context(school.id)
+        assert get_fee_context().pta_amount == 250
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the grouped financial totals shared by the dashboard and report routes
+"""
+
+from datetime import date
+
+from app import app, db, Student, OtherIncome, Expenditure
+from financial_totals import get_financial_totals
+
+TODAY = date(2024, 5, 20)
+
+
+def _setup_school(make_school):
+    school = make_school()
+    db.session.add_all([
+        Student(school_id=school.id, student_id='0001', name='A', sex='Male', form_class='Form 1',
+                pta_amount_paid=1000, sdf_amount_paid=200, boarding_amount_paid=50),
+        Student(school_id=school.id, student_id='0002', name='B', sex='Female', form_class='Form 1',
+                pta_amount_paid=500, sdf_amount_paid=0, boarding_amount_paid=0),
+        OtherIncome(school_id=school.id, date=TODAY, customer_name='Canteen', income_type='Rent',
+                    total_charge=300, amount_paid=300, balance=0),
+    ])
+    for fund_type, amount, day in [('PTA', 400, TODAY), ('PTA', 100, date(2024, 1, 1)), ('SDF', 50, TODAY),
+                                   ('Boarding', 20, date(2024, 1, 1)), ('Other Income', 30, TODAY)]:
+        db.session.add(Expenditure(school_id=school.id, date=day, activity_service='1506 - Stationery',
+                                   voucher_no='V1', cheque_no='C1', amount_paid=amount, fund_type=fund_type))
+    db.session.commit()
+    return school
+
+
+def test_totals_per_fund(make_school, school_request):
+    """Collected and spent amounts match the per-fund sums"""
+    school = _setup_school(make_school)
+    _setup_school(make_school)  # a second school must not be counted
+
+    with school_request(school.id):
+        totals = get_financial_totals(spent_on=TODAY)
+
+    assert (totals.pta_collected, totals.sdf_collected, totals.boarding_collected) == (1500, 200, 50)
+    assert totals.other_income_collected == 300
+    assert totals.total_collected == 2050
+    assert (totals.pta_spent, totals.sdf_spent, totals.boarding_spent, totals.other_income_spent) == (500, 50, 20, 30)
+    assert totals.pta_balance == 1000
+    assert totals.spent_on_day == 480
+    assert totals.total_spent == 600
+
+
+def test_two_statements(make_school, school_request, count_queries):
+    """All totals cost two statements"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        with count_queries() as statements:
+            get_financial_totals(spent_on=TODAY)
+    assert len(statements) == 2
+
+
+def test_empty_school(make_school, school_request):
+    """A school without data gets zeros rather than None"""
+    school = make_school()
+    with school_request(school.id):
+        totals = get_financial_totals(spent_on=TODAY)
+    assert totals.to_dict() == dict.fromkeys(totals.to_dict(), 0)
+
+
+def test_todays_summary_endpoint(make_school):
+    """The dashboard summary endpoint reports the grouped totals"""
+    school = _setup_school(make_school)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_role'] = 'school_admin'
+        sess['school_id'] = school.id
+
+    data = client.get('/api/todays_financial_summary').get_json()
+    assert data['income'] == '2050.00'
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-query latest payment lookup used by /income and /income_grouped
+"""
+
+from datetime import date
+
+import pytest
+
+import app as app_module
+from app import db, Income, get_latest_payments
+
+
+def _add_income(school_id, student_id, payment_date, reference, fee_type='PTA'):
+    db.session.add(Income(school_id=school_id, payment_date=payment_date, student_id=student_id,
+                          student_name=f'Student {student_id}', form_class='Form 1',
+                          payment_reference=reference, fee_type=fee_type, amount_paid=100, balance=0))
+
+
+def _setup_payments(make_school):
+    school = make_school()
+    other = make_school()
+    _add_income(school.id, '0001', date(2024, 1, 10), 'SLIP-A')
+    _add_income(school.id, '0001', date(2024, 3, 5), 'SLIP-C')
+    _add_income(school.id, '0001', date(2024, 2, 1), 'SLIP-B')
+    _add_income(school.id, '0002', date(2024, 2, 1), 'SLIP-D', fee_type='PTA')
+    _add_income(school.id, '0002', date(2024, 2, 1), 'SLIP-E', fee_type='SDF')
+    _add_income(school.id, '0003', date(2024, 1, 1), None)
+    # Same student number at another school must not leak into the first school
+    _add_income(other.id, '0001', date(2025, 1, 1), 'OTHER')
+    db.session.commit()
+    return school, other
+
+
+@pytest.mark.parametrize('window_functions', [True, False])
+def test_latest_payment_per_student(make_school, school_request, monkeypatch, window_functions):
+    """Window-function and MAX/join variants return the same latest rows"""
+    monkeypatch.setattr(app_module, 'supports_window_functions', lambda: window_functions)
+    school, other = _setup_payments(make_school)
+
+    with school_request(school.id):
+        latest = get_latest_payments()
+
+    assert latest == {
+        (school.id, '0001'): {'payment_date': date(2024, 3, 5), 'payment_reference': 'SLIP-C'},
+        (school.id, '0002'): {'payment_date': date(2024, 2, 1), 'payment_reference': 'SLIP-E'},
+        (school.id, '0003'): {'payment_date': date(2024, 1, 1), 'payment_reference': None},
+    }
+
+
+def test_single_query_regardless_of_payments(make_school, school_request, count_queries):
+    """The lookup costs the same number of statements for 10 and 200 payments"""
+    counts = []
+    for size in (10, 200):
+        school = make_school()
+        for number in range(size):
+            _add_income(school.id, f'{number % 20:04d}', date(2024, 1, 1 + number % 28), f'SLIP-{number}')
+        db.session.commit()
+
+        with school_request(school.id):
+            with count_queries() as statements:
+                latest = get_latest_payments()
+            counts.append(len(statements))
+        assert len(latest) == min(size, 20)
+
+    assert counts[0] == counts[1]
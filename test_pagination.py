@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset pagination of the list pages and their JSON endpoints
+"""
+
+from datetime import date
+from urllib.parse import parse_qs, urlsplit
+
+import app as app_module
+from app import db, Student, Expenditure, OtherIncome, paginate, student_sort_keys
+from pagination import encode_cursor, decode_cursor, get_page_args, MAX_PAGE_SIZE
+
+
+def _add_students(school_id, student_ids):
+    for index, student_id in enumerate(student_ids):
+        db.session.add(Student(school_id=school_id, student_id=student_id, name=f'Student {index:02d}',
+                               sex='Female' if index % 2 else 'Male', form_class=f'Form {index % 3 + 1}'))
+    db.session.commit()
+
+
+def _walk(client, path, page_size):
+    """Every item of a JSON list endpoint, following next_cursor to the end."""
+    items = []
+    cursor = None
+    while True:
+        url = f'{path}?page_size={page_size}' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        items.extend(data['items'])
+        assert len(data['items']) <= page_size
+        cursor = data['next_cursor']
+        if cursor is None:
+            return items, data
+
+
+def test_cursor_round_trip():
+    """Dates survive the token; malformed tokens are ignored"""
+    values = [date(2024, 5, 1), 'Ann', 17]
+    assert decode_cursor(encode_cursor(values)) == values
+    assert decode_cursor('not a cursor!') is None
+    assert get_page_args({'page_size': '100000'}) == (None, MAX_PAGE_SIZE)
+    assert get_page_args({'page_size': 'x', 'cursor': 'abc'}) == ('abc', 50)
+
+
+def test_students_in_numeric_order_without_gaps(make_school, school_request):
+    """Pages follow the numeric student ID order with no duplicates or gaps"""
+    school = make_school()
+    _add_students(school.id, ['10', '0002', '1', 'X-1', '0003', '200', '7'])
+
+    with school_request(school.id):
+        seen = []
+        cursor = None
+        while True:
+            page = paginate(Student.query.filter_by(school_id=school.id), student_sort_keys(), cursor, 2)
+            seen.extend(student.student_id for student in page.items)
+            cursor = page.next_cursor
+            if not page.has_more:
+                break
+
+    assert seen == ['1', '0002', '0003', '7', '10', '200', 'X-1']
+
+
+def test_students_api_stats_cover_all_pages(make_school, logged_in_client):
+    """The JSON endpoint pages through every student; stats count all of them"""
+    school = make_school()
+    _add_students(school.id, [f'{n:04d}' for n in range(1, 12)])
+
+    items, last = _walk(logged_in_client(school.id), '/api/students', 4)
+
+    assert [item['student_id'] for item in items] == [f'{n:04d}' for n in range(1, 12)]
+    assert last['stats']['total_enrollment'] == 11
+    assert sum(c['total'] for c in last['stats']['classes'].values()) == 11
+
+
+def test_income_api_pages_by_name(make_school, logged_in_client):
+    """Income records come in name order and totals are for the whole school"""
+    school = make_school()
+    _add_students(school.id, [f'{n:04d}' for n in range(1, 6)])
+    Student.query.filter_by(school_id=school.id).update({'pta_amount_paid': 10})
+    db.session.commit()
+
+    items, last = _walk(logged_in_client(school.id), '/api/income', 2)
+
+    assert [item['student_name'] for item in items] == [f'Student {n:02d}' for n in range(5)]
+    assert last['totals']['pta'] == 50
+
+
+def test_expenditure_api_newest_first(make_school, logged_in_client):
+    """Expenditures on the same date are split across pages without loss"""
+    school = make_school()
+    for day in (1, 2, 2, 2, 3):
+        db.session.add(Expenditure(school_id=school.id, date=date(2024, 1, day), activity_service='Chalk',
+                                   voucher_no='V', cheque_no='C', amount_paid=5, fund_type='PTA'))
+    db.session.commit()
+
+    items, last = _walk(logged_in_client(school.id), '/api/expenditure', 2)
+
+    assert [item['date'] for item in items] == ['2024-01-03', '2024-01-02', '2024-01-02', '2024-01-02',
+                                                '2024-01-01']
+    assert len({item['id'] for item in items}) == 5
+    assert last['totals']['pta_spent'] == 25
+
+
+def test_income_page_shows_one_page_of_other_income(make_school, monkeypatch, logged_in_client):
+    """/income lists only the newest other income page and links the rest on /other_income"""
+    school = make_school()
+    for day in (1, 2, 3):
+        db.session.add(OtherIncome(school_id=school.id, date=date(2024, 1, day), customer_name=f'Customer {day}',
+                                   income_type='Chairs', total_charge=10, amount_paid=10, balance=0))
+    db.session.commit()
+    rendered = {}
+    monkeypatch.setattr(app_module, 'render_template', lambda template, **context: rendered.update(context) or '')
+
+    client = logged_in_client(school.id)
+    assert client.get('/income?page_size=2').status_code == 200
+
+    assert [o.customer_name for o in rendered['other_incomes']] == ['Customer 3', 'Customer 2']
+    link = urlsplit(rendered['other_income_more_url'])
+    assert link.path == '/other_income'
+    rest = client.get('/api/other_income', query_string=parse_qs(link.query)).get_json()
+    assert [item['customer_name'] for item in rest['items']] == ['Customer 1']
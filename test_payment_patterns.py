@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the payment pattern histograms behind /api/analytics/payment-patterns
+"""
+
+from datetime import date
+
+import pytest
+
+from app import db, Income, mark_school_data_changed
+import payment_patterns
+from payment_patterns import amount_range_labels, get_payment_patterns, parse_amount_edges
+
+
+def _income(school_id, payment_date, amount, fee_type='PTA'):
+    db.session.add(Income(school_id=school_id, payment_date=payment_date, student_id='0001', student_name='Grace',
+                          form_class='Form 1', payment_reference='SLIP', fee_type=fee_type, amount_paid=amount,
+                          balance=0))
+
+
+def test_amount_edges():
+    """Edges parse into increasing amounts and label every range"""
+    assert parse_amount_edges(None) == (1000, 5000, 10000, 20000)
+    assert parse_amount_edges('500,2500') == (500, 2500)
+    assert amount_range_labels((1000, 5000, 10000, 20000)) == [
+        '0-1000', '1001-5000', '5001-10000', '10001-20000', '20000+']
+    for value in ('5000,1000', '0,100', 'abc', ','.join(str(n) for n in range(1, 30))):
+        with pytest.raises(ValueError):
+            parse_amount_edges(value)
+
+
+def test_patterns_group_by_day_fee_type_and_amount(make_school, school_request):
+    """Each histogram counts and sums only the school's payments"""
+    school = make_school()
+    other = make_school()
+    _income(school.id, date(2024, 3, 4), 1000)                   # Monday
+    _income(school.id, date(2024, 3, 4), 1500, fee_type='SDF')   # Monday
+    _income(school.id, date(2024, 3, 10), 25000)                 # Sunday
+    _income(other.id, date(2024, 3, 5), 700)
+    db.session.commit()
+
+    with school_request(school.id):
+        patterns = get_payment_patterns()
+        assert patterns['total_payments'] == 3
+        assert patterns['day_patterns']['Monday'] == {'count': 2, 'amount': 2500}
+        assert patterns['day_patterns']['Sunday'] == {'count': 1, 'amount': 25000}
+        assert patterns['day_patterns']['Tuesday'] == {'count': 0, 'amount': 0}
+        assert patterns['fund_patterns'] == {'PTA': {'count': 2, 'amount': 26000},
+                                             'SDF': {'count': 1, 'amount': 1500}}
+        assert patterns['payment_ranges']['0-1000'] == {'count': 1, 'amount': 1000}
+        assert patterns['payment_ranges']['1001-5000'] == {'count': 1, 'amount': 1500}
+        assert patterns['payment_ranges']['20000+'] == {'count': 1, 'amount': 25000}
+        assert list(get_payment_patterns((2000,))['payment_ranges']) == ['0-2000', '2000+']
+
+
+def test_patterns_are_cached_until_data_changes(make_school, school_request, count_queries):
+    """A repeat request runs no grouped queries; posting a payment refreshes the result"""
+    school = make_school()
+    _income(school.id, date(2024, 3, 4), 1000)
+    db.session.commit()
+
+    with school_request(school.id):
+        with count_queries() as statements:
+            assert get_payment_patterns()['total_payments'] == 1
+        assert len([s for s in statements if 'GROUP BY' in s]) == 3
+
+        with count_queries() as statements:
+            get_payment_patterns()
+        assert not [s for s in statements if 'GROUP BY' in s]
+
+        _income(school.id, date(2024, 3, 5), 2000)
+        mark_school_data_changed(school.id)
+        db.session.commit()
+        assert get_payment_patterns()['total_payments'] == 2
+
+        # Custom edges are computed each time and never stored
+        for edges in ((1500,), (1500, 3000)):
+            with count_queries() as statements:
+                assert get_payment_patterns(edges)['total_payments'] == 2
+            assert len([s for s in statements if 'GROUP BY' in s]) == 3
+        assert school.id in payment_patterns._patterns
+        assert all(isinstance(key, int) for key in payment_patterns._patterns)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-school receipt and student ID sequences
+"""
+
+import threading
+from datetime import date
+
+from app import app, db, Receipt, Student
+from reassign_receipt_numbers import reassign_receipt_numbers
+from school_sequences import (RECEIPT, STUDENT_ID, next_sequence_value, peek_sequence_value,
+                              advance_sequence, reserve_sequence_block)
+
+
+def _add_receipt(school_id, receipt_no, payment_date=date(2024, 1, 1)):
+    receipt = Receipt(school_id=school_id, receipt_no=receipt_no, student_id='0001', student_name='A',
+                      form_class='Form 1', payment_date=payment_date, deposit_slip_ref='SLIP',
+                      fee_type='PTA', amount_paid=10, balance=0)
+    db.session.add(receipt)
+    db.session.commit()
+    return receipt
+
+
+def test_sequence_seeds_from_existing_numbers(make_school):
+    """The first number follows the highest number already in use, per school"""
+    school = make_school()
+    other = make_school()
+    _add_receipt(school.id, '0007')
+    _add_receipt(school.id, 'MANUAL')
+
+    assert next_sequence_value(school.id, RECEIPT) == 8
+    assert next_sequence_value(school.id, RECEIPT) == 9
+    assert next_sequence_value(other.id, RECEIPT) == 1
+    db.session.commit()
+
+
+def test_receipt_numbers_from_model(make_school):
+    """Receipt.generate_receipt_number uses the school's sequence"""
+    school = make_school()
+    assert Receipt.generate_receipt_number(school.id) == '0001'
+    assert Receipt.generate_receipt_number(school.id) == '0002'
+    db.session.commit()
+
+
+def test_rolled_back_numbers_are_reused(make_school):
+    """Numbers taken in a transaction that rolls back are handed out again"""
+    school = make_school()
+    next_sequence_value(school.id, RECEIPT)
+    db.session.commit()
+    assert next_sequence_value(school.id, RECEIPT) == 2
+    db.session.rollback()
+    assert next_sequence_value(school.id, RECEIPT) == 2
+    db.session.commit()
+
+
+def test_block_reservation(make_school):
+    """A bulk reservation takes a contiguous block and later numbers continue after it"""
+    school = make_school()
+    block = reserve_sequence_block(school.id, STUDENT_ID, 50)
+    assert list(block) == list(range(1, 51))
+    assert next_sequence_value(school.id, STUDENT_ID) == 51
+    db.session.commit()
+
+
+def test_peek_and_advance(make_school):
+    """Peeking does not consume numbers; manual IDs move the sequence forward"""
+    school = make_school()
+    assert peek_sequence_value(school.id, STUDENT_ID) == 1
+    assert peek_sequence_value(school.id, STUDENT_ID) == 1
+    advance_sequence(school.id, STUDENT_ID, 120)
+    advance_sequence(school.id, STUDENT_ID, 5)
+    db.session.commit()
+    assert peek_sequence_value(school.id, STUDENT_ID) == 121
+
+
+def test_concurrent_allocation_has_no_duplicates(make_school):
+    """Threads with their own sessions never receive the same number"""
+    school = make_school()
+    taken = []
+    errors = []
+
+    def worker():
+        try:
+            with app.app_context():
+                for _ in range(5):
+                    taken.append(next_sequence_value(school.id, RECEIPT))
+                    db.session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(taken) == list(range(1, 31))
+
+
+def test_reassign_is_per_school(make_school):
+    """Renumbering follows payment order within each school and resets the sequence"""
+    school = make_school()
+    other = make_school()
+    late = _add_receipt(school.id, '0050', date(2024, 3, 1))
+    early = _add_receipt(school.id, '0051', date(2024, 1, 1))
+    foreign = _add_receipt(other.id, '0099', date(2024, 2, 1))
+    next_sequence_value(school.id, RECEIPT)
+    db.session.commit()
+
+    reassign_receipt_numbers([school.id, other.id])
+    db.session.expire_all()
+
+    assert (early.receipt_no, late.receipt_no, foreign.receipt_no) == ('0001', '0002', '0001')
+    assert Receipt.generate_receipt_number(school.id) == '0003'
+    db.session.commit()
+
+
+def test_add_student_without_id_takes_next_number(make_school):
+    """Leaving the ID blank on the form assigns the next sequence number"""
+    school = make_school()
+    db.session.add(Student(school_id=school.id, student_id='0041', name='A', sex='Male', form_class='Form 1'))
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_role'] = 'school_admin'
+        sess['school_id'] = school.id
+    response = client.post('/add_student', data={'student_id': '', 'name': 'B', 'sex': 'Female',
+                                                  'form_class': 'Form 1'})
+    assert response.status_code == 302
+    assert Student.query.filter_by(school_id=school.id, name='B').one().student_id == '0042'
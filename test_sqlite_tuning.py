@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite pragma profile applied to every connection
+"""
+
+from datetime import date
+
+import pytest
+
+from app import app, db, ProfessionalReceipt, Receipt, SchoolConfiguration
+from sqlite_tuning import DEFAULT_PRAGMAS, current_pragmas, foreign_key_problems, pragmas_from_env
+
+
+def test_connections_use_configured_pragmas(app_ctx):
+    """Pooled connections report WAL, NORMAL sync, the memory temp store and the configured sizes"""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with db.engine.connect() as connection:
+        applied = current_pragmas(connection)
+
+    assert applied['journal_mode'] == 'wal'
+    assert applied['synchronous'] == 1       # NORMAL
+    assert applied['temp_store'] == 2        # MEMORY
+    assert applied['foreign_keys'] == 1
+    assert applied['cache_size'] == int(pragmas['cache_size'])
+    assert applied['busy_timeout'] == int(pragmas['busy_timeout'])
+
+
+def test_environment_overrides_single_pragmas():
+    """SQLITE_PRAGMAS replaces the named entries only; malformed entries are rejected"""
+    pragmas = pragmas_from_env({'SQLITE_PRAGMAS': 'cache_size=-16000, mmap_size=0', 'SQLITE_BUSY_TIMEOUT': '5'})
+    assert pragmas == dict(DEFAULT_PRAGMAS, cache_size='-16000', mmap_size='0', busy_timeout=5000)
+
+    for bad in ('cache_size', 'mmap_size=0;DROP TABLE student', '1x=2'):
+        with pytest.raises(ValueError):
+            pragmas_from_env({'SQLITE_PRAGMAS': bad})
+
+
+def test_delete_school_with_receipts_under_foreign_keys(make_school):
+    """With foreign keys enforced, deleting a school removes its receipts and every other school row"""
+    school_id = make_school(name='Closing School').id
+    db.session.add_all([
+        Receipt(school_id=school_id, receipt_no='R1', student_id='0001', student_name='Grace', form_class='Form 1',
+                payment_date=date(2024, 1, 5), deposit_slip_ref='SLIP', fee_type='PTA', amount_paid=100, balance=0),
+        ProfessionalReceipt(school_id=school_id, receipt_no='P1', student_id='0001', pta_amount=100),
+    ])
+    db.session.commit()
+    with db.engine.connect() as connection:
+        assert current_pragmas(connection, ['foreign_keys']) == {'foreign_keys': 1}
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(logged_in=True, user_role='developer', username='developer')
+    assert client.post(f'/delete_school/{school_id}').status_code == 302
+
+    db.session.expire_all()
+    assert db.session.get(SchoolConfiguration, school_id) is None
+    for table in db.metadata.sorted_tables:
+        if 'school_id' in table.c:
+            rows = db.session.execute(table.select().where(table.c.school_id == school_id)).all()
+            assert rows == [], table.name
+    assert foreign_key_problems(db.engine) == {}
+
+
+def test_orphaned_rows_are_reported(app_ctx):
+    """Rows orphaned while foreign keys were off show up in the startup check"""
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        try:
+            connection.execute(ProfessionalReceipt.__table__.insert().values(
+                school_id=10 ** 9, receipt_no='P1', student_id='0001'))
+            connection.commit()
+            assert foreign_key_problems(db.engine) == {'professional_receipt': 1}
+        finally:
+            connection.execute(ProfessionalReceipt.__table__.delete().where(
+                ProfessionalReceipt.school_id == 10 ** 9))
+            connection.commit()
+            connection.exec_driver_sql('PRAGMA foreign_keys=ON')
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory student autocomplete index and its API
+"""
+
+import re
+
+from app import db, Student, Income
+from student_autocomplete import StudentPrefixIndex, get_student_index, mark_roster_changed
+
+
+# The rebuild's query; the tenant schema is translated to main on SQLite
+_READS_STUDENTS = re.compile(r'FROM (\w+\.)?student\b')
+
+
+def _add_student(school_id, student_id, name, **kwargs):
+    student = Student(school_id=school_id, student_id=student_id, name=name, sex='Male', form_class='Form 1',
+                      **kwargs)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+def test_prefix_index_ranking():
+    """Exact IDs first, then names starting with the word, then other word matches"""
+    index = StudentPrefixIndex(None, [
+        {'id': 1, 'student_id': '0001', 'name': 'Grace Banda', 'form_class': 'Form 1'},
+        {'id': 2, 'student_id': '0002', 'name': 'Banda Phiri', 'form_class': 'Form 1'},
+        {'id': 3, 'student_id': 'BAN', 'name': 'Zed Mwale', 'form_class': 'Form 1'},
+    ])
+    assert [s['id'] for s in index.search('ban')] == [3, 2, 1]
+    assert [s['id'] for s in index.search('grace b')] == [1]
+    assert [s['id'] for s in index.search('ban', limit=1)] == [3]
+    assert index.search('') == []
+
+    index.remove(2)
+    index.put({'id': 1, 'student_id': '0001', 'name': 'Grace Tembo', 'form_class': 'Form 1'})
+    assert [s['id'] for s in index.search('ban')] == [3]
+    assert len(index) == 2
+
+
+def test_autocomplete_returns_top_matches_with_balances(make_school, logged_in_client):
+    """Only the school's matches are returned, limited, with their balances"""
+    school = make_school()
+    other = make_school()
+    _add_student(school.id, '0001', 'John Okello', pta_required=100, pta_amount_paid=40)
+    _add_student(school.id, '0002', 'Joan Achieng')
+    _add_student(school.id, '0003', 'Mary Joseph')
+    _add_student(other.id, '0001', 'John Other')
+
+    data = logged_in_client(school.id).get('/api/students/autocomplete?q=jo&limit=2').get_json()
+
+    assert [s['name'] for s in data['students']] == ['Joan Achieng', 'John Okello']
+    john = data['students'][1]
+    assert (john['pta_required'], john['pta_amount_paid'], john['pta_balance']) == (100, 40, 60)
+
+
+def test_index_follows_orm_changes_incrementally(make_school, school_request, count_queries):
+    """Adds, edits and deletes in this process update the index without a rebuild or touching a published copy"""
+    school = make_school()
+    student = _add_student(school.id, '0001', 'Peter Wafula')
+    with school_request(school.id):
+        index = get_student_index(school.id)
+
+    _add_student(school.id, '0002', 'Paul Banda')
+    student.name = 'Peter Mwale'
+    db.session.commit()
+    with school_request(school.id), count_queries() as statements:
+        updated = get_student_index(school.id)
+    assert not any(_READS_STUDENTS.search(statement) for statement in statements)
+    assert [s['name'] for s in updated.search('p')] == ['Paul Banda', 'Peter Mwale']
+    assert updated.search('wafula') == []
+    # A lookup still holding the old index keeps a consistent view
+    assert [s['name'] for s in index.search('p')] == ['Peter Wafula']
+
+    db.session.delete(student)
+    db.session.commit()
+    with school_request(school.id), count_queries() as statements:
+        assert [s['name'] for s in get_student_index(school.id).search('p')] == ['Paul Banda']
+    assert not any(_READS_STUDENTS.search(statement) for statement in statements)
+    assert len(updated) == 2
+
+
+def test_changes_from_elsewhere_rebuild_the_index(make_school, school_request):
+    """A roster change this process did not apply triggers a rebuild"""
+    school = make_school()
+    _add_student(school.id, '0001', 'Peter Wafula')
+    with school_request(school.id):
+        index = get_student_index(school.id)
+
+    db.session.execute(Student.__table__.insert().values(
+        school_id=school.id, student_id='0002', name='Paul Banda', sex='Male', form_class='Form 1'
+    ))
+    mark_roster_changed(school.id)
+    db.session.commit()
+
+    with school_request(school.id):
+        rebuilt = get_student_index(school.id)
+    assert rebuilt is not index
+    assert [s['name'] for s in rebuilt.search('paul')] == ['Paul Banda']
+
+
+def test_add_income_posts_primary_key(make_school, logged_in_client):
+    """The payment form finds the student by primary key"""
+    school = make_school()
+    _add_student(school.id, '0001', 'Same Name')
+    second = _add_student(school.id, '0002', 'Same Name')
+
+    response = logged_in_client(school.id).post('/add_income', data={
+        'student_db_id': second.id, 'student_name_search': 'Same Name', 'student_id': '',
+        'payment_date': '2024-02-01', 'deposit_ref_no': 'SLIP1', 'pta_amount': '10',
+    })
+
+    assert response.status_code == 302
+    assert [income.student_id for income in Income.query.filter_by(school_id=school.id)] == ['0002']
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests that the SQL balance query agrees with the Python balance methods
+"""
+
+from sqlalchemy.dialects import postgresql
+
+from app import db, Student, FundConfiguration
+from student_balances import StudentBalanceQuery
+
+
+STUDENTS = [
+    # student_id, pta_paid, sdf_paid, boarding_paid, pta_required, phone
+    ('0001', 0, 0, 0, 0, '0999000001'),          # no payment
+    ('0002', 30000, 2000, 0, 0, '0999000002'),   # paid in full against config
+    ('0003', 10000, 0, 0, 0, None),              # outstanding, no phone
+    ('0004', 5000, 2000, 0, 5000, ''),           # paid in full against own PTA amount
+    ('0005', 40000, 2500, 0, 0, '0999000005'),   # overpaid, still paid in full
+    ('0006', 0, 2000, 0, 0, '0999000006'),       # outstanding with phone
+]
+
+
+def _setup_school(make_school):
+    school = make_school()
+    db.session.add(FundConfiguration(school_id=school.id, term_name='Term 1', pta_amount=30000,
+                                     sdf_amount=2000, boarding_amount=0, is_active=True))
+    db.session.add(FundConfiguration(school_id=school.id, term_name='Old term', pta_amount=99999,
+                                     sdf_amount=99999, boarding_amount=0, is_active=False))
+    for student_id, pta, sdf, boarding, pta_required, phone in STUDENTS:
+        db.session.add(Student(school_id=school.id, student_id=student_id, name=f'Student {student_id}',
+                               sex='Female', form_class='Form 2', parent_phone=phone,
+                               pta_amount_paid=pta, sdf_amount_paid=sdf, boarding_amount_paid=boarding,
+                               pta_required=pta_required))
+    db.session.commit()
+    return school
+
+
+def test_sql_balances_match_python(make_school, school_request):
+    """Every balance column equals the corresponding Student method"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        rows = StudentBalanceQuery().rows().all()
+        assert len(rows) == len(STUDENTS)
+        for row in rows:
+            student = row.Student
+            assert row.pta_balance == student.get_pta_balance()
+            assert row.sdf_balance == student.get_sdf_balance()
+            assert row.boarding_balance == student.get_boarding_balance()
+            assert (row.payment_status == 'paid') == student.is_paid_in_full()
+
+
+def test_count_by_status(make_school, school_request):
+    """Status counts come back from one grouped query"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        assert StudentBalanceQuery().count_by_status() == {'paid': 3, 'outstanding': 2, 'no_payment': 1}
+
+
+def test_outstanding_with_phone_filter(make_school, school_request):
+    """Outstanding students without a usable phone number are filtered out in SQL"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        rows = StudentBalanceQuery().where_not_paid().where_has_phone().columns(Student.student_id).all()
+        assert sorted(row.student_id for row in rows) == ['0001', '0006']
+
+
+def test_other_schools_are_excluded(make_school, school_request):
+    """The school filter of the base query is preserved"""
+    school = _setup_school(make_school)
+    other = _setup_school(make_school)
+    with school_request(school.id):
+        assert sum(StudentBalanceQuery().count_by_status().values()) == len(STUDENTS)
+    with school_request(other.id):
+        assert sum(StudentBalanceQuery().count_by_status().values()) == len(STUDENTS)
+
+
+def test_compiles_for_postgresql(make_school, school_request):
+    """The same query renders for PostgreSQL"""
+    school = _setup_school(make_school)
+    with school_request(school.id):
+        statement = StudentBalanceQuery().where_status('outstanding').rows().statement
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert 'active_fund_config' in sql
+        assert "'outstanding'" in sql
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the bulk CSV student import
+"""
+
+import io
+
+from app import app, db, Student
+from school_sequences import STUDENT_ID, peek_sequence_value
+from student_import import import_students, normalise_form_class, normalise_phone, normalise_sex
+
+CSV = """Student ID,Name,Gender,Class,Phone
+,Grace  Banda,F,1,0991 234 567
+0007,John Phiri,boy,form 2,
+,Mary Tembo,Female,F3b,+265 888 123 456
+0002,Existing Clash,M,Form 1,
+0007,Second Seven,M,Form 1,
+,No Sex,X,Form 1,
+,Bad Phone,M,Form 1,12
+,,,,
+,Peter Mwale,Male,Form 4,
+"""
+
+
+def test_normalisers():
+    """Sex, class and phone values are normalised or rejected"""
+    assert normalise_sex(' girl ') == 'Female'
+    assert normalise_sex('x') is None
+    assert normalise_form_class('f 3a') == 'Form 3A'
+    assert normalise_form_class('Remedial  class') == 'Remedial class'
+    assert normalise_phone('0991-234-567') == '+265991234567'
+    assert normalise_phone('00265 991234567') == '+265991234567'
+    assert normalise_phone('') == ''
+    assert normalise_phone('12') is None
+
+
+def test_import_reports_errors_per_row(make_school):
+    """Valid rows are imported in batches and each bad row is reported with its line"""
+    school = make_school()
+    db.session.add(Student(school_id=school.id, student_id='0002', name='Old', sex='Male', form_class='Form 1'))
+    db.session.commit()
+
+    result = import_students(school.id, io.StringIO(CSV), batch_size=2)
+
+    assert result.imported == 4
+    assert [(error['line'], error['error']) for error in result.errors] == [
+        (5, 'Student ID 0002 already exists'),
+        (6, 'Student ID 0007 appears more than once in the file'),
+        (7, "Sex must be Male or Female, got 'X'"),
+        (8, "Invalid phone number '12'"),
+    ]
+    students = {s.name: s for s in Student.query.filter_by(school_id=school.id)}
+    # Blank IDs are numbered after the highest ID entered in the file
+    assert students['Grace Banda'].student_id == '0008'
+    assert students['Grace Banda'].parent_phone == '+265991234567'
+    assert (students['John Phiri'].sex, students['John Phiri'].form_class) == ('Male', 'Form 2')
+    assert students['Mary Tembo'].student_id == '0009'
+    assert students['Mary Tembo'].form_class == 'Form 3B'
+    assert students['Peter Mwale'].student_id == '0010'
+    assert peek_sequence_value(school.id, STUDENT_ID) == 11
+
+
+def test_dry_run_writes_nothing(make_school):
+    """A dry run validates and counts without inserting"""
+    school = make_school()
+
+    result = import_students(school.id, io.StringIO(CSV), dry_run=True)
+
+    assert result.imported == 5
+    assert Student.query.filter_by(school_id=school.id).count() == 0
+
+
+def test_upload_route(make_school):
+    """The upload form imports the posted file"""
+    school = make_school()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_role'] = 'school_admin'
+        sess['school_id'] = school.id
+
+    response = client.post('/import_students', data={
+        'file': (io.BytesIO(b'name,sex,form_class\nAnn Banda,F,Form 1\nJoe Phiri,M,Form 2\n'), 'students.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code in (200, 302)
+    assert sorted(s.student_id for s in Student.query.filter_by(school_id=school.id)) == ['0001', '0002']
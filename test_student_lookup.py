@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the indexed student lookups used by the receipt pages
+"""
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+from app import db, Student, get_student_by_student_id, get_students_by_student_ids
+
+
+def _add_students(school_id, count):
+    for number in range(1, count + 1):
+        db.session.add(Student(school_id=school_id, student_id=f'{number:04d}', name=f'Student {number}',
+                               sex='Male', form_class='Form 3'))
+    db.session.commit()
+
+
+def test_unique_index_exists(app_ctx):
+    """The composite index is present and unique"""
+    indexes = {index['name']: index for index in inspect(db.engine).get_indexes('student')}
+    index = indexes['ix_student_school_student_id']
+    assert index['column_names'] == ['school_id', 'student_id']
+    assert index['unique']
+
+
+def test_duplicate_student_id_rejected(make_school):
+    """The same student number cannot be used twice in one school, but can in another"""
+    school = make_school()
+    other = make_school()
+    _add_students(school.id, 1)
+    _add_students(other.id, 1)
+
+    db.session.add(Student(school_id=school.id, student_id='0001', name='Copy', sex='Male', form_class='Form 3'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_lookup_is_school_filtered(make_school, school_request):
+    """Single lookups only see the current school"""
+    school = make_school()
+    other = make_school()
+    _add_students(school.id, 2)
+    _add_students(other.id, 3)
+
+    with school_request(school.id):
+        assert get_student_by_student_id('0002').school_id == school.id
+        assert get_student_by_student_id('0003') is None
+    assert get_student_by_student_id('0003', school_id=other.id).school_id == other.id
+
+
+def test_batch_lookup_single_query(make_school, school_request, count_queries):
+    """A whole class is fetched with one IN query, including chunking of long lists"""
+    school = make_school()
+    _add_students(school.id, 30)
+    wanted = [f'{number:04d}' for number in range(1, 31)] + ['9999']
+
+    with school_request(school.id):
+        with count_queries() as statements:
+            students = get_students_by_student_ids(wanted)
+        assert len(statements) == 1
+        assert sorted(students) == wanted[:30]
+
+        with count_queries() as statements:
+            chunked = get_students_by_student_ids(wanted, chunk_size=10)
+        assert len(statements) == 4
+        assert chunked.keys() == students.keys()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the database-side student search
+"""
+
+from app import app, db, Student, filter_students, get_school_filtered_query
+from student_search import install_student_search, match_students, search_backend, fts_match_expression
+
+
+def _add_student(school_id, student_id, name, form_class='Form 1'):
+    student = Student(school_id=school_id, student_id=student_id, name=name, sex='Male', form_class=form_class)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+def _search(school_id, text, **kwargs):
+    with app.test_request_context('/'):
+        from flask import session
+        session['logged_in'] = True
+        session['user_role'] = 'school_admin'
+        session['school_id'] = school_id
+        query = match_students(get_school_filtered_query(Student), text, **kwargs)
+        if not kwargs.get('ranked'):
+            query = query.order_by(Student.id)
+        return [student.name for student in query.all()]
+
+
+def test_install_is_idempotent(app_ctx):
+    """Installing twice keeps one working index"""
+    assert all(error is None for _, _, error in install_student_search())
+    assert all(error is None for _, _, error in install_student_search())
+    assert search_backend() == 'fts5'
+
+
+def test_match_expression_quotes_terms():
+    """Every word becomes a quoted prefix limited to the given columns"""
+    assert fts_match_expression(['jo', 'ok'], ('name',)) == '{name} : "jo"* AND {name} : "ok"*'
+    assert fts_match_expression(['jo'], ('name',), school_id=7) == 'school_id : "7" AND {name} : "jo"*'
+
+
+def test_prefix_search_within_school(make_school):
+    """Word prefixes of name, ID and class match; other schools never do"""
+    install_student_search()
+    school = make_school()
+    other = make_school()
+    _add_student(school.id, '0001', 'John Okello', 'Form 2')
+    _add_student(school.id, '0002', 'Mary Achieng')
+    _add_student(other.id, '0001', 'John Other')
+
+    assert _search(school.id, 'jo') == ['John Okello']
+    assert _search(school.id, 'OKE jo') == ['John Okello']
+    assert _search(school.id, '0002') == ['Mary Achieng']
+    assert _search(school.id, 'form 2') == ['John Okello']
+    assert _search(school.id, 'achieng', columns=('student_id',)) == []
+    assert _search(school.id, 'zz') == []
+    assert _search(school.id, '  ') == ['John Okello', 'Mary Achieng']
+
+
+def test_index_follows_updates_and_deletes(make_school):
+    """Triggers keep the index in step with edits and deletions"""
+    install_student_search()
+    school = make_school()
+    student = _add_student(school.id, '0001', 'Peter Wafula')
+
+    student.name = 'Paul Wafula'
+    db.session.commit()
+    assert _search(school.id, 'peter') == []
+    assert _search(school.id, 'paul') == ['Paul Wafula']
+
+    db.session.delete(student)
+    db.session.commit()
+    assert _search(school.id, 'wafula') == []
+
+
+def test_ranked_search(make_school):
+    """Ranked results put name matches before class matches"""
+    install_student_search()
+    school = make_school()
+    _add_student(school.id, '0001', 'Grace Phiri', 'Banda House')
+    _add_student(school.id, '0002', 'Banda Phiri')
+
+    assert _search(school.id, 'banda', ranked=True) == ['Banda Phiri', 'Grace Phiri']
+
+
+def test_field_filters_match_inside_words(make_school, school_request):
+    """Income and receipt filters find IDs, classes and names by any part, not only word prefixes"""
+    install_student_search()
+    school = make_school()
+    _add_student(school.id, 'S0012', 'Mary Johnson', 'Form 3B')
+    _add_student(school.id, 'S0120', 'John Mary')
+    _add_student(school.id, 'S0200', 'Sonia Phiri')
+
+    def names(**filters):
+        with school_request(school.id):
+            query = filter_students(get_school_filtered_query(Student), **filters)
+            return sorted(student.name for student in query)
+
+    assert names(student_id='0012') == ['Mary Johnson']
+    assert names(student_id='012') == ['John Mary', 'Mary Johnson']
+    assert names(form_class='3b') == ['Mary Johnson']
+    assert names(name='hnson') == ['Mary Johnson']
+    assert names(name='mary jo') == ['Mary Johnson']
+    # Same rule whether or not some name starts with the text
+    assert names(name='son') == ['Mary Johnson', 'Sonia Phiri']
+    assert names(name='xyz') == []
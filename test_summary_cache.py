@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-school summary cache and its database-stored data version
+"""
+
+from datetime import date
+
+from app import app, db, Student, get_school_data_version, mark_school_data_changed
+from summary_cache import get_school_summary
+
+
+def _add_student(school_id, student_id='0001', **amounts):
+    db.session.add(Student(school_id=school_id, student_id=student_id, name='A', sex='Male',
+                           form_class='Form 1', **amounts))
+    db.session.commit()
+
+
+def test_cache_hit_costs_one_lookup(make_school, school_request, count_queries):
+    """A second request reuses the summary after a single version lookup"""
+    school = make_school()
+    _add_student(school.id, pta_amount_paid=100)
+
+    with school_request(school.id):
+        first = get_school_summary()
+    with school_request(school.id):
+        with count_queries() as statements:
+            second = get_school_summary()
+
+    assert second is first
+    assert len(statements) == 1
+    assert first.totals.pta_collected == 100
+    assert first.total_students == 1
+
+
+def test_version_bump_invalidates(make_school, school_request):
+    """Data written together with a version bump is picked up on the next lookup"""
+    school = make_school()
+    _add_student(school.id, pta_amount_paid=100)
+    with school_request(school.id):
+        assert get_school_summary().totals.pta_collected == 100
+
+    db.session.add(Student(school_id=school.id, student_id='0002', name='B', sex='Female',
+                           form_class='Form 1', pta_amount_paid=50))
+    mark_school_data_changed(school.id)
+    db.session.commit()
+
+    with school_request(school.id):
+        summary = get_school_summary()
+    assert summary.totals.pta_collected == 150
+    assert summary.total_students == 2
+
+
+def test_versions_are_per_school(make_school):
+    """Bumping one school leaves the other school's version alone"""
+    school = make_school()
+    other = make_school()
+    before = get_school_data_version(other.id)
+
+    mark_school_data_changed(school.id)
+    mark_school_data_changed(school.id)
+    db.session.commit()
+
+    assert get_school_data_version(school.id)[1] == 2
+    assert get_school_data_version(other.id) == before
+
+
+def test_write_route_bumps_version(make_school, school_request):
+    """Recording an expenditure through the route refreshes the cached summary"""
+    school = make_school()
+    _add_student(school.id, pta_amount_paid=100)
+    with school_request(school.id):
+        assert get_school_summary().totals.pta_spent == 0
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_role'] = 'school_admin'
+        sess['school_id'] = school.id
+    response = client.post('/add_expenditure', data={
+        'date': date.today().isoformat(), 'activity_service': '1506 - Stationery', 'voucher_no': 'V1',
+        'cheque_no': 'C1', 'amount_paid': '40', 'fund_type': 'PTA',
+    })
+    assert response.status_code == 302
+
+    with school_request(school.id):
+        summary = get_school_summary()
+    assert summary.totals.pta_spent == 40
+    assert summary.totals.spent_on_day == 40
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-request tenant context and its cached school status
+"""
+
+from app import db, SchoolConfiguration
+from tenant_context import get_tenant_status
+
+
+def _school_lookups(statements):
+    return [s for s in statements if 'FROM school_configuration' in s]
+
+
+def test_school_status_read_once_across_requests(make_school, count_queries, logged_in_client):
+    """The first request loads the school status once; later requests reuse it"""
+    school = make_school()
+    client = logged_in_client(school.id)
+
+    with count_queries() as statements:
+        assert client.get('/api/students').status_code == 200
+    assert len(_school_lookups(statements)) == 1
+
+    with count_queries() as statements:
+        assert client.get('/api/students').status_code == 200
+    assert not _school_lookups(statements)
+
+
+def test_block_school_takes_effect_immediately(make_school, logged_in_client):
+    """Blocking drops the cached status, so the school is locked out on its next request"""
+    school = make_school()
+    client = logged_in_client(school.id)
+    assert client.get('/api/students').status_code == 200
+
+    assert logged_in_client(None, role='developer').post(f'/block_school/{school.id}').status_code == 302
+    response = client.get('/api/students')
+    assert response.status_code == 302 and '/login' in response.location
+
+    logged_in_client(None, role='developer').post(f'/unblock_school/{school.id}')
+    assert logged_in_client(school.id).get('/api/students').status_code == 200
+
+
+def test_orm_changes_refresh_status(make_school):
+    """Committing a change to a school's configuration refreshes its cached status"""
+    school = make_school(name='Old Name')
+    assert get_tenant_status(school.id).school_name == 'Old Name'
+
+    db.session.get(SchoolConfiguration, school.id).school_name = 'New Name'
+    db.session.commit()
+    assert get_tenant_status(school.id).school_name == 'New Name'
+    assert get_tenant_status(school.id + 1000) is None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Multi-schema harness for the connection-level tenant schema routing.
+
+Each school gets its own schema, made with SQLite ATTACH DATABASE on every
+pooled connection. This is the local stand-in for PostgreSQL school_N schemas.
+"""
+
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db, Student, create_tenant_schema_and_tables, get_school_filtered_query
+
+
+@pytest.fixture
+def tenant_schools(make_school, tmp_path):
+    """Two schools with their own attached schema while tenant routing is on."""
+    schools = [make_school(name='School A'), make_school(name='School B')]
+    files = {school.id: str(tmp_path / f'school_{school.id}.db') for school in schools}
+
+    def attach(dbapi_connection, connection_record):
+        for school_id, path in files.items():
+            dbapi_connection.execute(f"ATTACH DATABASE '{path}' AS school_{school_id}")
+
+    db.session.close()
+    db.engine.dispose()
+    event.listen(db.engine, 'connect', attach)
+    app.config['TENANT_SCHEMAS'] = True
+    try:
+        for school in schools:
+            create_tenant_schema_and_tables(school.id)
+        yield schools, files
+    finally:
+        db.session.rollback()
+        app.config['TENANT_SCHEMAS'] = False
+        event.remove(db.engine, 'connect', attach)
+        db.session.close()
+        db.engine.dispose()
+
+
+def _add_student(school_id, name):
+    db.session.add(Student(school_id=school_id, student_id='0001', name=name, sex='Female', form_class='Form 1'))
+    db.session.commit()
+
+
+def test_each_school_reads_and_writes_its_own_schema(tenant_schools, school_request):
+    """Rows written in a school's request land in its schema and are invisible to other schools"""
+    (school_a, school_b), files = tenant_schools
+
+    with school_request(school_a.id):
+        _add_student(school_a.id, 'Grace')
+        assert [s.name for s in get_school_filtered_query(Student)] == ['Grace']
+        db.session.rollback()
+    with school_request(school_b.id):
+        _add_student(school_b.id, 'John')
+        assert [s.name for s in get_school_filtered_query(Student)] == ['John']
+        db.session.rollback()
+
+    # Outside a school request the unqualified (public) table is used
+    assert Student.query.filter(Student.name.in_(['Grace', 'John'])).count() == 0
+    for school, name in ((school_a, 'Grace'), (school_b, 'John')):
+        with sqlite3.connect(files[school.id]) as connection:
+            assert connection.execute('SELECT name FROM student').fetchall() == [(name,)]
+
+
+def test_routing_costs_no_statement_and_shares_compiled_sql(tenant_schools, school_request, count_queries):
+    """No SET search_path round trip, and one compiled statement serves every tenant"""
+    schools, files = tenant_schools
+    compiled = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        compiled.append((context.compiled, statement))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        for school in schools:
+            with school_request(school.id):
+                with count_queries() as statements:
+                    get_school_filtered_query(Student).filter(Student.student_id == '0001').all()
+                db.session.rollback()
+                assert len(statements) == 1
+                assert f'school_{school.id}.student' in statements[0]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    (first, first_sql), (second, second_sql) = compiled
+    assert first is second and first_sql != second_sql
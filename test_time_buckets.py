@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the time-bucket aggregation behind the analytics charts
+"""
+
+from datetime import date
+
+from app import db, Income
+from time_buckets import bucket_start, bucket_totals, iter_buckets, next_bucket
+
+
+def _income(school_id, payment_date, amount):
+    db.session.add(Income(school_id=school_id, payment_date=payment_date, student_id='0001', student_name='Grace',
+                          form_class='Form 1', payment_reference='SLIP', fee_type='PTA', amount_paid=amount,
+                          balance=0))
+
+
+def test_bucket_boundaries():
+    """Weeks start on Monday and terms on January, May and September"""
+    assert bucket_start(date(2024, 3, 3), 'week') == date(2024, 2, 26)
+    assert bucket_start(date(2024, 7, 15), 'term') == date(2024, 5, 1)
+    assert next_bucket(date(2024, 9, 1), 'term') == date(2025, 1, 1)
+    assert next_bucket(date(2024, 12, 1), 'month') == date(2025, 1, 1)
+    assert list(iter_buckets(date(2024, 1, 31), date(2024, 3, 1), 'month')) == [
+        date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)]
+
+
+def test_totals_per_bucket_are_zero_filled(make_school, school_request):
+    """Every bucket of the window is present and sums the right rows"""
+    from app import get_school_filtered_query
+
+    school = make_school()
+    other = make_school()
+    _income(school.id, date(2024, 2, 26), 10)
+    _income(school.id, date(2024, 3, 3), 20)
+    _income(school.id, date(2024, 3, 4), 40)
+    _income(school.id, date(2024, 5, 2), 80)
+    _income(other.id, date(2024, 3, 4), 1000)
+    db.session.commit()
+
+    def totals(bucket, start=date(2024, 2, 26), end=date(2024, 5, 31)):
+        query = get_school_filtered_query(Income)
+        return {day: values['amount'] for day, values in
+                bucket_totals(query, Income.payment_date, {'amount': Income.amount_paid}, start, end, bucket).items()}
+
+    with school_request(school.id):
+        weeks = totals('week')
+        assert (weeks[date(2024, 2, 26)], weeks[date(2024, 3, 4)], weeks[date(2024, 3, 11)]) == (30, 40, 0)
+        assert len(weeks) == 14
+        assert totals('month') == {date(2024, 2, 1): 10, date(2024, 3, 1): 60, date(2024, 4, 1): 0,
+                                   date(2024, 5, 1): 80}
+        assert totals('term') == {date(2024, 1, 1): 70, date(2024, 5, 1): 80}
+        days = totals('day', date(2024, 3, 2), date(2024, 3, 5))
+        assert list(days.values()) == [0, 20, 40, 0]
+
+
+def test_one_query_for_any_window(make_school, school_request, count_queries):
+    """The number of queries does not grow with the window length"""
+    from app import get_school_filtered_query
+
+    school = make_school()
+    with school_request(school.id):
+        for start in (date(2024, 1, 1), date(2019, 1, 1)):
+            with count_queries() as statements:
+                result = bucket_totals(get_school_filtered_query(Income), Income.payment_date,
+                                       {'amount': Income.amount_paid}, start, date(2024, 1, 31), 'day')
+            assert len(statements) == 1
+        assert len(result) > 1800
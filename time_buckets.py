@@ -0,0 +1,107 @@
+"""
+Time-bucket aggregation for analytics charts.
+
+bucket_totals() sums amount columns per day, week (starting Monday), month
+or school term with a single GROUP BY on a date-truncation expression, so a
+chart costs one query however long its window is. Buckets without any rows
+are filled with zeros in Python.
+
+Date truncation is written per dialect: date_trunc() on PostgreSQL, date()
+and strftime() on SQLite. Terms are built from month buckets using
+TERM_START_MONTHS.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, cast, func, literal_column
+
+BUCKETS = ('day', 'week', 'month', 'term')
+# First month of each school term: January-April, May-August, September-December
+TERM_START_MONTHS = (1, 5, 9)
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket containing day."""
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    if bucket == 'term':
+        return day.replace(month=max(m for m in TERM_START_MONTHS if m <= day.month), day=1)
+    raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+
+
+def next_bucket(start, bucket):
+    """First day of the bucket after the one starting at start."""
+    if bucket == 'day':
+        return start + timedelta(days=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return _add_months(start, 1)
+    later = [m for m in TERM_START_MONTHS if m > start.month]
+    return start.replace(month=later[0]) if later else start.replace(year=start.year + 1, month=TERM_START_MONTHS[0])
+
+
+def iter_buckets(start, end, bucket):
+    """Start days of every bucket overlapping start..end."""
+    current = bucket_start(start, bucket)
+    while current <= end:
+        yield current
+        current = next_bucket(current, bucket)
+
+
+def truncate_date(column, bucket, dialect):
+    """SQL expression for the start of the column's bucket (terms are truncated to months)."""
+    if bucket == 'day':
+        return column
+    sql_bucket = 'month' if bucket == 'term' else bucket
+    # Inline literals, so the SELECT and GROUP BY expressions are identical on PostgreSQL
+    if dialect == 'postgresql':
+        return cast(func.date_trunc(literal_column(f"'{sql_bucket}'"), column), Date)
+    if dialect == 'sqlite':
+        if sql_bucket == 'week':
+            # Forward to Sunday (or stay on it), then back to that week's Monday
+            return func.date(column, literal_column("'weekday 0'"), literal_column("'-6 days'"))
+        return func.strftime(literal_column("'%Y-%m-01'"), column)
+    raise ValueError(f'Date buckets are not supported on {dialect}')
+
+
+def bucket_totals(query, date_column, amounts, start, end, bucket='day'):
+    """Sum amounts per bucket of date_column between start and end with one GROUP BY.
+
+    query is the (school-filtered) base query, amounts maps result names to
+    column expressions. Returns {bucket start: {name: total}} in date order,
+    with a zero entry for every bucket without rows.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    dialect = query.session.get_bind().dialect.name
+    truncated = truncate_date(date_column, bucket, dialect)
+
+    totals = {start_day: dict.fromkeys(amounts, 0.0) for start_day in iter_buckets(start, end, bucket)}
+    rows = (
+        query.filter(date_column >= start, date_column <= end)
+        .with_entities(truncated.label('bucket'), *(func.sum(expr).label(name) for name, expr in amounts.items()))
+        .group_by(truncated)
+    )
+    for row in rows:
+        values = totals[bucket_start(_to_date(row.bucket), bucket)]
+        for name in amounts:
+            values[name] += float(getattr(row, name) or 0)
+    return totals